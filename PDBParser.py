@@ -4,6 +4,17 @@
 #
 #
 
+from collections import OrderedDict
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+
+import pdbhybrid36
+import pdbio
+import pdbprofile
+
 
 ##-------------------------------------------------------##
 ##            PDB_residueException                       ##
@@ -41,11 +52,820 @@ class PDB_fileException(Exception):
 
 
 
+##-------------------------------------------------------##
+##                   PDB_atom_table                      ##
+##-------------------------------------------------------##
+
+class PDB_atom_table(object):
+    """ Columnar (structure-of-arrays) store holding every atom of a 
+        PDB file.
+
+        Each per-atom field lives in its own NumPy array - coordinates
+        as one (N,3) float array, occupancy/beta/charge as float arrays,
+        the integer fields as int arrays and the text fields as compact
+        fixed-width string arrays. A blank charge is stored as NaN.
+
+        Residue and chain boundaries are kept as offset arrays:
+
+            residue i  -> atom rows residue_offsets[i]:residue_offsets[i+1]
+            chain j    -> residues  chain_offsets[j]:chain_offsets[j+1]
+
+        PDB_atom, PDB_residue and PDB_chain objects are lightweight views
+        onto rows/row ranges of this table, so edits made through those 
+        objects are written straight into the arrays (and bulk edits on
+        the arrays are seen by the views).
+    """
+
+    # text columns and their PDB field widths. A column is widened on 
+    # the fly if a longer value is ever stored in it
+    STRING_COLUMNS = (("record_name",  6),
+                      ("atom_name",    4),
+                      ("alt_location", 1),
+                      ("res_name",     3),
+                      ("chain",        1),
+                      ("res_ins_code", 1),
+                      ("seg_ID",       4),
+                      ("element",      2))
+
+    INT_COLUMNS    = ("atom_id", "res_id", "chain_local_id")
+    FLOAT_COLUMNS  = ("occupancy", "beta", "charge")
+    COORD_COLUMNS  = ("coord_X", "coord_Y", "coord_Z")
+
+    # order of the fields in an atom record (as returned by 
+    # PDB_atom.parse_fields)
+    FIELDS = ("record_name", "atom_id", "atom_name", "alt_location",
+              "res_name", "chain", "res_id", "res_ins_code", 
+              "coord_X", "coord_Y", "coord_Z", "occupancy", "beta",
+              "seg_ID", "element", "charge", "chain_local_id", 
+              "formatted_ok")
+
+    # the fields which end up in a written atom line
+    FINGERPRINT_COLUMNS = FIELDS[:16]
+
+    def __init__(self, n_atoms=0):
+        """ Allocates an (empty) table with space for n_atoms atoms. 
+            Residue and chain boundaries are not defined until 
+            assign_boundaries() is called.
+        """
+        
+        for (name, width) in self.STRING_COLUMNS:
+            setattr(self, name, np.zeros(n_atoms, dtype="S%i" % width))
+
+        for name in self.INT_COLUMNS:
+            setattr(self, name, np.zeros(n_atoms, dtype=np.int64))
+
+        for name in self.FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(n_atoms, dtype=np.float64))
+
+        self.coords       = np.zeros((n_atoms, 3), dtype=np.float64)
+        self.formatted_ok = np.zeros(n_atoms, dtype=bool)
+
+        self.residue_offsets = np.zeros(1, dtype=np.int64)
+        self.chain_offsets   = np.zeros(1, dtype=np.int64)
+        self.chain_names     = []
+
+        # for a table built by PDB_residue_organizer, source_rows[i] is 
+        # the index (in the parsed atom lines) of the line row i came from
+        self.source_rows     = None
+
+        # the text the atoms were read from (see attach_source) - row i
+        # was read from source_text[source_starts[i]:source_stops[i]]
+        self.source_text        = None
+        self.source_starts      = None
+        self.source_stops       = None
+        self.source_fingerprint = None
+
+    @classmethod
+    def from_records(cls, records):
+        """ Builds a table from a list of atom records, each of which is a
+            tuple ordered as PDB_atom_table.FIELDS.
+
+            # INPUT
+            records   :     List of tuples
+
+            # OUTPUT
+            -         :     PDB_atom_table
+        """
+
+        table = cls(0)
+
+        if len(records) == 0:
+            return table
+
+        columns = zip(*records)
+        
+        for (name, width) in cls.STRING_COLUMNS:
+            values = np.array(columns[cls.FIELDS.index(name)], dtype="S")
+            setattr(table, name, values.astype("S%i" % max(width, values.itemsize)))
+
+        for name in cls.INT_COLUMNS:
+            setattr(table, name, np.array(columns[cls.FIELDS.index(name)], dtype=np.int64))
+
+        for name in ("occupancy", "beta"):
+            setattr(table, name, np.array(columns[cls.FIELDS.index(name)], dtype=np.float64))
+
+        table.charge = np.array([table._charge_to_float(i) for i in columns[cls.FIELDS.index("charge")]], dtype=np.float64)
+
+        table.coords = np.array([columns[cls.FIELDS.index(name)] for name in cls.COORD_COLUMNS], dtype=np.float64).T.copy()
+        table.formatted_ok = np.array(columns[cls.FIELDS.index("formatted_ok")], dtype=bool)
+
+        return table
+    
+
+    @classmethod
+    def concatenate(cls, tables):
+        """ Returns a new table holding the rows of each table in tables, 
+            one after another. Boundaries are NOT carried over - call 
+            assign_boundaries() on the result.
+        """
+
+        table = cls(0)
+        for name in table.column_names():
+            setattr(table, name, np.concatenate([getattr(i, name) for i in tables]))
+
+        return table
+
+    def take(self, rows):
+        """ Returns a new table made up of the rows selected by the
+            index array rows (in that order). Boundaries are NOT carried
+            over - call assign_boundaries() on the result.
+        """
+
+        table = PDB_atom_table(0)
+        for name in self.column_names():
+            setattr(table, name, getattr(self, name)[rows])
+
+        return table
+
+    def permute_rows(self, start, perm, skip=()):
+        """ Reorders the rows start:start+len(perm) in place so that row
+            start+i takes the values previously held by row start+perm[i].
+            Columns named in skip are left untouched.
+        """
+
+        stop = start + len(perm)
+        perm = np.asarray(perm, dtype=np.int64) + start
+
+        for name in self.column_names():
+            if name in skip:
+                continue
+            column = getattr(self, name)
+            column[start:stop] = column[perm]
+
+        # the rows keep track of the lines they were read from
+        for name in ("source_rows", "source_starts", "source_stops", "source_fingerprint"):
+            column = getattr(self, name)
+            if column is not None:
+                column[start:stop] = column[perm]
+
+
+    def assign_boundaries(self):
+        """ Defines residue and chain boundaries and the chain local IDs.
+
+            A crucial assumption is that the atoms of each chain occupy one
+            contiguous block of rows. Within a chain a new residue starts 
+            every time the residue ID changes from one atom to the next. 
+            chainLocal ID values ALWAYS start from 1 for the first residue
+            in a chain and increment by one through the chain.
+        """
+
+        n_atoms = len(self)
+
+        if n_atoms == 0:
+            self.residue_offsets = np.zeros(1, dtype=np.int64)
+            self.chain_offsets   = np.zeros(1, dtype=np.int64)
+            self.chain_names     = []
+            return
+
+        chain_starts = np.flatnonzero(self.chain[1:] != self.chain[:-1]) + 1
+        chain_starts = np.concatenate(([0], chain_starts))
+
+        res_break = self.res_id[1:] != self.res_id[:-1]
+        res_break[chain_starts[1:] - 1] = True
+        res_starts = np.concatenate(([0], np.flatnonzero(res_break) + 1))
+
+        self.residue_offsets = np.append(res_starts, n_atoms).astype(np.int64)
+        self.chain_offsets   = np.append(np.searchsorted(res_starts, chain_starts), len(res_starts)).astype(np.int64)
+        self.chain_names     = [str(self.chain[i]) for i in chain_starts]
+
+        # chain local IDs - per residue and then broadcast to the atoms
+        res_index = np.arange(len(res_starts), dtype=np.int64)
+        first_res = np.repeat(self.chain_offsets[:-1], np.diff(self.chain_offsets))
+        self.chain_local_id = np.repeat(res_index - first_res + 1, np.diff(self.residue_offsets))
+
+
+    def column_names(self):
+        """ Returns the names of the array attributes holding per-atom data """
+        return [i[0] for i in self.STRING_COLUMNS] + list(self.INT_COLUMNS) + list(self.FLOAT_COLUMNS) + ["coords", "formatted_ok"]
+
+    def get_value(self, column, index):
+        """ Returns the value of a field for a single atom as a plain
+            Python object (str, int, float or bool). Blank charges are 
+            returned as " ".
+        """
+
+        if column in self.COORD_COLUMNS:
+            return float(self.coords[index, self.COORD_COLUMNS.index(column)])
+
+        value = getattr(self, column)[index]
+
+        if column == "charge":
+            if np.isnan(value):
+                return " "
+            return float(value)
+        if column in self.FLOAT_COLUMNS:
+            return float(value)
+        if column in self.INT_COLUMNS:
+            return int(value)
+        if column == "formatted_ok":
+            return bool(value)
+
+        # text fields come from a small vocabulary ("ATOM", "CA", "ALA",
+        # ...) so hand back one shared string per distinct value
+        return intern(str(value))
+
+    def set_value(self, column, index, value):
+        """ Sets the value of a field for one atom (index is an int) or for
+            a range of atoms (index is a slice or index array). String
+            columns are widened if value does not fit.
+        """
+
+        if column in self.COORD_COLUMNS:
+            self.coords[index, self.COORD_COLUMNS.index(column)] = float(value)
+            return
+
+        if column == "charge":
+            self.charge[index] = self._charge_to_float(value)
+            return
+
+        array = getattr(self, column)
+
+        if array.dtype.kind == "S":
+            value = str(value)
+            if len(value) > array.dtype.itemsize:
+                array = array.astype("S%i" % len(value))
+                setattr(self, column, array)
+
+        array[index] = value
+
+    def _charge_to_float(self, charge):
+        if isinstance(charge, basestring) and charge.strip() == "":
+            return np.nan
+        return float(charge)
+
+    def attach_source(self, text, starts, stops, fingerprint=None):
+        """ Records the line each row was read from (row i from
+            text[starts[i]:stops[i]]) along with a fingerprint of the 
+            written fields of every row as it is now, so a row can later
+            be told apart from its line once it has been edited (see
+            modified_rows). The source is not carried over by take() or
+            concatenate(). A fingerprint already taken of the rows (as
+            the workers of a parallel parse do) can be passed in.
+        """
+
+        if fingerprint is None:
+            fingerprint = self.fingerprint()
+
+        self.source_text        = text
+        self.source_starts      = np.asarray(starts, dtype=np.int64)
+        self.source_stops       = np.asarray(stops, dtype=np.int64)
+        self.source_fingerprint = fingerprint
+
+    def fingerprint(self, rows=None):
+        """ Returns a 64 bit hash of the written fields (FINGERPRINT_COLUMNS)
+            of each row (or of rows). Used instead of tracking every 
+            write, so edits made straight on the column arrays are seen 
+            as well as those made through set_value and the views.
+        """
+
+        if rows is None:
+            rows = slice(None)
+
+        n_rows = len(self.atom_id[rows])
+
+        # one word per field - numbers by their bits, text fields by 
+        # their bytes (NUL padded, so widening a column does not change 
+        # a hash)
+        words = []
+        for name in self.FINGERPRINT_COLUMNS:
+            if name in self.COORD_COLUMNS:
+                words.append(np.ascontiguousarray(self.coords[rows, self.COORD_COLUMNS.index(name)]).view(np.uint64))
+            elif getattr(self, name).dtype.kind == "S":
+                words.append(_string_word(getattr(self, name)[rows]))
+            else:
+                words.append(np.ascontiguousarray(getattr(self, name)[rows]).view(np.uint64))
+
+        # FNV style - xor in each word and multiply by a large odd number
+        hashes = np.empty(n_rows, dtype=np.uint64)
+        hashes.fill(np.uint64(0xcbf29ce484222325))
+        for word in words:
+            hashes ^= word
+            hashes *= np.uint64(0x100000001b3)
+
+        return hashes
+
+    def modified_rows(self, rows=None):
+        """ Returns a bool array which is True for each row (or each of
+            rows) that no longer matches the line it was read from - every
+            row, if the table has no source.
+        """
+
+        if rows is None:
+            rows = np.arange(len(self))
+
+        if self.source_fingerprint is None:
+            return np.ones(len(rows), dtype=bool)
+
+        return self.fingerprint(rows) != self.source_fingerprint[rows]
+
+    def get_residue_range(self, residue_index):
+        """ Returns the (start, stop) atom rows of a residue """
+        return (int(self.residue_offsets[residue_index]), int(self.residue_offsets[residue_index+1]))
+
+    def get_chain_range(self, chain_index):
+        """ Returns the (start, stop) residue indices of a chain """
+        return (int(self.chain_offsets[chain_index]), int(self.chain_offsets[chain_index+1]))
+
+    @property
+    def n_residues(self):
+        return len(self.residue_offsets) - 1
+
+    @property
+    def n_chains(self):
+        return len(self.chain_names)
+
+    def __len__(self):
+        return len(self.atom_id)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_atom_table of " + str(len(self)) + " atoms>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+def _string_word(strings):
+    """ Packs each string of a fixed width string array into one 64 bit
+        word (its NUL padded bytes read as a little-endian integer - 
+        folded together 8 bytes at a time if wider)
+    """
+
+    strings = np.ascontiguousarray(strings)
+    width = strings.dtype.itemsize
+
+    for size in (1, 2, 4, 8):
+        if width <= size:
+            if width < size:
+                strings = strings.astype("S%i" % size)
+            return strings.view("<u%i" % size).astype(np.uint64)
+
+    n_words = (width + 7) // 8
+    words = strings.astype("S%i" % (8 * n_words)).view("<u8").reshape(len(strings), n_words)
+
+    # trailing all-NUL words add nothing, as for a narrower column
+    folded = np.zeros(len(strings), dtype=np.uint64)
+    for i in xrange(n_words):
+        folded += words[:, i] * np.uint64(pow(0x100000001b3, i, 1 << 64))
+
+    return folded
+
+
+def _table_column(column):
+    """ Builds a property which reads/writes a single column of the 
+        atom table at the row a PDB_atom view points to
+    """
+    def fget(self):
+        return self._table.get_value(column, self._index)
+
+    def fset(self, value):
+        self._table.set_value(column, self._index, value)
+
+    return property(fget, fset)
+
+
+
+def _is_whitespace(chars):
+    """ Elementwise test of a uint8 array for the characters str.strip()
+        removes (space, \\t, \\n, \\x0b, \\x0c and \\r)
+    """
+    return (chars == 32) | ((chars - np.uint8(9)) < 5)
+
+
+def _string_lengths(strings):
+    """ Vectorized len() of every element of a fixed-width string (S) 
+        array, read off the trailing padding bytes
+    """
+
+    width = strings.dtype.itemsize
+    if width == 0:
+        return np.zeros(len(strings), dtype=np.int64)
+
+    filled = np.ascontiguousarray(strings).view(np.uint8).reshape(len(strings), width) != 0
+
+    return np.where(filled.any(axis=1), width - np.argmax(filled[:, ::-1], axis=1), 0)
+
+
+def _too_wide(strings, width):
+    """ Indices of the elements of a string array longer than width """
+
+    if strings.dtype.itemsize <= width:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.flatnonzero(_string_lengths(strings) > width)
+
+
+def _left_justified(strings, width):
+    """ (N,width) uint8 characters of a string array, each string padded
+        on the right with spaces. No string may be longer than width.
+    """
+
+    chars = np.ascontiguousarray(strings.astype("S%i" % width)).view(np.uint8).reshape(len(strings), width).copy()
+    chars[chars == 0] = 32
+
+    return chars
+
+
+def _right_justified(strings, width):
+    """ (N,width) uint8 characters of a string array, each string padded
+        on the left with spaces. No string may be longer than width.
+    """
+
+    chars = _left_justified(strings, width)
+
+    shift = width - _string_lengths(strings)
+    if not shift.any():
+        return chars
+
+    source = np.arange(width) - shift[:, np.newaxis]
+    padded = chars[np.arange(len(strings))[:, np.newaxis], np.maximum(source, 0)]
+    padded[source < 0] = 32
+
+    return padded
+
+
+def _integer_chars(values, width):
+    """ (N,width) uint8 characters of an integer array written as "%*d" 
+        (right justified). Every value must fit in width characters.
+    """
+
+    chars = np.empty((len(values), width), dtype=np.uint8)
+    chars.fill(32)
+
+    magnitude = np.abs(values)
+    n_digits = np.ones(len(values), dtype=np.int64)
+    for place in xrange(1, width):
+        n_digits += magnitude >= 10**place
+
+    for place in xrange(width):
+        written = place < n_digits
+        chars[written, width-1-place] = 48 + (magnitude[written] // 10**place) % 10
+
+    negative = np.flatnonzero(values < 0)
+    chars[negative, width-1-n_digits[negative]] = 45
+
+    return chars
+
+
+def _serial_chars(values, width):
+    """ _integer_chars for atom serials/residue numbers - values too big
+        for width decimal digits are written in hybrid-36
+    """
+
+    encoded = values >= 10**width
+    if not encoded.any():
+        return _integer_chars(values, width)
+
+    chars = _integer_chars(np.where(encoded, 0, values), width)
+    chars[encoded] = pdbhybrid36.encode_chars(values[encoded], width)
+
+    return chars
+
+
+def _fixed_point_chars(values, width, decimals):
+    """ (N,width) uint8 characters of a float array written as "%*.*f" 
+        (right justified). Every formatted value must fit in width 
+        characters.
+
+        Values are rounded in integer arithmetic. Anywhere that could 
+        round differently from Python's (correctly rounded) formatting -
+        large magnitudes, non-finite values and values within rounding
+        error of a half - the value is formatted by Python instead.
+    """
+
+    scale = 10**decimals
+    n_values = len(values)
+
+    # largest integer part which is formatted here (leaves room for a 
+    # sign and the decimal point)
+    limit = 10**(width - decimals - 2) - 1
+
+    with np.errstate(invalid="ignore"):
+        scaled = np.abs(values) * scale
+        rounded = np.rint(scaled)
+        remainder = np.abs(scaled - np.floor(scaled) - 0.5)
+        direct = (np.abs(values) < limit) & (remainder > 1e-6)
+
+    magnitude = np.where(direct, rounded, 0).astype(np.int64)
+    whole = magnitude // scale
+    fraction = magnitude % scale
+
+    chars = np.empty((n_values, width), dtype=np.uint8)
+    chars.fill(32)
+
+    point = width - decimals - 1
+    chars[:, point] = 46
+    for place in xrange(decimals):
+        chars[:, width-1-place] = 48 + (fraction // 10**place) % 10
+
+    n_digits = np.ones(n_values, dtype=np.int64)
+    for place in xrange(1, point):
+        n_digits += whole >= 10**place
+
+    for place in xrange(point):
+        written = place < n_digits
+        chars[written, point-1-place] = 48 + (whole[written] // 10**place) % 10
+
+    # "%.3f" keeps the sign of negative values which round to zero
+    negative = np.flatnonzero(np.signbit(values) & direct)
+    chars[negative, point-1-n_digits[negative]] = 45
+
+    template = "%" + str(width) + "." + str(decimals) + "f"
+    for i in np.flatnonzero(~direct):
+        chars[i] = np.frombuffer(template % values[i], dtype=np.uint8)
+
+    return chars
+
+
+def _fixed_width_lines(atomlines):
+    """ Locates the well formatted (80 character) lines in atomlines.
+        Returns the (N,80) uint8 character matrix of those lines, their
+        indices in atomlines and the indices of every other line.
+    """
+
+    # locate every line in one joined buffer
+    (text, starts, stops) = _joined_lines(atomlines)
+
+    return _fixed_width_rows(text, starts, stops)
+
+
+def _fixed_width_rows(text, starts, stops, tile=16384):
+    """ _fixed_width_lines for lines held in one string - line i being
+        text[starts[i]:stops[i]]
+    """
+
+    n_lines = len(starts)
+    buffer  = np.frombuffer(text, dtype=np.uint8)
+    lengths = stops - starts
+
+    has_newline = np.zeros(n_lines, dtype=bool)
+    nonempty = lengths > 0
+    has_newline[nonempty] = buffer[stops[nonempty] - 1] == 10
+
+    fixed = (lengths - has_newline) == 80
+
+    fixed_rows = np.flatnonzero(fixed)
+    other_rows = np.flatnonzero(~fixed)
+
+    # (N,80) character matrix. When every line has the same length and
+    # they follow on from each other (the usual case) this is just a view
+    # of the buffer. Runs of such lines broken up by other records (e.g. 
+    # TER between chains) are copied a run at a time, and anything else
+    # is gathered a tile at a time
+    same_length = len(fixed_rows) == n_lines and (lengths == lengths[0]).all()
+    breaks = np.flatnonzero(starts[1:] != stops[:-1]) + 1
+
+    if same_length and len(breaks) == 0:
+        chars = buffer[starts[0]:stops[-1]].reshape(n_lines, lengths[0])[:, :80]
+    elif same_length and len(breaks) * 64 < n_lines:
+        chars = np.empty((n_lines, 80), dtype=np.uint8)
+        for (first, last) in zip(np.append(0, breaks).tolist(), np.append(breaks, n_lines).tolist()):
+            chars[first:last] = buffer[starts[first]:stops[last-1]].reshape(last - first, lengths[0])[:, :80]
+    else:
+        chars = np.empty((len(fixed_rows), 80), dtype=np.uint8)
+        for first in xrange(0, len(fixed_rows), tile):
+            rows = fixed_rows[first:first+tile]
+            chars[first:first+len(rows)] = buffer[starts[rows][:, np.newaxis] + np.arange(80)]
+
+    return (chars, fixed_rows, other_rows)
+
+
+def _joined_lines(lines):
+    """ Joins lines into one string and returns it with the [start, stop)
+        offsets of each line in it
+    """
+
+    stops = np.cumsum(np.array(map(len, lines), dtype=np.int64))
+    starts = np.empty_like(stops)
+    starts[:1] = 0
+    starts[1:] = stops[:-1]
+
+    return ("".join(lines), starts, stops)
+
+
+def _transpose_chars(chars, tile=4096):
+    """ Returns a C-contiguous transpose of the (N,w) uint8 array chars. 
+        Done in tiles of lines so that each copy stays in cache, which is
+        several times faster than a single strided copy for large N.
+    """
+
+    (n_rows, width) = chars.shape
+    transposed = np.empty((width, n_rows), dtype=np.uint8)
+
+    for start in xrange(0, n_rows, tile):
+        transposed[:, start:start+tile] = chars[start:start+tile].T
+
+    return transposed
+
+
+# first/last set bit (counting from the most significant bit) of every 
+# byte value, used to find where a packed filled-character mask starts
+# and ends. -1 if the byte is empty
+_FIRST_BIT = np.array([min([i for i in range(8) if b & (128 >> i)] or [-1]) for b in range(256)], dtype=np.int64)
+_LAST_BIT  = np.array([max([i for i in range(8) if b & (128 >> i)] or [-1]) for b in range(256)], dtype=np.int64)
+
+def _fixed_width_strings(columns):
+    """ Converts a (w,N) uint8 array holding the w (at most 8) characters
+        of a fixed width field for N lines (character position major) into
+        an array of N whitespace-stripped strings (dtype Sw) - the 
+        vectorized equivalent of calling .strip() on the field of each 
+        line.
+    """
+
+    (width, n_rows) = columns.shape
+
+    # first and last non-whitespace position of each field, read off the
+    # filled-character mask packed into one byte per line
+    packed = np.zeros(n_rows, dtype=np.uint8)
+    for position in xrange(width):
+        packed |= (~_is_whitespace(columns[position])).view(np.uint8) << np.uint8(7 - position)
+    lead   = _FIRST_BIT[packed]
+    count  = _LAST_BIT[packed] - lead + 1
+    lead[count == 0] = 0
+
+    # treat each (zero padded) field as one little-endian integer, so 
+    # left-aligning is a right shift by the leading whitespace and 
+    # dropping the trailing whitespace is a mask - the NUL bytes left 
+    # behind are exactly what a fixed-width string array pads with
+    n_bytes = 1
+    while n_bytes < width:
+        n_bytes = n_bytes * 2
+
+    padded = np.zeros((n_rows, n_bytes), dtype=np.uint8)
+    padded[:, :width] = columns.T
+
+    fields = padded.view("<u%i" % n_bytes).ravel()
+    masks  = np.array([(1 << (8*i)) - 1 for i in xrange(n_bytes+1)], dtype=np.uint64)
+
+    fields = (fields >> (8*lead).astype(np.uint64)) & masks[count]
+
+    return fields.astype("<u%i" % n_bytes).view("S%i" % n_bytes).astype("S%i" % width)
+
+
+def _fixed_width_numbers(columns, dtype):
+    """ Converts a (w,N) uint8 array holding the w characters of a fixed
+        width numeric field for N lines (character position major) into 
+        an array of dtype np.int64 or np.float64.
+
+        Values are identical to int()/float() on the field. Well formatted
+        PDB fields are right justified with the decimal point (if any) in
+        the same position on every line, so each digit position carries a
+        fixed place value and the whole field converts as one weighted
+        sum. Anything else goes through the general parser below.
+    """
+
+    (width, n_rows) = columns.shape
+
+    value = columns - np.uint8(48)
+    digit = value < 10
+    dot   = columns == 46
+    sign  = (columns == 45) | (columns == 43)
+
+    points = np.flatnonzero(dot.any(axis=1))
+    if dtype == np.int64:
+        regular = len(points) == 0
+        point = width
+    else:
+        regular = len(points) == 1 and dot[points[0]].all()
+        point = points[0] if regular else width
+
+    # right justified [sign]digits[.digits] - nothing but spaces before 
+    # the sign/first digit, ends in a digit and digits/sign are only ever
+    # followed by digits or the point
+    regular = regular and digit[-1].all() and (digit | dot | sign | (columns == 32)).all()
+    regular = regular and not ((digit[:-1] | sign[:-1]) & ~(digit[1:] | dot[1:])).any()
+    regular = regular and not (dot[:-1] & ~digit[1:]).any()
+
+    if not regular:
+        return _parse_numbers(columns, dtype)
+
+    n_decimals = max(width - point - 1, 0)
+    places  = np.arange(width-1, -1, -1) - ((np.arange(width) < point) & (point < width))
+    weights = np.where(np.arange(width) == point, 0.0, 10.0 ** places)
+
+    value[~digit] = 0
+    mantissa = np.zeros(n_rows, dtype=np.float64)
+    for position in xrange(width):
+        if weights[position] > 0:
+            mantissa += weights[position] * value[position]
+    negative = (columns == 45).any(axis=0)
+
+    if dtype == np.int64:
+        values = mantissa.astype(np.int64)
+    else:
+        # an exact integer divided by an exact power of ten is correctly
+        # rounded, i.e. identical to float() on the string
+        values = mantissa / (10.0 ** n_decimals)
+
+    return np.where(negative, -values, values)
+
+
+def _serial_numbers(columns):
+    """ _fixed_width_numbers for the atom serial/residue number fields,
+        which beyond their decimal range are written in hybrid-36 (see
+        pdbhybrid36) - only the fields starting with a letter are decoded
+        as such
+    """
+
+    encoded = pdbhybrid36.is_encoded(columns)
+    if not encoded.any():
+        return _fixed_width_numbers(columns, np.int64)
+
+    values = np.empty(columns.shape[1], dtype=np.int64)
+    values[encoded] = pdbhybrid36.decode_columns(columns[:, encoded])
+    if not encoded.all():
+        values[~encoded] = _fixed_width_numbers(columns[:, ~encoded], np.int64)
+
+    return values
+
+
+def _parse_numbers(columns, dtype):
+    """ General (but slower) version of _fixed_width_numbers which walks 
+        the w character positions once, handling any justification and 
+        decimal point position. Any field which is not a plain space padded
+        [sign]digits[.digits] number is handed to numpy's per-element
+        string cast, which raises ValueError for genuinely bad fields 
+        exactly as int()/float() would.
+    """
+
+    (width, n_rows) = columns.shape
+
+    mantissa = np.zeros(n_rows, dtype=np.int64)
+    decimals = np.zeros(n_rows, dtype=np.int8)
+    n_digits = np.zeros(n_rows, dtype=np.int8)
+    seen_dot = np.zeros(n_rows, dtype=bool)
+    negative = np.zeros(n_rows, dtype=bool)
+    started  = np.zeros(n_rows, dtype=bool)
+    ended    = np.zeros(n_rows, dtype=bool)
+    bad      = np.zeros(n_rows, dtype=bool)
+
+    for position in xrange(width):
+        char  = columns[position]
+        value = char - np.uint8(48)
+        digit = value < 10
+        space = char == 32
+        dot   = char == 46
+        sign  = (char == 45) | (char == 43)
+
+        bad |= ~(digit | space | dot | sign)
+        bad |= sign & started
+        bad |= dot & seen_dot
+        bad |= ended & ~space
+        
+        ended   |= started & space
+        started |= ~space
+
+        mantissa = np.where(digit, mantissa*10 + value, mantissa)
+        decimals += (digit & seen_dot).view(np.int8)
+        n_digits += digit.view(np.int8)
+        seen_dot |= dot
+        negative |= char == 45
+
+    bad |= n_digits == 0
+    if dtype == np.int64:
+        bad |= seen_dot
+
+    if dtype == np.int64:
+        values = np.where(negative, -mantissa, mantissa)
+    else:
+        values = mantissa / (10.0 ** np.arange(width+1))[decimals]
+        values = np.where(negative, -values, values)
+
+    if bad.any():
+        fields = np.ascontiguousarray(columns[:, bad].T).view("S%i" % width).ravel()
+        values[bad] = fields.astype(dtype)
+
+    return values
+
+
+
 ##-------------------------------------------------------##
 ##                     PDB_atom                          ##
 ##-------------------------------------------------------##
 
-class PDB_atom:
+class PDB_atom(object):
     """ Main class which holds an induvidual atom from a PBD file.
         Carries out the parsing of an atom line from a PDB file into a valid
         PDB_atom object.
@@ -53,24 +873,69 @@ class PDB_atom:
         This is the ONLY place where parsing of the PDB atom lines should 
         occur. All further logic based on chain name, residue ID, residue
         name
-    """
-
 
+        A PDB_atom is a view onto one row of a PDB_atom_table. Atoms
+        built directly from a line own a single-row table, while atoms 
+        obtained from a PDB_file/PDB_chain/PDB_residue point into the 
+        file's table.
 
-    def __init__(self, line):
-        self.parse(line)
+        Views carry no per-instance __dict__ (just a table reference and
+        a row number), so holding many atoms is cheap.
+    """
 
-    def parse(self, line):        
-        """ This is the initialization parser. Converts a line
-            from a PDB file and initializes the PDB_atom's variables
-            to appropriate values. Uses implicit typecasting as a 
-            failcheck for parsing the file correctly.
+    __slots__ = ("_table", "_index")
+
+    record_name    = _table_column("record_name")
+    atom_id        = _table_column("atom_id")
+    atom_name      = _table_column("atom_name")
+    alt_location   = _table_column("alt_location")
+    res_name       = _table_column("res_name")
+    chain          = _table_column("chain")
+    res_id         = _table_column("res_id")
+    res_ins_code   = _table_column("res_ins_code")
+    coord_X        = _table_column("coord_X")
+    coord_Y        = _table_column("coord_Y")
+    coord_Z        = _table_column("coord_Z")
+    occupancy      = _table_column("occupancy")
+    beta           = _table_column("beta")
+    seg_ID         = _table_column("seg_ID")
+    element        = _table_column("element")
+    charge         = _table_column("charge")
+    chain_local_id = _table_column("chain_local_id")
+    formatted_ok   = _table_column("formatted_ok")
+
+    # (field, start, stop) of each column in a well formatted (80 
+    # character) atom line - exactly the slices used in parse_fields
+    FIXED_COLUMNS = (("record_name",   0,  6),
+                     ("atom_id",       6, 11),
+                     ("atom_name",    12, 16),
+                     ("alt_location", 16, 17),
+                     ("res_name",     17, 20),
+                     ("chain",        21, 22),
+                     ("res_id",       22, 26),
+                     ("res_ins_code", 26, 27),
+                     ("coord_X",      30, 38),
+                     ("coord_Y",      38, 46),
+                     ("coord_Z",      46, 54),
+                     ("occupancy",    54, 60),
+                     ("beta",         60, 66),
+                     ("seg_ID",       72, 76),
+                     ("element",      76, 78),
+                     ("charge",       78, 80))
+
+    # single character fields which parse_fields does not strip
+    UNSTRIPPED_COLUMNS = ("alt_location", "chain", "res_ins_code")
+
+    def __init__(self, line=None, table=None, index=0):
+        if line is not None:
+            self.parse(line)
+        else:
+            self._table = table
+            self._index = index
 
-            Well formatted PDB files are 80 characters across and are
-            well defined/easy to parse.
-            
-            Sadly not all PDB files are like this, so we use a heuristic
-            to parse PDB files which are not 80 characters across.
+    def parse(self, line):
+        """ Parses a line and makes this atom a view onto a single-row
+            table holding the result (see parse_fields).
 
             # INPUT
             line      :     String
@@ -78,125 +943,337 @@ class PDB_atom:
             # OUTPUT
             -         :     None
         """
-	
-	# remove trailing newline a-la Perl CHOMP
-	line = line.rstrip("\n")
 
-	
-        # correctly formatted PDB files
-        # TODO - assuming 80 chars means well formatted is
-        #        perhaps risky. Need a more robust way to asses
-        #        formatting validity
+        self._table = PDB_atom_table.from_records([self.parse_fields(line)])
+        self._index = 0
 
-        if len(line) == 80:
-            self.record_name    = line[0:6].strip()
-            self.atom_id        = int(line[6:11].strip())
-            self.atom_name      = line[12:16].strip()
-            self.alt_location   = line[16]
-            self.res_name       = line[17:20].strip()
-            self.chain          = line[21]
-            self.res_id         = line[22:26].strip()
-            self.res_ins_code   = line[26]
-            self.coord_X        = float(line[30:38].strip())
-            self.coord_Y        = float(line[38:46].strip())
-            self.coord_Z        = float(line[46:54].strip())
-            self.occupancy      = float(line[54:60].strip())
-            self.beta           = float(line[60:66].strip())
-            self.seg_ID         = line[72:76].strip()
-            self.element        = line[76:78].strip()
-	    if line[78:80].strip() == "":
-		    self.charge=0.0
-	    else:
-		    self.charge = float(line[78:80].strip())
-            self.chain_local_id = -1
-            self.formatted_ok   = True
+    @staticmethod
+    def parse_block(atomlines):
+        """ Bulk parser which converts a block of atom lines directly into
+            a PDB_atom_table (rows in the same order as atomlines) without
+            building a PDB_atom per line.
 
-        # Heuristic section - split by space and then use
-        # errors in casting as flags for things being issues
-        # Note this may need to be expanded as malformed edge-cases
-        # are identified...
-        else:
-            rawsplitline = filter(None, line.split(" "))
-	    
-	    
+            All well formatted (80 character) lines are joined into a 
+            single buffer which is viewed as an (N,80) character array, so
+            every fixed-width column is sliced out for all lines at once and
+            the numeric columns are cast in batch. This gives identical
+            field values to the 80 character branch of parse_fields. Lines
+            which are not 80 characters fall back to the per-line 
+            heuristic parser.
 
-            splitline = []
-            for i in rawsplitline:
-                if i == "\n" or i == "\t":
-                    pass
-                else:
-                    splitline.append(i)
-                    
-            num_cols = len(splitline)
+            # INPUT
+            atomlines :     List of strings
 
-	    print num_cols
-            
+            # OUTPUT
+            -         :     PDB_atom_table
+        """
+
+        if len(atomlines) == 0:
+            return PDB_atom_table(0)
+
+        return PDB_atom.parse_text(*_joined_lines(atomlines))
+
+    @staticmethod
+    def parse_text(text, starts, stops):
+        """ parse_block for atom lines held in one string - line i being
+            text[starts[i]:stops[i]] - which saves splitting the text 
+            into lines first
+
+            # INPUT
+            text   :     String
+            starts :     Int array
+            stops  :     Int array
+
+            # OUTPUT
+            -      :     PDB_atom_table
+        """
+
+        if len(starts) == 0:
+            return PDB_atom_table(0)
+
+        (chars, fixed_rows, other_rows) = _fixed_width_rows(text, starts, stops)
+
+        fast_table = PDB_atom.__parse_fixed_columns(chars)
+
+        if len(other_rows) == 0:
+            return fast_table
+
+        slow_table = PDB_atom_table.from_records([PDB_atom.parse_fields(text[starts[i]:stops[i]]) for i in other_rows])
+
+        if len(fixed_rows) == 0:
+            return slow_table
+
+        # stitch the two back together in the original line order
+        table = PDB_atom_table.concatenate([fast_table, slow_table])
+        order = np.argsort(np.concatenate((fixed_rows, other_rows)), kind="mergesort")
+
+        return table.take(order)
+
+    @staticmethod
+    def parse_coordinates(atomlines):
+        """ Parses only the coordinates out of a block of atom lines. 
+            Only columns 31-54 of well formatted (80 character) lines are
+            read; other lines fall back to the per-line heuristic parser.
+            Gives identical values to parse_block(atomlines).coords
+
+            # INPUT
+            atomlines :     List of strings
+
+            # OUTPUT
+            -         :     (N,3) float array (rows in the same order as
+                            atomlines)
+        """
+
+        if len(atomlines) == 0:
+            return np.zeros((0, 3), dtype=np.float64)
+
+        return PDB_atom.parse_text_coordinates(*_joined_lines(atomlines))
+
+    @staticmethod
+    def parse_text_coordinates(text, starts, stops, names=False):
+        """ parse_coordinates for atom lines held in one string - line i
+            being text[starts[i]:stops[i]]. With names=True the atom 
+            names (columns 13-16) are read as well.
+
+            # INPUT
+            text   :     String
+            starts :     Int array
+            stops  :     Int array
+            names  :     Bool
+
+            # OUTPUT
+            -      :     (N,3) float array, or ((N,3) float array, 
+                         string array) with names=True
+        """
+
+        coords = np.zeros((len(starts), 3), dtype=np.float64)
+        atom_names = np.zeros(len(starts), dtype="S4")
+
+        if len(starts) == 0:
+            return (coords, atom_names) if names else coords
+
+        (chars, fixed_rows, other_rows) = _fixed_width_rows(text, starts, stops)
+
+        # the X, Y and Z fields are adjacent, so only that block of 
+        # characters is transposed
+        spans = dict((name, (first, last)) for (name, first, last) in PDB_atom.FIXED_COLUMNS)
+        offset = spans["coord_X"][0]
+
+        by_position = _transpose_chars(chars[:, offset:spans["coord_Z"][1]])
+        for (i, name) in enumerate(PDB_atom_table.COORD_COLUMNS):
+            (first, last) = spans[name]
+            coords[fixed_rows, i] = _fixed_width_numbers(by_position[first-offset:last-offset], np.float64)
+
+        if names:
+            (first, last) = spans["atom_name"]
+            atom_names[fixed_rows] = _fixed_width_strings(_transpose_chars(chars[:, first:last]))
+
+        x_field = PDB_atom_table.FIELDS.index("coord_X")
+        name_field = PDB_atom_table.FIELDS.index("atom_name")
+        for i in other_rows:
+            fields = PDB_atom.parse_fields(text[starts[i]:stops[i]])
+            coords[i] = fields[x_field:x_field+3]
+            if names:
+                if len(fields[name_field]) > atom_names.itemsize:
+                    atom_names = atom_names.astype("S%i" % len(fields[name_field]))
+                atom_names[i] = fields[name_field]
+
+        return (coords, atom_names) if names else coords
+
+    @staticmethod
+    def __parse_fixed_columns(chars, chunk=16384):
+        """ Vectorized equivalent of the 80 character branch of 
+            parse_fields, run over an (N,80) uint8 array holding the 
+            characters of N well formatted lines. Lines are processed 
+            in chunks so the per-character temporaries stay in cache.
+        """
+
+        n_atoms = chars.shape[0]
+        table = PDB_atom_table(n_atoms)
+
+        for start in xrange(0, n_atoms, chunk):
+            rows = slice(start, min(start+chunk, n_atoms))
+
+            # every field is handled character position by position, so 
+            # work on the (80,n) transpose where each position is 
+            # contiguous
+            by_position = _transpose_chars(chars[rows])
+
+            blocks = {}
+            for (name, first, last) in PDB_atom.FIXED_COLUMNS:
+                blocks[name] = by_position[first:last]
+
+            for (name, width) in PDB_atom_table.STRING_COLUMNS:
+                if name in PDB_atom.UNSTRIPPED_COLUMNS:
+                    getattr(table, name)[rows] = blocks[name][0].view("S1")
+                else:
+                    getattr(table, name)[rows] = _fixed_width_strings(blocks[name])
+
+            table.atom_id[rows]   = _serial_numbers(blocks["atom_id"])
+            table.res_id[rows]    = _serial_numbers(blocks["res_id"])
+            table.occupancy[rows] = _fixed_width_numbers(blocks["occupancy"], np.float64)
+            table.beta[rows]      = _fixed_width_numbers(blocks["beta"], np.float64)
+
+            for (i, name) in enumerate(PDB_atom_table.COORD_COLUMNS):
+                table.coords[rows, i] = _fixed_width_numbers(blocks[name], np.float64)
+
+            # blank charge columns are read as 0.0
+            charge = table.charge[rows]
+            has_charge = ~_is_whitespace(blocks["charge"]).all(axis=0)
+            if has_charge.any():
+                charge[has_charge] = _fixed_width_numbers(blocks["charge"][:, has_charge], np.float64)
+
+        table.chain_local_id[:] = -1
+        table.formatted_ok[:]   = True
+
+        return table
+
+    @staticmethod
+    def parse_fields(line):        
+        """ This is the initialization parser. Converts a line
+            from a PDB file into a tuple of atom field values (ordered
+            as PDB_atom_table.FIELDS). Uses implicit typecasting as a 
+            failcheck for parsing the file correctly.
+
+            Well formatted PDB files are 80 characters across and are
+            well defined/easy to parse.
+            
+            Sadly not all PDB files are like this, so we use a heuristic
+            to parse PDB files which are not 80 characters across.
+
+            Numeric fields are returned as int/float whichever branch is
+            used (a charge the heuristic can not see is NaN).
+
+            # INPUT
+            line      :     String
+
+            # OUTPUT
+            -         :     Tuple
+        """
+	
+	# remove trailing newline a-la Perl CHOMP
+	line = line.rstrip("\n")
+
+	
+        # correctly formatted PDB files
+        # TODO - assuming 80 chars means well formatted is
+        #        perhaps risky. Need a more robust way to asses
+        #        formatting validity
+
+        if len(line) == 80:
+            record_name    = line[0:6].strip()
+            atom_id        = pdbhybrid36.decode(line[6:11], 5)
+            atom_name      = line[12:16].strip()
+            alt_location   = line[16]
+            res_name       = line[17:20].strip()
+            chain          = line[21]
+            res_id         = pdbhybrid36.decode(line[22:26], 4)
+            res_ins_code   = line[26]
+            coord_X        = float(line[30:38].strip())
+            coord_Y        = float(line[38:46].strip())
+            coord_Z        = float(line[46:54].strip())
+            occupancy      = float(line[54:60].strip())
+            beta           = float(line[60:66].strip())
+            seg_ID         = line[72:76].strip()
+            element        = line[76:78].strip()
+	    if line[78:80].strip() == "":
+		    charge=0.0
+	    else:
+		    charge = float(line[78:80].strip())
+            chain_local_id = -1
+            formatted_ok   = True
+
+        # Heuristic section - split by space and then use
+        # errors in casting as flags for things being issues
+        # Note this may need to be expanded as malformed edge-cases
+        # are identified...
+        else:
+            rawsplitline = filter(None, line.split(" "))
+	    
+	    
+
+            splitline = []
+            for i in rawsplitline:
+                if i == "\n" or i == "\t":
+                    pass
+                else:
+                    splitline.append(i)
+                    
+            num_cols = len(splitline)
+            
             try:
                 if num_cols == 10:
-                    self.record_name    = splitline[0]   
-                    self.atom_id        = int(splitline[1])
-                    self.atom_name      = splitline[2]   
-                    self.alt_location   = ""
-                    self.res_name       = splitline[3]   
-                    self.chain          = ""
-                    self.res_id         = int(splitline[4])
-                    self.res_ins_code   = ""
-                    self.coord_X        = float(splitline[5])  
-                    self.coord_Y        = float(splitline[6])  
-                    self.coord_Z        = float(splitline[7])
-                    self.occupancy      = float(splitline[8])
-                    self.beta           = float(splitline[9])
-                    self.seg_ID         = " "
-                    self.element        = " "                
-                    self.charge         = " "
-                    self.chain_local_id = -1
-                    self.formatted_ok   = False
+                    record_name    = splitline[0]   
+                    atom_id        = pdbhybrid36.decode(splitline[1], 5)
+                    atom_name      = splitline[2]   
+                    alt_location   = ""
+                    res_name       = splitline[3]   
+                    chain          = ""
+                    res_id         = pdbhybrid36.decode(splitline[4], 4)
+                    res_ins_code   = ""
+                    coord_X        = float(splitline[5])  
+                    coord_Y        = float(splitline[6])  
+                    coord_Z        = float(splitline[7])
+                    occupancy      = float(splitline[8])
+                    beta           = float(splitline[9])
+                    seg_ID         = " "
+                    element        = " "                
+                    charge         = np.nan
+                    chain_local_id = -1
+                    formatted_ok   = False
 
                 elif num_cols == 11:
-                    self.record_name    = splitline[0]   
-                    self.atom_id        = int(splitline[1])
-                    self.atom_name      = splitline[2]   
-                    self.alt_location   = " "
-                    self.res_name       = splitline[3]   
-                    self.chain          = splitline[4]
-                    self.res_id         = int(splitline[5])
-                    self.res_ins_code   = " "
-                    self.coord_X        = float(splitline[6])  
-                    self.coord_Y        = float(splitline[7])  
-                    self.coord_Z        = float(splitline[8])  
-                    self.occupancy      = float(splitline[9]) 
-                    self.beta           = float(splitline[10])
-                    self.seg_ID         = " "
-                    self.element        = " "                
-                    self.charge         = " "
-                    self.chain_local_id = -1
-                    self.formatted_ok   = False
+                    record_name    = splitline[0]   
+                    atom_id        = pdbhybrid36.decode(splitline[1], 5)
+                    atom_name      = splitline[2]   
+                    alt_location   = " "
+                    res_name       = splitline[3]   
+                    chain          = splitline[4]
+                    res_id         = pdbhybrid36.decode(splitline[5], 4)
+                    res_ins_code   = " "
+                    coord_X        = float(splitline[6])  
+                    coord_Y        = float(splitline[7])  
+                    coord_Z        = float(splitline[8])  
+                    occupancy      = float(splitline[9]) 
+                    beta           = float(splitline[10])
+                    seg_ID         = " "
+                    element        = " "                
+                    charge         = np.nan
+                    chain_local_id = -1
+                    formatted_ok   = False
 
                 elif num_cols == 12:
-                    self.record_name    = splitline[0]   
-                    self.atom_id        = int(splitline[1])
-                    self.atom_name      = splitline[2]   
-                    self.alt_location   = " "
-                    self.res_name       = splitline[3]   
-                    self.chain          = splitline[4]
-                    self.res_id         = int(splitline[5])
-                    self.res_ins_code   = " "
-                    self.coord_X        = float(splitline[6])  
-                    self.coord_Y        = float(splitline[7])  
-                    self.coord_Z        = float(splitline[8])  
-                    self.occupancy      = float(splitline[9]) 
-                    self.beta           = float(splitline[10])
-                    self.seg_ID         = " "
-                    self.element        = splitline[11]      
-                    self.charge         = " "
-                    self.chain_local_id = -1
-                    self.formatted_ok   = False
+                    record_name    = splitline[0]   
+                    atom_id        = pdbhybrid36.decode(splitline[1], 5)
+                    atom_name      = splitline[2]   
+                    alt_location   = " "
+                    res_name       = splitline[3]   
+                    chain          = splitline[4]
+                    res_id         = pdbhybrid36.decode(splitline[5], 4)
+                    res_ins_code   = " "
+                    coord_X        = float(splitline[6])  
+                    coord_Y        = float(splitline[7])  
+                    coord_Z        = float(splitline[8])  
+                    occupancy      = float(splitline[9]) 
+                    beta           = float(splitline[10])
+                    seg_ID         = " "
+                    element        = splitline[11]      
+                    charge         = np.nan
+                    chain_local_id = -1
+                    formatted_ok   = False
                 else:
                     raise PDB_atomException("Did not match number of columns")
             except ValueError,e:
                 print "Error with columns (using " + str(num_cols) + ") columns"
                 print "Tried to cast string to int/float"
                 raise e
+
+        # the small-vocabulary text fields are interned so repeated
+        # values ("ATOM", "CA", "ALA", ...) share one string object
+        return (intern(record_name), atom_id, intern(atom_name), alt_location, intern(res_name), 
+                intern(chain), res_id, res_ins_code, coord_X, coord_Y, coord_Z, 
+                occupancy, beta, seg_ID, intern(element), charge, chain_local_id,
+                formatted_ok)
                                             
                                             
                     
@@ -208,283 +1285,1430 @@ class PDB_atom:
         return "<PDB_Atom " + self.res_name + str(self.res_id) + " -> " + self.atom_name + "[atom " + str(self.atom_id) + "]>"
 
 ##-------------------END-OF-CLASS------------------------##
-                    
+
+
+
+##-------------------------------------------------------##
+##                  PDB_atom_sequence                    ##
+##-------------------------------------------------------##
+
+class PDB_atom_sequence(object):
+    """ Read-only list-like sequence of PDB_atom views over the rows of
+        a PDB_atom_table. Views are built on demand, so holding the 
+        sequence costs nothing per atom.
+    """
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __iter__(self):
+        for i in xrange(len(self._table)):
+            yield PDB_atom(table=self._table, index=i)
+
+    def __getitem__(self, indx):
+        if isinstance(indx, slice):
+            return [PDB_atom(table=self._table, index=i) for i in xrange(*indx.indices(len(self)))]
+
+        if indx < 0:
+            indx = indx + len(self)
+        if indx < 0 or indx >= len(self):
+            raise IndexError("atom index out of range")
+
+        return PDB_atom(table=self._table, index=indx)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_atom_sequence of " + str(len(self)) + " atoms>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+                    
+##-------------------------------------------------------##
+##                     PDB_residue                       ##
+##-------------------------------------------------------##
+
+class PDB_residue(object):
+    """ Class for holding a single residue. 
+
+        A PDB_residue is a view onto a contiguous block of rows in a 
+        PDB_atom_table (residue number index in that table).
+    """
+
+    __slots__ = ("_table", "_index", "_atom_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+        # atom name -> position (within the residue) of the first atom
+        # with that name. Built on first use and kept up to date by
+        # rename_atom and set_residue_order
+        self._atom_index = None
+
+    @property
+    def atoms(self):
+        (start, stop) = self._table.get_residue_range(self._index)
+        return [PDB_atom(table=self._table, index=i) for i in xrange(start, stop)]
+
+    @property
+    def res_name(self):
+        return self._table.get_value("res_name", self._table.residue_offsets[self._index])
+
+    @property
+    def res_id(self):
+        return self._table.get_value("res_id", self._table.residue_offsets[self._index])
+
+    @property
+    def chain(self):
+        return self._table.get_value("chain", self._table.residue_offsets[self._index])
+
+    @property
+    def chain_local_id(self):
+        return self._table.get_value("chain_local_id", self._table.residue_offsets[self._index])
+
+    def get_alpha_carbon(self):
+        return self.get_atom("CA")
+
+    def get_atom(self, atomname):
+        """ Returns the (first) atom called atomname in this residue, or 
+            None if there is no such atom. Uses the residue's atom name
+            index so is O(1).
+
+            # INPUT
+            atomname :     String
+
+            # OUTPUT
+            -        :     PDB_atom (or None)
+        """
+
+        position = self.__atom_position(str(atomname))
+        if position is not None:
+            (start, stop) = self._table.get_residue_range(self._index)
+            return PDB_atom(table=self._table, index=start+position)
+            
+    def set_residue_order(self, atomname_list):
+
+        (start, stop) = self._table.get_residue_range(self._index)
+        names = [str(i) for i in self._table.atom_name[start:stop]]
+
+        positions = {}
+        for (position, name) in enumerate(names):
+            positions.setdefault(name, []).append(position)
+
+        # collect the new row order - the ordered atom_ids are NOT
+        # moved with the rows, so they are reassigned in order (cannot
+        # assume they're incremented by 1 each time (probably are 
+        # but...)
+        newOrder = []
+        for atomname in atomname_list:
+            newOrder.extend(positions.get(atomname, []))
+        
+        if not len(names) == len(newOrder):
+            msg = "When reseting atom order in  residue must fully define the new order\n" + \
+                  "Old = " + str(self.atoms) + "\n" + \
+                  "New = " + str([PDB_atom(table=self._table, index=start+i) for i in newOrder]) + "\n"
+                  
+            raise PDB_residueException(msg)
+
+        self._table.permute_rows(start, newOrder, skip=("atom_id",))
+
+        self._atom_index = self.__build_atom_index(start, stop)
+
+    def rename_residue(self, newName):
+        (start, stop) = self._table.get_residue_range(self._index)
+        self._table.set_value("res_name", slice(start, stop), newName)
+
+    def rename_atom(self, oldName, newName):
+        
+        oldName = str(oldName)
+        newName = str(newName)
+
+        position = self.__atom_position(oldName)
+        if position is not None:
+            (start, stop) = self._table.get_residue_range(self._index)
+            self._table.set_value("atom_name", start+position, newName)
+
+            # keep the index pointing at the first atom with each name
+            index = self._atom_index
+            del index[oldName]
+            if newName not in index or index[newName] > position:
+                index[newName] = position
+            return
+        msg = "ERROR: Unable to find " + oldName + " in residue " + str(self.res_id) + "(" + self.res_name  + ") in chain " + self.chain + " (to replace with " + newName + ")"
+        raise PDB_residueException(msg)
+
+    def __atom_position(self, atomname):
+        """ Looks atomname up in the atom name index and returns its 
+            position within the residue (or None). The hit is checked 
+            against the table, and the index rebuilt if it is missing or
+            out of date (e.g. after names were edited through a PDB_atom
+            view or directly in the table).
+        """
+
+        (start, stop) = self._table.get_residue_range(self._index)
+
+        if self._atom_index is not None:
+            position = self._atom_index.get(atomname)
+            if position is not None and position < stop - start and self._table.atom_name[start+position] == atomname:
+                return position
+
+        self._atom_index = self.__build_atom_index(start, stop)
+
+        return self._atom_index.get(atomname)
+
+    def __build_atom_index(self, start, stop):
+        index = {}
+        for (position, name) in enumerate(self._table.atom_name[start:stop]):
+            index.setdefault(str(name), position)
+
+        return index
+
+    ## Overwritten default behaviours
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_Residue " + str(self.res_id) + " " + self.res_name + ">"
+
+    def __getitem__(self,indx):
+        return self.atoms[indx]
+
+    def __len__(self):
+        (start, stop) = self._table.get_residue_range(self._index)
+        return stop - start
+    
+    
+
+##-------------------------------------------------------##
+##            PDB_residue_organizer                      ##
+##-------------------------------------------------------##
+
+class PDB_residue_organizer:
+
+    def __init__(self):        
+        pass
+
+    def construct_chains(self, atomlines):
+        """ Parses a list of atom lines and returns an ordered dictionary
+            of PDB_chain objects (in order of first appearance) which are 
+            all views onto a single PDB_atom_table.
+        """
+
+        return self.get_chains_from_table(self.construct_table(atomlines))
+
+    def construct_table(self, atomlines, source=None):
+        """ Parses a list of atom lines into a PDB_atom_table in which
+            the atoms of each chain are contiguous (chains in order of 
+            first appearance) and residue/chain boundaries are defined.
+
+            source may give the text the lines are held in as (text, 
+            starts, stops) - line i being text[starts[i]:stops[i]] - or
+            be True to join the lines into one, and is then attached to
+            the table (see PDB_atom_table.attach_source) so unedited 
+            atoms can be written back out as they were read.
+        """
+
+        with pdbprofile.stage("parse_atoms", lines=len(atomlines)) as parse:
+            parsed_atoms = self.__parse_atoms(atomlines)
+            parse.count(atoms=len(parsed_atoms))
+        
+        with pdbprofile.stage("group_chains", atoms=len(parsed_atoms)):
+            rows = self.group_by_chain(parsed_atoms)
+
+            table = parsed_atoms.take(rows)
+            table.source_rows = rows
+
+        with pdbprofile.stage("boundaries", atoms=len(table)):
+            table.assign_boundaries()
+
+        if source is True:
+            source = _joined_lines(atomlines)
+
+        if source is not None:
+            with pdbprofile.stage("fingerprint", atoms=len(table)):
+                (text, starts, stops) = source
+                table.attach_source(text, starts[rows], stops[rows])
+
+        return table
+
+    def get_chains_from_table(self, table):
+        """ Builds an ordered dictionary of PDB_chain views over each
+            chain defined in table.
+        """
+
+        chains = OrderedDict()
+
+        for chain_index in xrange(table.n_chains):
+            chains[table.chain_names[chain_index]] = PDB_chain(table, chain_index)
+
+        return chains
+
+
+    def group_by_chain(self, parsed_atoms):
+        """ Returns the row order which groups the atoms of parsed_atoms by
+            chain ID - chains in order of first appearance, atoms in file
+            order within each chain. A chain ID which reappears later in
+            the file (e.g. after a TER) is merged into the chain where it
+            first appeared.
+
+            Done as a stable sort on first-appearance chain codes, so the
+            cost does not depend on the number of chains.
+
+            # INPUT
+            parsed_atoms :     PDB_atom_table
+
+            # OUTPUT
+            -            :     Int array of rows
+        """
+
+        if len(parsed_atoms) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        (chainIDs, first_rows, codes) = np.unique(parsed_atoms.chain, return_index=True, return_inverse=True)
+
+        # renumber the (sorted) unique IDs by first appearance
+        rank = np.empty(len(chainIDs), dtype=np.int64)
+        rank[np.argsort(first_rows, kind="mergesort")] = np.arange(len(chainIDs))
+
+        return np.argsort(rank[codes], kind="mergesort")
+
+    def __parse_atoms(self, atomlines):
+
+        return PDB_atom.parse_block(atomlines)
+
+
+
+##-------------------------------------------------------##
+##                     PDB_chain                         ##
+##-------------------------------------------------------##
+
+class PDB_chain(object):
+
+    __slots__ = ("table", "_index", "residues", "chain_name", "__residue_index")
+
+    def __init__(self, table, chain_index):                
+        """ Initialization function which takes a PDB_atom_table and the 
+            index of a chain in that table and constructs a chain object,
+            which is a view onto the residues of that chain. 
+
+            Residue boundaries and the chain_local_id atom and residue
+            level attribute are defined by the table (see 
+            PDB_atom_table.assign_boundaries).
+         """
+
+        self.table = table
+        self._index = chain_index
+
+        (first_res, last_res) = table.get_chain_range(chain_index)
+        self.residues = [PDB_residue(table, i) for i in xrange(first_res, last_res)]
+
+        if len(self.residues) > 0:            
+            self.chain_name = table.chain_names[chain_index]
+        else:
+            self.chain_name = None
+
+        self.__build_residue_indexes()
+            
+
+    def get_residue(self, resid, chainLocal=False, insertion_code=None):
+        """
+            Function which returns the residue from a chain.
+
+            If chainLocal = False (default) the global resID is used
+            to search for a residue - if insertion_code is also given 
+            the residue must have that insertion code as well, otherwise
+            the first residue with that resID is returned. If, on the 
+            other hand, chainLocal is set to true, then the resid local
+            to that chain is used.
+            
+            chainLocal ID values ALWAYS start from 1 for the first residue
+            in a chain and increment by one through the chain. They provide
+            an easy internal way to get (for example) the first and last
+            residue in the chain explicitly, or comparative residues when
+            dealing with many identical species.
+
+            Lookups go through hash indexes on the chain so are O(1).
+        """
+        
+        try:
+            resid = int(resid)
+        except ValueError, e:
+            print "ERROR: get_resid() requires a numeric value"
+            raise e
+            
+
+        if type(resid) == int:   
+            
+            if chainLocal:
+                key = ("chain_local_id", resid)
+            elif insertion_code is None:
+                key = ("res_id", resid)
+            else:
+                key = ("res_id", resid, str(insertion_code).strip())
+
+            res = self.__lookup(key)
+
+            # the IDs may have been edited since the indexes were built
+            if res is None:
+                self.__build_residue_indexes()
+                res = self.__lookup(key)
+
+            return res
+
+    def __lookup(self, key):
+        """ Returns the indexed residue for key if it still matches the 
+            table, otherwise None
+        """
+
+        position = self.__residue_index.get(key)
+        if position is None or position >= len(self.residues):
+            return None
+
+        res = self.residues[position]
+
+        if getattr(res, key[0]) != key[1]:
+            return None
+
+        if len(key) == 3:
+            (start, stop) = self.table.get_residue_range(res._index)
+            if str(self.table.res_ins_code[start]).strip() != key[2]:
+                return None
+
+        return res
+
+    def __build_residue_indexes(self):
+        """ Builds the (res_id) / (res_id, insertion code) / 
+            (chain_local_id) -> residue position index. Where an ID is
+            repeated the first residue wins, as with a linear scan.
+        """
+        
+        index = {}
+
+        (first_res, last_res) = self.table.get_chain_range(self._index)
+        starts = self.table.residue_offsets[first_res:last_res]
+
+        res_ids   = self.table.res_id[starts].tolist()
+        ins_codes = [str(i).strip() for i in self.table.res_ins_code[starts]]
+        local_ids = self.table.chain_local_id[starts].tolist()
+
+        for position in xrange(len(starts)):
+            index.setdefault(("res_id", res_ids[position]), position)
+            index.setdefault(("res_id", res_ids[position], ins_codes[position]), position)
+            index.setdefault(("chain_local_id", local_ids[position]), position)
+
+        self.__residue_index = index
+
+
+    def get_chain_length(self):
+        return len(self.residues)
+
+    def select(self, query):
+        """ Selects atoms of this chain with a selection query (see 
+            pdbselect.PDB_selection), e.g. "resname HIS and name HE2 HD1"
+
+            # INPUT
+            query :     String or compiled pdbselect.PDB_selection
+
+            # OUTPUT
+            -     :     pdbselect.PDB_atom_selection
+        """
+
+        import pdbselect
+
+        (first_res, last_res) = self.table.get_chain_range(self._index)
+
+        return pdbselect.select(self.table, query, slice(self.table.residue_offsets[first_res], self.table.residue_offsets[last_res]))
+
+    def load_coordinates(self, source, format="infer", dtype=np.float64, check_names=False):
+        """ Replaces the coordinates of the atoms of this chain with a new
+            frame holding just this chain (see PDB_file.load_coordinates)
+        """
+
+        (first_res, last_res) = self.table.get_chain_range(self._index)
+        rows = np.arange(self.table.residue_offsets[first_res], self.table.residue_offsets[last_res])
+
+        _load_coordinates(self.table, rows, source, format, dtype, check_names)
+
+    def centroid(self, mass_weighted=False):
+        """ Centre of geometry (or of mass) of the chain (see pdbgeometry) """
+
+        import pdbgeometry
+
+        return pdbgeometry.centroid(self, mass_weighted)
+
+    def radius_of_gyration(self, mass_weighted=False):
+        """ Radius of gyration of the chain (see pdbgeometry) """
+
+        import pdbgeometry
+
+        return pdbgeometry.radius_of_gyration(self, mass_weighted)
+
+    def rmsd(self, other, superpose=True):
+        """ RMSD from other (a structure with the same atoms in the same
+            order, or their (N,3) coordinates) after optimal 
+            superposition, unless superpose=False (see pdbgeometry)
+        """
+
+        import pdbgeometry
+
+        return pdbgeometry.rmsd(self, other, superpose)
+
+    def dihedrals(self, angles=("phi", "psi", "omega", "chi1", "chi2", "chi3", "chi4"), frames=None, bond_cutoff=2.0):
+        """ Backbone and chi dihedral angles of every residue, in degrees
+            and aligned to chain local IDs, for the chain's coordinates or
+            (F,N,3) frames of its atoms (see pdbdihedrals)
+        """
+
+        import pdbdihedrals
+
+        return pdbdihedrals.dihedrals(self, angles, frames, bond_cutoff)
+
+    def __str__(self):
+        if self.chain_name:
+            return "<PDB_chain " + str(self.chain_name) + " - [" + str(len(self.residues)) + " residues]>"
+        else:
+            return "<PDB_chain of length " + str(len(self.residues)) + ">"
+            
+    def __repr__(self):
+        return self.__str__()
+
+    def __getitem__(self,indx):
+        return self.residues[indx]
+
+    def __len__(self):
+        return len(self.residues)
+
+
+##-------------------------------------------------------##
+##                 PDB_record_index                      ##
+##-------------------------------------------------------##
+
+def record_name(line):
+    """ Returns the upper-case record name of a PDB line, read from the
+        6 character record field (columns 1-6). Blank lines give an
+        empty string.
+
+        # INPUT
+        line :   String
+
+        # OUTPUT
+        -    :   String
+    """
+
+    record = line[:6].strip().upper()
+
+    # non-standard files may run the serial number into the record field
+    # (e.g. "ATOM 12345") so keep only the first token
+    if " " in record or "\t" in record:
+        record = record.split()[0]
+
+    return record
+
+
+class PDB_record_index(object):
+    """ Single pass classification of the lines of a PDB file. Each line's
+        record field is read once and the line is put in one of the
+        buckets below
+
+        header     : lines before the first ATOM/TER record
+        atomlines  : the ATOM lines, in file order
+        hetatm     : line numbers of the HETATM records (these stay in the
+                     header/footer as before, but are indexed here)
+        conect     : line numbers of the CONECT records (likewise - see
+                     pdbhybrid36.conect_serials to read them)
+        ter        : for each TER record, the number of atom lines which
+                     preceded it - i.e. the chain break offsets in atomlines
+        footer     : non ATOM/TER lines after the first ATOM/TER record
+
+        Blank lines are kept in the header or footer.
+    """
+
+    def __init__(self, content):
+        self.header = []
+        self.atomlines = []
+        self.hetatm = []
+        self.conect = []
+        self.ter = []
+        self.footer = []
+
+        header = self.header
+        atomlines = self.atomlines
+        footer = self.footer
+
+        passed_atoms = False
+        for (number, line) in enumerate(content):
+            record = record_name(line)
+
+            if record == "ATOM":
+                atomlines.append(line)
+                passed_atoms = True
+                continue
+
+            if record == "TER":
+                # TER lines are actually dealt with in chains to signify
+                # the end of a chain
+                self.ter.append(len(atomlines))
+                passed_atoms = True
+                continue
+
+            if record == "HETATM":
+                self.hetatm.append(number)
+
+            if record == "CONECT":
+                self.conect.append(number)
+
+            if passed_atoms:
+                footer.append(line)
+            else:
+                header.append(line)
+
+    def __str__(self):
+        return "<PDB_record_index - " + str(len(self.header)) + " header, " + str(len(self.atomlines)) + " atom, " + str(len(self.ter)) + " TER, " + str(len(self.footer)) + " footer lines>"
+
+    def __repr__(self):
+        return self.__str__()
+
+##-------------------END-OF-CLASS------------------------##
+
+
+##-------------------------------------------------------##
+##                  PDB_chain_index                      ##
+##-------------------------------------------------------##
+
+class PDB_chain_index(object):
+    """ Index of where each chain (and each residue within it) lies in
+        the raw text of a PDB file, built without parsing any atom. Used
+        by lazily loaded PDB_files (see PDB_file) so that a chain is only
+        parsed when it is first asked for, and an untouched chain can be
+        written back out by copying its lines.
+
+        Lines are split and classified with the same rules as
+        PDB_record_index, and each ATOM line is assigned the chain ID and
+        residue ID the parser would give it (columns 22 and 23-26 of 80
+        character lines, the whitespace separated fields of anything
+        else), so parse_chain gives exactly the chain a full parse does.
+
+        header     : lines before the first ATOM/TER record
+        footer     : non ATOM/TER lines after the first ATOM/TER record
+        chain_rows : chain ID -> (file order) numbers of its ATOM lines, 
+                     counted over the ATOM lines of the file
+        residues   : chain ID -> positions in chain_rows[chain ID] where
+                     each residue starts
+    """
+
+    # records looked at when classifying a line
+    RECORD_WIDTH = 6
+
+    def __init__(self, raw):
+        """ 
+            # INPUT
+            raw :     String (the whole, decompressed file)
+        """
+
+        self.raw = raw
+        buffer = np.frombuffer(raw, dtype=np.uint8)
+
+        (self.header, self.footer, atom_numbers, self.line_starts, self.line_stops) = self.split_records(raw)
+
+        # consecutive ATOM lines follow each other in the file (no TER or
+        # other record in between), so runs of them can be copied in one
+        self.__follows = np.zeros(len(atom_numbers), dtype=bool)
+        self.__follows[1:] = np.diff(atom_numbers) == 1
+
+        (chain_ids, res_ids) = self.__chain_and_residue_ids(buffer)
+
+        self.chain_rows = OrderedDict()
+        self.residues = OrderedDict()
+
+        if len(atom_numbers) == 0:
+            return
+
+        # the same grouping as PDB_residue_organizer.group_by_chain
+        (names, first_rows, codes) = np.unique(chain_ids, return_index=True, return_inverse=True)
+        order = np.argsort(first_rows, kind="mergesort")
+        rows = np.argsort(codes, kind="mergesort")
+        bounds = np.searchsorted(codes[rows], np.arange(len(names)+1))
+
+        for code in order:
+            chain_rows = rows[bounds[code]:bounds[code+1]]
+            chain_res  = res_ids[chain_rows]
+
+            self.chain_rows[str(names[code])] = chain_rows
+            self.residues[str(names[code])] = np.append(0, np.flatnonzero(chain_res[1:] != chain_res[:-1]) + 1)
+
+    @staticmethod
+    def split_records(raw):
+        """ Splits raw into lines and classifies them with the rules of
+            PDB_record_index, without parsing any atom
+
+            # INPUT
+            raw :     String
+
+            # OUTPUT
+            -   :     (header, footer, atom_numbers, line_starts,
+                      line_stops) - the header and footer lines, the
+                      number of each ATOM line counted over every line
+                      of raw and the [start, stop) byte range of each
+                      ATOM line
+        """
+
+        buffer = np.frombuffer(raw, dtype=np.uint8)
+
+        # [start, stop) byte range of every line, newline included (the
+        # same lines readlines() would give)
+        newlines = np.flatnonzero(buffer == 10)
+        stops  = np.append(newlines + 1, len(buffer)).astype(np.int64)
+        starts = np.append(0, newlines + 1).astype(np.int64)
+        if len(buffer) == 0 or buffer[-1] == 10:
+            starts = starts[:-1]
+            stops  = stops[:-1]
+
+        (is_atom, is_ter) = PDB_chain_index.__classify(raw, buffer, starts, stops)
+
+        atom_numbers = np.flatnonzero(is_atom)
+        marked = np.flatnonzero(is_atom | is_ter)
+        first_marked = marked[0] if len(marked) > 0 else len(starts)
+
+        other = np.flatnonzero(~(is_atom | is_ter))
+        header = [raw[starts[i]:stops[i]] for i in other[other < first_marked]]
+        footer = [raw[starts[i]:stops[i]] for i in other[other > first_marked]]
+
+        return (header, footer, atom_numbers, starts[atom_numbers], stops[atom_numbers])
+
+    @staticmethod
+    def __classify(raw, buffer, starts, stops):
+        """ Vectorized record_name() == "ATOM"/"TER" over every line. A 
+            line which plainly starts with the record (followed by a 
+            space or tab) is decided here - anything less regular (leading
+            whitespace, lower case, a record run into the next field) is
+            handed to record_name itself.
+        """
+
+        n_lines = len(starts)
+        width = PDB_chain_index.RECORD_WIDTH
+
+        positions = starts[:, np.newaxis] + np.arange(width)
+        inside = positions < stops[:, np.newaxis]
+        head = np.where(inside, buffer[np.minimum(positions, max(len(buffer)-1, 0))], np.uint8(32))
+
+        def starts_with(text, at=0):
+            match = np.ones(n_lines, dtype=bool)
+            for (i, char) in enumerate(text):
+                match &= head[:, at+i] == ord(char)
+            return match
+
+        def separator(column):
+            return (head[:, column] == 32) | (head[:, column] == 9)
+
+        is_atom = starts_with("ATOM") & separator(4)
+        is_ter  = starts_with("TER") & separator(3)
+
+        upper = head[:, :4].copy()
+        upper[(upper >= 97) & (upper <= 122)] -= np.uint8(32)
+        unsure = _is_whitespace(head[:, 0])
+        unsure |= (upper[:, 0] == ord("A")) & (upper[:, 1] == ord("T")) & (upper[:, 2] == ord("O"))
+        unsure |= (upper[:, 0] == ord("T")) & (upper[:, 1] == ord("E")) & (upper[:, 2] == ord("R"))
+        unsure &= ~(is_atom | is_ter)
+
+        for i in np.flatnonzero(unsure):
+            record = record_name(raw[starts[i]:stops[i]])
+            is_atom[i] = record == "ATOM"
+            is_ter[i]  = record == "TER"
+
+        return (is_atom, is_ter)
+
+    def __chain_and_residue_ids(self, buffer):
+        """ The chain ID and residue ID of every ATOM line, read as the
+            parser reads them (see PDB_atom.parse_fields). A line the
+            parser would reject is given a blank chain and residue ID -1;
+            the error itself is raised when its chain is parsed.
+        """
+
+        n_atoms = len(self.line_starts)
+        lengths = self.line_stops - self.line_starts
+        has_newline = np.zeros(n_atoms, dtype=bool)
+        has_newline[lengths > 0] = buffer[self.line_stops[lengths > 0] - 1] == 10
+
+        fixed = np.flatnonzero((lengths - has_newline) == 80)
+        other = np.flatnonzero((lengths - has_newline) != 80)
+
+        chain_ids = np.zeros(n_atoms, dtype="S1")
+        res_ids   = np.zeros(n_atoms, dtype=np.int64)
+
+        if len(fixed) > 0:
+            spans = dict((name, (first, last)) for (name, first, last) in PDB_atom.FIXED_COLUMNS)
+            starts = self.line_starts[fixed]
+
+            (first, last) = spans["chain"]
+            chain_ids[fixed] = buffer[starts + first].view("S1")
+
+            (first, last) = spans["res_id"]
+            columns = buffer[starts + np.arange(first, last)[:, np.newaxis]]
+            res_ids[fixed] = _serial_numbers(columns)
+
+        if len(other) > 0:
+            values = []
+            for i in other:
+                line = self.raw[self.line_starts[i]:self.line_stops[i]].rstrip("\n")
+                splitline = [j for j in line.split(" ") if j and j != "\n" and j != "\t"]
+
+                try:
+                    if len(splitline) == 10:
+                        values.append(("", pdbhybrid36.decode(splitline[4], 4)))
+                    elif len(splitline) in (11, 12):
+                        values.append((splitline[4], pdbhybrid36.decode(splitline[5], 4)))
+                    else:
+                        values.append(("", -1))
+                except ValueError:
+                    values.append(("", -1))
+
+            other_chains = np.array([j[0] for j in values], dtype="S")
+            if other_chains.itemsize > chain_ids.itemsize:
+                chain_ids = chain_ids.astype(other_chains.dtype)
+            chain_ids[other] = other_chains
+            res_ids[other] = [j[1] for j in values]
+
+        return (chain_ids, res_ids)
+
+    def n_atoms(self, chainID):
+        return len(self.chain_rows[chainID])
+
+    def n_residues(self, chainID):
+        return len(self.residues[chainID])
+
+    def atom_lines(self, chainID):
+        """ Returns the ATOM lines of a chain, in file order """
+
+        raw = self.raw
+        rows = self.chain_rows[chainID]
+
+        return [raw[i:j] for (i, j) in zip(self.line_starts[rows].tolist(), self.line_stops[rows].tolist())]
+
+    def chain_bytes(self, chainID):
+        """ Returns the ATOM lines of a chain exactly as they are in the
+            file, joined into one string which ends in a newline
+        """
+
+        rows = self.chain_rows[chainID]
+
+        # runs of lines which follow each other in the file
+        breaks = np.flatnonzero(~self.__follows[rows[1:]] | (np.diff(rows) != 1)) + 1
+        firsts = np.append(0, breaks)
+        lasts  = np.append(breaks, len(rows)) - 1
+
+        raw = self.raw
+        text = "".join([raw[i:j] for (i, j) in zip(self.line_starts[rows[firsts]].tolist(), self.line_stops[rows[lasts]].tolist())])
+
+        if len(text) > 0 and text[-1] != "\n":
+            text = text + "\n"
+
+        return text
+
+    def parse_chain(self, chainID):
+        """ Parses one chain into a PDB_chain which is a view on its own
+            PDB_atom_table. The table's source_rows count over the lines of
+            the chain (see chain_rows).
+
+            # INPUT
+            chainID :     String
+
+            # OUTPUT
+            -       :     PDB_chain
+        """
+
+        rows = self.chain_rows[chainID]
+        source = (self.raw, self.line_starts[rows], self.line_stops[rows])
+
+        table = PDB_residue_organizer().construct_table(self.atom_lines(chainID), source)
+
+        return PDB_chain(table, 0)
+
+    def __str__(self):
+        return "<PDB_chain_index - " + str(len(self.chain_rows)) + " chains, " + str(len(self.line_starts)) + " atom lines>"
+
+    def __repr__(self):
+        return self.__str__()
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                  PDB_lazy_chains                      ##
+##-------------------------------------------------------##
+
+class PDB_lazy_chains(OrderedDict):
+    """ Ordered chain ID -> PDB_chain dictionary (as PDB_file.chains) 
+        whose chains are parsed from a PDB_chain_index the first time they
+        are looked up. Iterating over the keys or testing membership does
+        not parse anything.
+    """
+
+    def __init__(self, index):
+        OrderedDict.__init__(self)
+        self.index = index
+
+        for chainID in index.chain_rows:
+            OrderedDict.__setitem__(self, chainID, None)
+
+    def __getitem__(self, key):
+        chain = OrderedDict.__getitem__(self, key)
+
+        if chain is None:
+            with pdbprofile.stage("parse_chain", atoms=self.index.n_atoms(key)):
+                chain = self.index.parse_chain(key)
+            OrderedDict.__setitem__(self, key, chain)
+
+        return chain
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[i] for i in self]
+
+    def items(self):
+        return [(i, self[i]) for i in self]
+
+    def itervalues(self):
+        for i in self:
+            yield self[i]
+
+    def iteritems(self):
+        for i in self:
+            yield (i, self[i])
+
+    def is_parsed(self, key):
+        return OrderedDict.__getitem__(self, key) is not None
+
+    def verbatim_bytes(self, key):
+        """ The chain's lines as they are in the file if it has never 
+            been parsed (so can not have been edited), otherwise None
+        """
+
+        if self.is_parsed(key):
+            return None
+
+        return self.index.chain_bytes(key)
+
+    def __repr__(self):
+        return "<PDB_lazy_chains - " + str(len(self)) + " chains, " + str(len([i for i in self if self.is_parsed(i)])) + " parsed>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+##-------------------------------------------------------##
+##                PDB_parallel_parser                    ##
+##-------------------------------------------------------##
+
+# the job being run by the worker processes of a PDB_parallel_parser - 
+# (raw, line_starts, line_stops, table, fingerprint). Set before the pool
+# is forked so the workers inherit it rather than being sent it
+_PARALLEL_JOB = None
+
+
+def _shared_array(shape, dtype):
+    """ Zeroed array of shape and dtype held in anonymous shared memory,
+        so that writes made to it by forked worker processes are seen 
+        by the parent
+    """
+
+    dtype = np.dtype(dtype)
+    n_items = int(np.prod(shape))
+
+    buffer = mmap.mmap(-1, max(n_items * dtype.itemsize, 1))
+
+    return np.frombuffer(buffer, dtype=dtype, count=n_items).reshape(shape)
+
+
+def _parse_chunk(rows):
+    """ Worker side of PDB_parallel_parser.parse - parses the ATOM lines
+        rows[0]:rows[1] of the job into the same rows of its shared 
+        table. Returns the chunk's rows and any text columns whose values
+        are too wide for the shared table (name -> values).
+    """
+
+    (raw, line_starts, line_stops, table, fingerprint) = _PARALLEL_JOB
+    (first, last) = rows
+
+    chunk = PDB_atom.parse_text(raw, line_starts[first:last], line_stops[first:last])
+
+    overflow = {}
+    for name in chunk.column_names():
+        values = getattr(chunk, name)
+        if values.dtype.kind == "S" and values.itemsize > getattr(table, name).itemsize:
+            overflow[name] = values
+        else:
+            getattr(table, name)[first:last] = values
+
+    fingerprint[first:last] = chunk.fingerprint()
+
+    return (rows, overflow)
+
+
+class PDB_parallel_parser(object):
+    """ Parses the ATOM lines of one (large) file with a pool of worker 
+        processes, giving exactly the atom table a serial read gives.
+
+        The lines are found and classified in one vectorized pass over 
+        the raw text (see PDB_chain_index.split_records) and the ATOM
+        lines are split into chunks of about equal size in bytes, always
+        at a line boundary. Each worker parses its chunks straight out of
+        the text (PDB_atom.parse_text) and writes the columns (and the row 
+        fingerprints) into a table held in shared memory, so nothing but
+        the chunk bounds is passed between processes. Chain grouping and
+        residue/chain boundaries are then worked out once over the whole 
+        joined table - a residue or chain cut by a chunk edge is 
+        therefore stitched back together exactly as in a serial parse.
+
+        Workers are forked (and inherit the file's text), so where 
+        os.fork is not available the chunks are parsed in this process.
+    """
+
+    # chunks per worker, so that a chunk of slow (not 80 character) lines
+    # does not hold up the rest
+    CHUNKS_PER_PROCESS = 4
+
+    # fewer atom lines than this per chunk are not worth a process
+    MIN_CHUNK_ATOMS = 50000
+
+    def __init__(self, processes=None):
+        """
+            # INPUT
+            processes :     Int - number of worker processes (None for
+                            one per CPU)
+        """
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        if processes < 1:
+            raise PDB_fileException("A parallel parse needs at least one process, not " + str(processes))
+
+        self.processes = processes
+
+    def chunk_bounds(self, line_starts, line_stops):
+        """ Splits the ATOM lines (given by their byte ranges) into 
+            chunks of about the same number of bytes. Returns a list of 
+            (first, last) line numbers.
+        """
+
+        n_atoms = len(line_starts)
+        if n_atoms == 0:
+            return []
+
+        n_chunks = self.processes * self.CHUNKS_PER_PROCESS
+        n_chunks = max(1, min(n_chunks, n_atoms // self.MIN_CHUNK_ATOMS))
+
+        # the line in which each byte offset falls starts the next chunk
+        first_byte = line_starts[0]
+        n_bytes = line_stops[-1] - first_byte
+        offsets = first_byte + (np.arange(1, n_chunks) * n_bytes) // n_chunks
+
+        bounds = np.searchsorted(line_starts, offsets, side="right")
+        bounds = np.unique(np.concatenate(([0], bounds, [n_atoms])))
+
+        return zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+    def parse(self, raw):
+        """ Parses the whole text of a PDB file
+
+            # INPUT
+            raw :     String
+
+            # OUTPUT
+            -   :     (table, header, footer) - the PDB_atom_table (with
+                      boundaries, source_rows and source defined as 
+                      PDB_residue_organizer.construct_table gives them)
+                      and the header and footer lines
+        """
+
+        global _PARALLEL_JOB
+
+        with pdbprofile.stage("classify", bytes=len(raw)) as classify:
+            (header, footer, atom_numbers, line_starts, line_stops) = PDB_chain_index.split_records(raw)
+            classify.count(lines=len(atom_numbers))
+
+        n_atoms = len(line_starts)
+        chunks = self.chunk_bounds(line_starts, line_stops)
+
+        with pdbprofile.stage("parse_atoms", lines=n_atoms) as parse:
+            parsed_atoms = PDB_atom_table(0)
+            for name in parsed_atoms.column_names():
+                column = getattr(PDB_atom_table(1), name)
+                setattr(parsed_atoms, name, _shared_array((n_atoms,) + column.shape[1:], column.dtype))
+            fingerprint = _shared_array(n_atoms, np.uint64)
+
+            _PARALLEL_JOB = (raw, line_starts, line_stops, parsed_atoms, fingerprint)
+            try:
+                if self.processes > 1 and len(chunks) > 1 and hasattr(os, "fork"):
+                    pool = multiprocessing.Pool(min(self.processes, len(chunks)))
+                    try:
+                        # in order, so the error raised is that of the 
+                        # first bad chunk
+                        results = list(pool.imap(_parse_chunk, chunks))
+                        pool.close()
+                    except:
+                        pool.terminate()
+                        raise
+                    finally:
+                        pool.join()
+                else:
+                    results = [_parse_chunk(i) for i in chunks]
+            finally:
+                _PARALLEL_JOB = None
+
+            # text values wider than their column widen it for every row
+            for ((first, last), overflow) in results:
+                for (name, values) in overflow.iteritems():
+                    column = getattr(parsed_atoms, name)
+                    if values.itemsize > column.itemsize:
+                        column = column.astype(values.dtype)
+                        setattr(parsed_atoms, name, column)
+                    column[first:last] = values
+
+            parse.count(atoms=n_atoms)
+
+        organizer = PDB_residue_organizer()
+
+        with pdbprofile.stage("group_chains", atoms=n_atoms):
+            rows = organizer.group_by_chain(parsed_atoms)
+
+            table = parsed_atoms.take(rows)
+            table.source_rows = rows
+
+        with pdbprofile.stage("boundaries", atoms=n_atoms):
+            table.assign_boundaries()
+
+        table.attach_source(raw, line_starts[rows], line_stops[rows], fingerprint[rows])
+
+        return (table, header, footer)
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
 ##-------------------------------------------------------##
-##                     PDB_residue                       ##
+##                    PDB_file                           ##
 ##-------------------------------------------------------##
 
-class PDB_residue:
-    """ Class for holding a single residue. """
 
-    def __init__(self, residue_atoms_list):
-        self.atoms          = residue_atoms_list
-        self.res_name       = residue_atoms_list[0].res_name
-        self.res_id         = residue_atoms_list[0].res_id
-        self.chain          = residue_atoms_list[0].chain
-        self.chain_local_id = residue_atoms_list[0].chain_local_id
+class PDB_file(object):       
 
-    def get_alpha_carbon(self):
-        for i in self.atoms:
-            if i.atom_name == "CA":
-                return i
-            
-    def set_residue_order(self, atomname_list):
 
-        newOrder = []
+    def __init__(self, filename, lazy=False, processes=1):
+        """ Reads and parses a PDB file. filename may also be an open 
+            binary file object or in-memory buffer, and gzip, bz2 or xz
+            compressed input is decompressed on the fly (see pdbio).
 
-        # collect the ordered atom_ids to reassign - cannot
-        # assume they're incremented by 1 each time (probably 
-        # are but...)
-        new_atom_ids = []
-        for atom in self.atoms:
-            new_atom_ids.append(atom.atom_id)
+            processes other than 1 parses the atoms of a full read with 
+            that many worker processes (None for one per CPU - see 
+            PDB_parallel_parser), which gives the same result as a serial
+            read.
 
-        id_index = 0
+            With lazy=True only an index of where each chain's lines are
+            is built (see PDB_chain_index) and a chain is parsed the first
+            time it is looked up in chains (or through pdb[chainID]). 
+            Chains which are never looked up are written back out exactly
+            as they were read. Asking for table, residues or atoms parses
+            every chain that is left and joins them into a single table, 
+            after which the file behaves as if it had been read in full 
+            (atom views taken from a chain before then stay on that
+            chain's own table, so take them again).
+        """
 
-        for atomname in atomname_list:
-            for atom in self.atoms:
-                if atomname == atom.atom_name:
-                    atom.atom_id = new_atom_ids[id_index]
-                    
-                    newOrder.append(atom)
-                    id_index=id_index+1
-        
-        if not len(self.atoms) == len(newOrder):
-            msg = "When reseting atom order in  residue must fully define the new order\n" + \
-                  "Old = " + str(self.atoms) + "\n" + \
-                  "New = " + str(newOrder) + "\n"
-                  
-            raise PDB_residueException(msg)
+        self._table = None
+        self._residues = None
+        self._atoms = None
 
-        self.atoms = newOrder
+        with pdbprofile.stage("load"):
+            if lazy:
+                with pdbprofile.stage("read"):
+                    raw = pdbio.read_bytes(filename)
 
-    def rename_residue(self, newName):
-        for atom in self.atoms:
-            atom.res_name = newName
-        self.res_name = newName
+                with pdbprofile.stage("index", bytes=len(raw)) as index:
+                    chain_index = PDB_chain_index(raw)
+                    index.count(atoms=len(chain_index.line_starts))
 
-    def rename_atom(self, oldName, newName):
-        
-        oldName = str(oldName)
-        newName = str(newName)
-        
-        for atom in self.atoms:
-            if atom.atom_name == str(oldName):
-                atom.atom_name = str(newName)
+                self.header = chain_index.header
+                self.footer = chain_index.footer
+                self.chains = PDB_lazy_chains(chain_index)
                 return
-        msg = "ERROR: Unable to find " + oldName + " in residue " + str(self.res_id) + "(" + self.res_name  + ") in chain " + self.chain + " (to replace with " + newName + ")"
-        raise PDB_residueException(msg)
 
-    ## Overwritten default behaviours
+            if processes != 1:
+                with pdbprofile.stage("read"):
+                    raw = pdbio.read_bytes(filename)
 
-    def __repr__(self):
-        return self.__str__()
+                self.__assemble(*PDB_parallel_parser(processes).parse(raw))
+                return
 
-    def __str__(self):
-        return "<PDB_Residue " + str(self.atoms[0].res_id) + " " + self.atoms[0].res_name + ">"
+            with pdbprofile.stage("read") as read:
+                content = self.__read_file(filename)
+                read.count(lines=len(content))
 
-    def __getitem__(self,indx):
-        return self.atoms[indx]
+            self.__build(content)
 
-    def __len__(self):
-        return len(self.atoms)
-    
-    
+    @classmethod
+    def from_lines(cls, content):
+        """ Builds a PDB_file from a list of lines (as they would be 
+            read from a PDB file) rather than from a file on disk
 
-##-------------------------------------------------------##
-##            PDB_residue_organizer                      ##
-##-------------------------------------------------------##
+            # INPUT
+            content :     List of strings
 
-class PDB_residue_organizer:
+            # OUTPUT
+            -       :     PDB_file
+        """
 
-    def __init__(self):        
-        pass
+        pdb = cls.__new__(cls)
+        with pdbprofile.stage("load"):
+            pdb.__build(content)
 
-    def construct_chains(self, atomlines):
+        return pdb
 
-        chains = {}          
-        parsed_atoms_list = self.__parse_atoms(atomlines)
-        
-        chainID_list = self.__get_chainlist(parsed_atoms_list)        
+    @classmethod
+    def from_table(cls, table, header, footer):
+        """ Builds a PDB_file around an already parsed atom table (with 
+            residue and chain boundaries defined) 
 
-        for chainID in chainID_list:
-            chains[chainID] = PDB_chain(self.__get_atoms_from_chain(parsed_atoms_list, chainID))  
-            
-        return chains
+            # INPUT
+            table   :     PDB_atom_table
+            header  :     List of strings
+            footer  :     List of strings
 
+            # OUTPUT
+            -       :     PDB_file
+        """
 
-    def __get_chainlist(self, parsed_atoms_list):
-        
-        chainid_list = []
+        pdb = cls.__new__(cls)
+        with pdbprofile.stage("load"):
+            pdb.__assemble(table, header, footer)
 
-        for atom in parsed_atoms_list:
-            if atom.chain in chainid_list:
-                pass
-            else:
-                chainid_list.append(atom.chain)
+        return pdb
 
-        return chainid_list
-            
-        
-    def __parse_atoms(self, atomlines):
+    def __build(self, content):
+        with pdbprofile.stage("classify", lines=len(content)):
+            records = PDB_record_index(content)
 
-        parsed_atoms_list = []
-        
-        for atom_line in atomlines:
-            atom = PDB_atom(atom_line)
-            parsed_atoms_list.append(atom)
+        self.__assemble(self.__parse_residues(records.atomlines), records.header, records.footer)
 
-        return parsed_atoms_list
+    def __assemble(self, table, header, footer):
+        self._table = table
+        with pdbprofile.stage("build_chains", atoms=len(table)):
+            self.chains = PDB_residue_organizer().get_chains_from_table(self.table)
 
-    def __get_atoms_from_chain(self, parsed_atoms_list, chainid):
-        
-        chain_atoms =[]
+        self.header = header
+        self.footer = footer
 
-        for atom in parsed_atoms_list:
-            
-            if atom.chain == chainid:
-                chain_atoms.append(atom)
+        with pdbprofile.stage("flatten_residues"):
+            self._residues = self.__get_residues_from_chains()
+        with pdbprofile.stage("flatten_atoms"):
+            self._atoms = self.__get_atoms_from_chain()
 
-        return chain_atoms
+    @property
+    def table(self):
+        if self._table is None:
+            self.load_all()
+        return self._table
 
+    @property
+    def residues(self):
+        if self._residues is None:
+            self.load_all()
+        return self._residues
 
+    @property
+    def atoms(self):
+        if self._atoms is None:
+            self.load_all()
+        return self._atoms
 
-##-------------------------------------------------------##
-##                     PDB_chain                         ##
-##-------------------------------------------------------##
+    def is_loaded(self):
+        """ False while a lazily read file still has chains which have
+            not been joined into the single atom table (see load_all)
+        """
+        return self._table is not None
+
+    def load_all(self):
+        """ Parses every chain of a lazily read file which has not been 
+            parsed yet and joins all of them into a single atom table 
+            (rows, residue/chain offsets and source_rows as a full read
+            gives). The chains and residues already handed out are moved
+            onto that table, so edits made so far are kept.
+        """
 
-class PDB_chain:
+        if self._table is not None:
+            return
+
+        with pdbprofile.stage("load_all"):
+            index = self.chains.index
+            chains = [self.chains[i] for i in self.chains]
+
+            table = PDB_atom_table.concatenate([i.table for i in chains])
+
+            # every chain was read from the same text, so the joined 
+            # table keeps it (with the fingerprints taken as each chain
+            # was parsed)
+            if len(chains) > 0 and all([i.table.source_text is index.raw for i in chains]):
+                table.source_text        = index.raw
+                table.source_starts      = np.concatenate([i.table.source_starts for i in chains])
+                table.source_stops       = np.concatenate([i.table.source_stops for i in chains])
+                table.source_fingerprint = np.concatenate([i.table.source_fingerprint for i in chains])
+
+            residue_offsets = [np.zeros(1, dtype=np.int64)]
+            chain_offsets = [np.zeros(1, dtype=np.int64)]
+            source_rows = []
+
+            (n_atoms, n_residues) = (0, 0)
+            for (position, (name, chain)) in enumerate(zip(self.chains, chains)):
+                residue_offsets.append(chain.table.residue_offsets[1:] + n_atoms)
+                chain_offsets.append(chain.table.chain_offsets[1:] + n_residues)
+                source_rows.append(index.chain_rows[name][chain.table.source_rows])
+
+                for residue in chain.residues:
+                    residue._table = table
+                    residue._index = residue._index + n_residues
+
+                n_atoms = n_atoms + len(chain.table)
+                n_residues = n_residues + len(chain.residues)
+
+                chain.table = table
+                chain._index = position
+
+            table.residue_offsets = np.concatenate(residue_offsets)
+            table.chain_offsets = np.concatenate(chain_offsets)
+            table.chain_names = list(self.chains)
+            if len(source_rows) > 0:
+                table.source_rows = np.concatenate(source_rows)
+            else:
+                table.source_rows = np.zeros(0, dtype=np.int64)
 
-    def __init__(self, atomlist):                
-        """ Initialization function which takes a list of atoms all from one chain
-            and constructs a chain object. Importantly, the chain_local_id atom and residue
-            level attribute is only initilized in the "context" of a chain - i.e. by this 
-            initialization function, so this function actually completes atom and residue
-            initialization.
+            self._table = table
+            self._residues = self.__get_residues_from_chains()
+            self._atoms = self.__get_atoms_from_chain()
+        
+    def write_file(self, filename, compression="infer", verbatim=True):
+        """ Writes the structure out as a PDB file. Atoms which have not 
+            been changed since they were read are written exactly as the
+            line they were read from, and only the others are formatted 
+            from their fields (verbatim=False formats every atom). Every
+            line is formatted (and every field width checked) before the
+            file is opened, so a formatting error never leaves a partial
+            file.
+
+            filename may also be an open binary file object or in-memory
+            buffer (which is left open). By default a file name ending in
+            .gz, .bz2 or .xz is written compressed - compression can also
+            be given explicitly (None, "gzip", "bz2" or "xz").
+        """
 
-            A crucial assumption is that all the atoms in atomlist come from the same chain.
-            In fact - this list is how a chain object is defined, so if the list contains
-            atoms/residues with different .chain values, things are going to go very wrong...
-         """
+        with pdbprofile.stage("write"):
+            with pdbprofile.stage("format"):
+                atom_blocks = self.__format_chains(verbatim)
 
-        self.residues = []
+            with pdbprofile.stage("output") as output:
+                with pdbio.open_output(filename, compression) as f:
+                    for line in self.header:
+                        f.write(line)
 
-        current_res = atomlist[0].res_id
+                    for block in atom_blocks:
+                        f.write(block)
 
-        temp_res =[]
+                    for line in self.footer:
+                        f.write(line)            
 
-        for i in atomlist:
-            if i.res_id == current_res:
-                temp_res.append(i)
-            else:
-                self.residues.append(PDB_residue(temp_res))
-                temp_res = []
-                current_res = i.res_id
-                temp_res.append(i)
-                
-                
+                    output.count(bytes=f.bytes_written)
 
-        self.residues.append(PDB_residue(temp_res)) # get final residue
+    def select(self, query):
+        """ Selects atoms with a selection query (see 
+            pdbselect.PDB_selection), e.g. 
+            "chain A and resname HIS and name HE2 HD1"
 
-        if len(self.residues) > 0:            
-            self.chain_name = self.residues[0].chain
-        else:
-            self.chain_name = None
-        
-        chain_local_id = 1        
+            # INPUT
+            query :     String or compiled pdbselect.PDB_selection
 
-        ## CHAIN LOCAL ID variables in atom and residue
-        ## objects are set here!
-        ##
-        for res in self.residues:
-            for atom in res.atoms:
-                atom.chain_local_id = chain_local_id
-            res.chain_local_id = chain_local_id
-            chain_local_id=chain_local_id+1
+            # OUTPUT
+            -     :     pdbselect.PDB_atom_selection
+        """
 
-            
+        # imported here as pdbselect itself imports this module
+        import pdbselect
 
-    def get_residue(self, resid, chainLocal=False):
-        """
-            Function which returns the residue from a chain.
+        return pdbselect.select(self.table, query)
 
-            If chainLocal = False (default) the global resID is used
-            to search for a residue. If, on the other hand, chainLocal
-            is set to true, then the resid local to that chain is used.
-            
-            chainLocal ID values ALWAYS start from 1 for the first residue
-            in a chain and increment by one through the chain. They provide
-            an easy internal way to get (for example) the first and last
-            residue in the chain explicitly, or comparative residues when
-            dealing with many identical species.
-        """
-        
-        try:
-            resid = int(resid)
-        except ValueError, e:
-            print "ERROR: get_resid() requires a numeric value"
-            raise e
-            
+    def load_coordinates(self, source, format="infer", dtype=np.float64, check_names=False):
+        """ Replaces the coordinates of every atom with a new frame, 
+            leaving the rest of the structure as it is - so a topology 
+            parsed once can be written out for frame after frame.
 
-        if type(resid) == int:   
-            
-            if chainLocal:
-                for res in self.residues:
-                    if res.chain_local_id == resid:                        
-                        return res
-            else:                
-                for res in self.residues:
-                    if res.res_id == resid:
-                        return res
+            An array or raw binary buffer gives its rows in the order of
+            table (the order atoms are written in). A PDB or XYZ file 
+            lists the atoms in the order of the file this structure was
+            read from, and only the coordinate columns of a PDB file are
+            parsed (see read_coordinates). The number of atoms must match
+            and, with check_names=True, so must the atom names of a PDB
+            file (or the atom names or elements of an XYZ file).
 
+            # INPUT
+            source      :     (N,3) array, raw binary buffer, or the 
+                              file name or file object of a PDB or XYZ
+                              file
+            format      :     "infer", "array", "buffer", "pdb" or "xyz"
+                              (see coordinate_format)
+            dtype       :     Type of the values in a raw binary buffer
+            check_names :     Bool
 
-    def get_chain_length(self):
-        return len(self.residues)
+            # OUTPUT
+            -           :     None
+        """
 
-    def __str__(self):
-        if self.chain_name:
-            return "<PDB_chain " + str(self.chain_name) + " - [" + str(len(self.residues)) + " residues]>"
-        else:
-            return "<PDB_chain of length " + str(len(self.residues)) + ">"
-            
-    def __repr__(self):
-        return self.__str__()
+        _load_coordinates(self.table, np.arange(len(self.table)), source, format, dtype, check_names)
 
-    def __getitem__(self,indx):
-        return self.residues[indx]
+    def centroid(self, mass_weighted=False):
+        """ Centre of geometry (or of mass) of the structure (see pdbgeometry) """
 
-    def __len__(self):
-        return len(self.residues)
+        import pdbgeometry
 
-        
-##-------------------------------------------------------##
-##                    PDB_file                           ##
-##-------------------------------------------------------##
+        return pdbgeometry.centroid(self, mass_weighted)
 
+    def radius_of_gyration(self, mass_weighted=False):
+        """ Radius of gyration of the structure (see pdbgeometry) """
 
-class PDB_file:       
+        import pdbgeometry
 
+        return pdbgeometry.radius_of_gyration(self, mass_weighted)
 
-    def __init__(self, filename):
-        content = self.__read_file(filename)
+    def rmsd(self, other, superpose=True):
+        """ RMSD from other (a structure with the same atoms in the same
+            order, or their (N,3) coordinates) after optimal 
+            superposition, unless superpose=False (see pdbgeometry)
+        """
 
-        self.chains = self.__parse_residues(content)
+        import pdbgeometry
 
-        self.header = self.__get_header(content)
-        self.footer = self.__get_footer(content)
+        return pdbgeometry.rmsd(self, other, superpose)
 
-        self.residues = self.__get_residues_from_chains()
-        self.atoms = self.__get_atoms_from_chain()
-        
-    def write_file(self,filename):
-        f = open(filename,'w')
-        for line in self.header:
-            f.write(line)
-        
-        self.__write_chains(f)
+    def dihedrals(self, angles=("phi", "psi", "omega", "chi1", "chi2", "chi3", "chi4"), frames=None, bond_cutoff=2.0):
+        """ Backbone and chi dihedral angles of every residue of every
+            chain (chain ID -> angle -> array aligned to chain local IDs),
+            for the structure's coordinates or (F,N,3) frames of all its
+            atoms (see pdbdihedrals)
+        """
+
+        import pdbdihedrals
 
-        for line in self.footer:
-            f.write(line)            
+        return pdbdihedrals.dihedrals(self, angles, frames, bond_cutoff)
 
     def rename_residue(self, chainID, resID, newName):
         chain = self.chains[chainID]
@@ -515,52 +2739,14 @@ class PDB_file:
         """ Reads a file into a content list line by line                                                                                                                                                                                    
         and returns that list
         """
-        with open(filename) as f:
-            content = f.readlines()
-            
-        return content
-
-    def __get_header(self, content):
-        header = [] 
+        return pdbio.read_lines(filename)
 
-        for line in content:
-            if filter(None, line.split(" "))[0].upper() == "ATOM": 
-                break
-            header.append(line)
-            
-        return header
-
-    def __get_footer(self, content):
-        """ 
-	"""
-	footer = [] 
-
-	passedAtoms = False
-	for line in content:
-            if filter(None, line.split(" "))[0].upper() == "ATOM" or filter(None, line.split(" "))[0].upper() == "TER": 
-                passedAtoms = True
-	    else:
-                if passedAtoms:
-                    if line == "TER\n": # TER lines are actually dealt with in chains to signify the end of a chain"
-                        pass
-		    else:
-                        footer.append(line)        
-        return footer
-        
+    def __parse_residues(self, atomlines):
+        """ Main parsing function - builds the columnar atom table """
         
-    def __parse_residues(self, content):
-        """ Main parsing function build object based chains """
-        
-	atomlines =[]
-
-        # create a list of atom lines
-        for line in content:
-            if filter(None, line.split(" "))[0].upper() == "ATOM": 
-                atomlines.append(line)
-               
         organizer = PDB_residue_organizer()
 
-        return(organizer.construct_chains(atomlines))
+        return(organizer.construct_table(atomlines, source=True))
 
     def __get_residues_from_chains(self):
         
@@ -576,67 +2762,274 @@ class PDB_file:
         return residues
             
     def __get_atoms_from_chain(self):
+        """ Atoms are views built on demand over the atom table, rather
+            than one object per atom held in a list
+        """
+
+        return PDB_atom_sequence(self.table)
+
+    # (field, first, last) character columns of the fields in a written 
+    # atom line - the standard 80 column layout the fixed column parser
+    # reads, so written files are read back column by column. Columns 
+    # not listed are blank, and column 80 is the newline
+    WRITE_COLUMNS = PDB_atom.FIXED_COLUMNS
 
-        atoms =[]
+    WRITE_LINE_LENGTH = 81
 
-        for res in self.residues:      
-            for atom in res.atoms:
-                atoms.append(atom)
+    # atom lines are joined into blocks of (at most) this many lines
+    # for writing
+    WRITE_BLOCK_SIZE = 65536
 
-        return atoms                    
+    def __format_chains(self, verbatim=True):
+        """ Formats the atom lines of every chain, each chain followed by
+            a TER record, and returns them as a list of large blocks of 
+            text ready to be written out. With verbatim, the rows of a 
+            table with a source which are unmodified (see 
+            PDB_atom_table.modified_rows) are copied from their lines 
+            instead, in runs of lines which follow each other there.
+        """
+
+        # contiguous (table, rows) runs - usually every chain is a view
+        # on the same table so there is just one run. Chains of a lazily
+        # read file which were never parsed are (None, text) runs and are
+        # copied out as they were read
+        unparsed = getattr(self.chains, "verbatim_bytes", None) if verbatim else None
 
-    def __write_chains(self, handle):
+        runs = []
         for chainname in self.chains:
+            if unparsed is not None:
+                text = unparsed(chainname)
+                if text is not None:
+                    runs.append((None, text))
+                    continue
+
             chain = self.chains[chainname]
+            (first_res, last_res) = chain.table.get_chain_range(chain._index)
+            start = int(chain.table.residue_offsets[first_res])
+            stop  = int(chain.table.residue_offsets[last_res])
+
+            if len(runs) > 0 and runs[-1][0] is chain.table:
+                runs[-1][1].append((start, stop))
+            else:
+                runs.append((chain.table, [(start, stop)]))
+
+        blocks = []
+        for (table, ranges) in runs:
+            if table is None:
+                blocks.append(ranges)
+                blocks.append("TER\n")
+                pdbprofile.count(lines=ranges.count("\n")+1)
+                continue
+
+            rows = np.concatenate([np.arange(start, stop) for (start, stop) in ranges])
+            pdbprofile.count(atoms=len(rows), lines=len(rows)+len(ranges))
+
+            if verbatim and table.source_text is not None:
+                modified = table.modified_rows(rows)
+                lines = self.__format_atoms(table, rows[modified])
+                self.__patch_blocks(table, ranges, modified, lines, blocks)
+                continue
+
+            lines = self.__format_atoms(table, rows)
+
+            position = 0
+            for (start, stop) in ranges:
+                end = position + stop - start
+                for first in xrange(position, end, self.WRITE_BLOCK_SIZE):
+                    blocks.append(lines[first:min(first+self.WRITE_BLOCK_SIZE, end)].tobytes())
+                blocks.append("TER\n")
+                position = end
+
+        return blocks
+
+    def __patch_blocks(self, table, ranges, modified, lines, blocks):
+        """ Adds the atom lines of the row ranges of table (each followed
+            by a TER) to blocks - the formatted lines for the modified 
+            rows, the source text for the rest. Formatted lines are in
+            the same 80 column layout as well formatted source lines, so
+            a patched file is read back column by column throughout.
+        """
 
-            for residue in chain:
-                for atom in residue:
-                    self.__atom_write(handle,atom)
+        text = table.source_text
+
+        position = 0
+        formatted = 0
+        for (start, stop) in ranges:
+            flags  = modified[position:position + stop - start]
+            starts = table.source_starts[start:stop]
+            stops  = table.source_stops[start:stop]
+
+            # runs of modified rows, and of unmodified rows whose lines
+            # follow each other in the source
+            breaks = (flags[1:] != flags[:-1]) | (~flags[1:] & (starts[1:] != stops[:-1]))
+            bounds = [0] + (np.flatnonzero(breaks) + 1).tolist() + [len(flags)]
+
+            for (first, last) in zip(bounds[:-1], bounds[1:]):
+                if flags[first]:
+                    end = formatted + last - first
+                    for i in xrange(formatted, end, self.WRITE_BLOCK_SIZE):
+                        blocks.append(lines[i:min(i+self.WRITE_BLOCK_SIZE, end)].tobytes())
+                    formatted = end
+                else:
+                    block = text[starts[first]:stops[last-1]]
+                    if block[-1:] != "\n":
+                        block = block + "\n"
+                    blocks.append(block)
+
+            blocks.append("TER\n")
+            position = position + stop - start
+
+    def __format_atoms(self, table, rows):
+        """ Formats the atoms at rows of table into PDB atom lines, 
+            returned as an (N,81) uint8 character matrix (one 80 
+            character line, newline included, per row).
+
+            Each column is converted and checked for the whole block at 
+            once and written straight into its character columns. The
+            formatting rules are those of one field at a time padding 
+            (see __string_padder) - an atom name is written from the 
+            2nd column unless it is 4 characters long, the residue name 
+            is centred, the coordinates are written as %.3f and 
+            occupancy/beta as %.2f (as in a well formatted file, so edited
+            lines keep the precision of the lines around them). If any 
+            field is too wide a 
+            PDB_fileException is raised for the first atom (and the first
+            field in that atom) which does not fit.
+        """
 
-            handle.write("TER\n")
+        if len(rows) == 0:
+            return np.zeros((0, self.WRITE_LINE_LENGTH), dtype=np.uint8)
+
+        record_name  = table.record_name[rows]
+        atom_id      = table.atom_id[rows]
+        atom_name    = table.atom_name[rows]
+        alt_location = table.alt_location[rows]
+        res_name     = table.res_name[rows]
+        chain        = table.chain[rows]
+        res_id       = table.res_id[rows]
+        res_ins_code = table.res_ins_code[rows]
+        coords       = table.coords[rows]
+        occupancy    = table.occupancy[rows]
+        beta         = table.beta[rows]
+        seg_ID       = table.seg_ID[rows]
+        element      = table.element[rows]
+
+        # blank (NaN) charges are written as " ", and so are zero 
+        # charges - a blank charge column of an 80 character line is read
+        # as 0.0
+        charge_values = table.charge[rows]
+        has_charge = ~np.isnan(charge_values) & (charge_values != 0.0)
+
+        charge = np.empty(len(rows), dtype="S1")
+        charge.fill(" ")
+        if has_charge.any():
+            strings = self.__float_strings(charge_values[has_charge])
+            charge = charge.astype(strings.dtype)
+            charge[has_charge] = strings
+
+        # (field name, values, width, decimals) of the fixed point fields
+        fixed_point = [(name, coords[:, i], 8, 3) for (i, name) in enumerate(PDB_atom_table.COORD_COLUMNS)]
+        fixed_point.append(("occupancy", occupancy, 6, 2))
+        fixed_point.append(("beta",      beta,      6, 2))
+
+        # a formatted coordinate can only be wider than 8 characters 
+        # for |x| >= 999.9995 (or inf/nan), and occupancy/beta wider 
+        # than 6 for |x| >= 999.995 - only those values are actually 
+        # formatted to check
+        suspect_strings = {}
+        for (name, values, width, decimals) in fixed_point:
+            suspect = np.flatnonzero(~(np.abs(values) < 999.0))
+            suspect_strings[name] = (suspect, np.array(["%.*f" % (decimals, values[j]) for j in suspect], dtype="S"))
+
+        # (field name, rows which do not fit, value as the error reports it, width)
+        checks = []
+        checks.append(("record_name",  _too_wide(record_name, 6), record_name, 6))
+        checks.append(("atom_id",      np.flatnonzero((atom_id > pdbhybrid36.max_value(5)) | (atom_id < pdbhybrid36.min_value(5))), atom_id, 5))
+        checks.append(("atom_name",    _too_wide(atom_name, 4), atom_name, 4))
+        checks.append(("alt_location", _too_wide(alt_location, 1), alt_location, 1))
+        checks.append(("res_name",     _too_wide(res_name, 3), res_name, 3))
+        checks.append(("chain",        _too_wide(chain, 1), chain, 1))
+        checks.append(("res_id",       np.flatnonzero((res_id > pdbhybrid36.max_value(4)) | (res_id < pdbhybrid36.min_value(4))), res_id, 4))
+        checks.append(("res_ins_code", _too_wide(res_ins_code, 1), res_ins_code, 1))
+
+        for (name, values, width, decimals) in fixed_point:
+            (suspect, strings) = suspect_strings[name]
+            wide = _string_lengths(strings) > width
+            checks.append((name, suspect[wide], dict(zip(suspect[wide], strings[wide])), width))
+
+        checks.append(("seg_ID",       _too_wide(seg_ID, 4), seg_ID, 4))
+        checks.append(("element",      _too_wide(element, 2), element, 2))
+        checks.append(("charge",       _too_wide(charge, 2), charge, 2))
+
+        self.__raise_first_bad_field(checks)
+
+        # every field is valid - fill in the character matrix column
+        # block by column block
+        fields = {}
+        fields["record_name"]  = _left_justified(record_name, 6)
+        fields["atom_id"]      = _serial_chars(atom_id, 5)
+        fields["alt_location"] = _left_justified(alt_location, 1)
+        fields["chain"]        = _right_justified(chain, 1)
+        fields["res_id"]       = _serial_chars(res_id, 4)
+        fields["res_ins_code"] = _right_justified(res_ins_code, 1)
+        fields["seg_ID"]       = _left_justified(seg_ID, 4)
+        fields["element"]      = _right_justified(element, 2)
+        fields["charge"]       = _right_justified(charge, 2)
+
+        # names shorter than 4 characters start one column in
+        name_chars = _left_justified(atom_name, 4)
+        short = _string_lengths(atom_name) < 4
+        name_chars[short, 1:] = name_chars[short, :3]
+        name_chars[short, 0] = 32
+        fields["atom_name"] = name_chars
+
+        # residue names are centred - almost all are 3 characters
+        for i in np.flatnonzero(_string_lengths(res_name) != 3):
+            res_name[i] = self.__string_padder(res_name[i], 3, "C")
+        fields["res_name"] = _left_justified(res_name, 3)
+
+        for (name, values, width, decimals) in fixed_point:
+            fields[name] = _fixed_point_chars(values, width, decimals)
+
+        lines = np.empty((len(rows), self.WRITE_LINE_LENGTH), dtype=np.uint8)
+        lines.fill(32)
+        lines[:, -1] = 10
+
+        for (name, first, last) in self.WRITE_COLUMNS:
+            lines[:, first:last] = fields[name]
+
+        return lines
+
+    def __float_strings(self, values):
+        """ str() of every value of a float array, converting each 
+            distinct value only once
+        """
 
-    def __atom_write(self, handle, atom):
-        record_name = self.__string_padder(atom.record_name, 6, "L")
-        atom_id     = self.__string_padder(atom.atom_id, 5, "R")
-        space1       = " "
-        
+        (unique, inverse) = np.unique(values, return_inverse=True)
 
-        if len(str(atom.atom_name)) < 4:
-            space2 = " "
-            atom_name   = self.__string_padder(atom.atom_name, 3, "L")
-            
-        elif len(str(atom.atom_name)) == 4:
-            space2 = ""
-            atom_name = atom.atom_name
-        else:
+        return np.array([str(i) for i in unique.tolist()], dtype="S")[inverse]
+
+    def __raise_first_bad_field(self, checks):
+        """ Raises the same PDB_fileException the field by field writer
+            would have raised first - i.e. for the first atom with a bad
+            field, and the first bad field within that atom.
+        """
+
+        first = None
+        for (order, (name, bad, values, width)) in enumerate(checks):
+            if len(bad) > 0 and (first is None or bad.min() < first[0]):
+                first = (bad.min(), order)
+
+        if first is None:
+            return
+
+        (row, order) = first
+        (name, bad, values, width) = checks[order]
+
+        if name == "atom_name":
             raise PDB_fileException("ERROR writing PDB formatting atom name")
 
-        alt_location = self.__string_padder(atom.alt_location, 1, "C")
-        res_name = self.__string_padder(atom.res_name,3, "C")
-        space3 = " "
-        chain = self.__string_padder(atom.chain, 1, "R")
-        
-        res_seq = self.__string_padder(atom.res_id, 4, "R")
-        res_ins_code = self.__string_padder(atom.res_ins_code, 1, "R")
-        space4 = "   "
-        
-        xcoord = self.__string_padder("%.3f" % atom.coord_X, 8, "R")
-        ycoord = self.__string_padder("%.3f" % atom.coord_Y, 8, "R")
-        zcoord = self.__string_padder("%.3f" % atom.coord_Z, 8, "R")
-        occupancy = self.__string_padder(atom.occupancy, 6, "R")
-        beta = self.__string_padder(atom.beta, 6, "R")
-        space5 = "       "
-        segID = self.__string_padder(atom.seg_ID, 4, "L")
-        element = self.__string_padder(atom.element, 1, "R")
-        charge = self.__string_padder(atom.charge, 1, "R")
-
-        # now build the actual line from the various components
-        outline = record_name + atom_id + space1 + space2 + atom_name + \
-                  alt_location + res_name + space3 + chain + res_seq + \
-                  res_ins_code + space4 + xcoord + ycoord + zcoord + \
-                  occupancy + beta + space5 + segID + element + charge + "\n"
-
-        handle.write(outline)
+        self.__string_padder(values[row], width, "R")
 
     def __string_padder(self, item,length,justification):
 
@@ -669,6 +3062,11 @@ class PDB_file:
         return self.__str__()
 
     def __str__(self):
+        if self._table is None:
+            index = self.chains.index
+            n_residues = sum([index.n_residues(i) for i in self.chains])
+            return "<PDB_file of " + str(len(self.chains)) + " chains, " + str(n_residues) + " residues and " +  str(len(index.line_starts)) + " atoms (lazily loaded)>"
+
         return "<PDB_file of " + str(len(self.chains)) + " chains, " + str(len(self.residues)) + " residues and " +  str(len(self.atoms)) + " atoms>"
 
     def __getitem__(self, key):
@@ -679,3 +3077,313 @@ class PDB_file:
             return None
 
     
+##-------------------------------------------------------##
+##                  Streaming readers                    ##
+##-------------------------------------------------------##
+
+def iter_atoms(filename, block_size=4096):
+    """ Generator which yields every atom in a PDB file as a PDB_atom,
+        without ever loading the whole file. Atoms carry the same 
+        chain_local_id as they would in a PDB_file (see iter_residues).
+
+        # INPUT
+        filename   :     String or binary file object (may be compressed)
+        block_size :     Number of atom lines parsed at a time
+
+        # OUTPUT
+        -          :     Generator of PDB_atom
+    """
+
+    for residue in iter_residues(filename, block_size):
+        for atom in residue.atoms:
+            yield atom
+
+
+def iter_residues(filename, block_size=4096):
+    """ Generator which yields every residue in a PDB file as a PDB_residue,
+        reading the file as it goes. 
+
+        Atom lines are parsed block_size at a time with PDB_atom.parse_block
+        and split into residues with PDB_atom_table.assign_boundaries, i.e.
+        exactly the residue boundaries and chain local numbering of a 
+        PDB_file. The last residue of each block is held back and re-parsed
+        with the next block (it may continue there), so memory is bounded 
+        by the block size plus the largest residue, not by the file.
+
+        Unlike PDB_file, chains are not gathered across the whole file - 
+        chain local numbering restarts whenever the chain ID changes from 
+        one residue to the next. For files where each chain is a single 
+        contiguous block (the normal case) this is identical.
+
+        # INPUT
+        filename   :     String or binary file object (may be compressed)
+        block_size :     Number of atom lines parsed at a time
+
+        # OUTPUT
+        -          :     Generator of PDB_residue
+    """
+
+    carry = []
+
+    # chain of the last residue yielded and its chain local ID
+    numbering = [None, 0]
+
+    for block in _iter_atom_line_blocks(pdbio.iter_lines(filename), block_size):
+        lines = carry + block
+
+        table = PDB_atom.parse_block(lines)
+        table.assign_boundaries()
+
+        # hold back the last residue - it may continue in the next block
+        (start, stop) = table.get_residue_range(table.n_residues - 1)
+        carry = lines[start:stop]
+
+        for residue in _number_residues(table, table.n_residues - 1, numbering):
+            yield residue
+
+    if len(carry) > 0:
+        table = PDB_atom.parse_block(carry)
+        table.assign_boundaries()
+
+        for residue in _number_residues(table, table.n_residues, numbering):
+            yield residue
+
+
+def iter_chains(filename, block_size=4096):
+    """ Generator which yields every chain in a PDB file as a PDB_chain, 
+        reading the file as it goes. A chain is a contiguous run of 
+        residues with the same chain ID (see iter_residues), so memory is
+        bounded by the largest chain rather than the file.
+
+        # INPUT
+        filename   :     String or binary file object (may be compressed)
+        block_size :     Number of atom lines parsed at a time
+
+        # OUTPUT
+        -          :     Generator of PDB_chain
+    """
+
+    residues = []
+
+    for residue in iter_residues(filename, block_size):
+        if len(residues) > 0 and residue.chain != residues[-1].chain:
+            yield _chain_from_residues(residues)
+            residues = []
+        residues.append(residue)
+
+    if len(residues) > 0:
+        yield _chain_from_residues(residues)
+
+
+def _iter_atom_line_blocks(lines, block_size):
+    """ Yields the atom lines from an iterable of lines in lists of (at
+        most) block_size lines
+    """
+
+    block = []
+    for line in lines:
+        if record_name(line) == "ATOM":
+            block.append(line)
+            if len(block) == block_size:
+                yield block
+                block = []
+
+    if len(block) > 0:
+        yield block
+
+
+def _number_residues(table, n_residues, numbering):
+    """ Yields the first n_residues residues of table as PDB_residue views,
+        overwriting their chain local IDs so the numbering carries on 
+        from the residues already streamed. numbering is the 
+        [chain, chain_local_id] of the last residue yielded, and is 
+        updated in place.
+    """
+
+    for index in xrange(n_residues):
+        (start, stop) = table.get_residue_range(index)
+        chain = table.chain[start]
+
+        if chain != numbering[0]:
+            numbering[0] = chain
+            numbering[1] = 0
+        numbering[1] = numbering[1] + 1
+
+        table.chain_local_id[start:stop] = numbering[1]
+
+        yield PDB_residue(table, index)
+
+
+def _chain_from_residues(residues):
+    """ Builds a PDB_chain (over a table of its own) from a list of 
+        PDB_residue views which all belong to one chain
+    """
+
+    tables = []
+    for residue in residues:
+        (start, stop) = residue._table.get_residue_range(residue._index)
+        tables.append(residue._table.take(np.arange(start, stop)))
+
+    table = PDB_atom_table.concatenate(tables)
+    table.assign_boundaries()
+
+    return PDB_chain(table, 0)
+
+
+
+##-------------------------------------------------------##
+##                 Coordinate frames                     ##
+##-------------------------------------------------------##
+
+# file name extension -> coordinate format (after any compression 
+# extension, e.g. frame.xyz.gz)
+COORDINATE_EXTENSIONS = {".xyz" : "xyz"}
+
+
+def coordinate_format(source):
+    """ The format read_coordinates reads source as - "array" for a 
+        numeric array (or nested list), "buffer" for a bytearray, buffer
+        or memoryview of raw binary values and otherwise (a file name or
+        file object) "xyz" for a .xyz file name and "pdb" for anything
+        else. A raw binary str has to be given with format="buffer", as
+        a str is taken to be a file name.
+    """
+
+    if isinstance(source, (np.ndarray, list, tuple)):
+        return "array"
+
+    if isinstance(source, (bytearray, buffer, memoryview)):
+        return "buffer"
+
+    if hasattr(source, "read"):
+        return "pdb"
+
+    name = str(source)
+    if pdbio.compression_from_name(name) is not None:
+        name = os.path.splitext(name)[0]
+
+    return COORDINATE_EXTENSIONS.get(os.path.splitext(name)[1].lower(), "pdb")
+
+
+def read_coordinates(source, format="infer", dtype=np.float64, names=False):
+    """ Reads one frame of coordinates (and, for the formats which hold 
+        them, atom labels) without parsing anything else.
+
+        For a PDB file only columns 31-54 (and 13-16 with names=True) of
+        the ATOM lines are parsed. An XYZ file is read as an atom count 
+        line, a comment line and then one "label x y z" line per atom 
+        (only the first frame of a multi-frame file). An array must be 
+        (N,3) and a raw binary buffer holds N*3 values of dtype (x, y, z
+        of each atom in turn). Atoms come in the order of the source.
+
+        # INPUT
+        source :     (N,3) array, raw binary buffer, or the file name or
+                     file object of a PDB or XYZ file (compressed files
+                     are read as in pdbio)
+        format :     "infer" (see coordinate_format), "array", "buffer",
+                     "pdb" or "xyz"
+        dtype  :     Type of the values in a raw binary buffer (e.g. 
+                     np.float32)
+        names  :     Bool - also return the atom labels (None for arrays
+                     and buffers)
+
+        # OUTPUT
+        -      :     (N,3) float array, or ((N,3) float array, labels) 
+                     with names=True
+    """
+
+    if format == "infer":
+        format = coordinate_format(source)
+
+    labels = None
+
+    if format == "array":
+        coords = np.asarray(source, dtype=np.float64)
+        if coords.ndim != 2 or coords.shape[1] != 3:
+            raise PDB_fileException("Coordinates must be an (N,3) array, not " + str(coords.shape))
+
+    elif format == "buffer":
+        values = np.frombuffer(source, dtype=dtype)
+        if len(values) % 3 != 0:
+            raise PDB_fileException("Raw coordinate buffer holds " + str(len(values)) + " values, which is not a whole number of (x, y, z) triples")
+        coords = values.astype(np.float64).reshape(-1, 3)
+
+    elif format == "pdb":
+        raw = pdbio.read_bytes(source)
+        (header, footer, atom_numbers, starts, stops) = PDB_chain_index.split_records(raw)
+
+        if names:
+            (coords, labels) = PDB_atom.parse_text_coordinates(raw, starts, stops, names=True)
+        else:
+            coords = PDB_atom.parse_text_coordinates(raw, starts, stops)
+
+    elif format == "xyz":
+        (coords, labels) = _read_xyz(pdbio.read_bytes(source))
+
+    else:
+        raise PDB_fileException("Unknown coordinate format " + str(format))
+
+    return (coords, labels) if names else coords
+
+
+def _read_xyz(raw):
+    """ (coords, labels) of the first frame of the text of an XYZ file """
+
+    head = raw.split("\n", 2)
+    try:
+        n_atoms = int(head[0].split()[0])
+    except (ValueError, IndexError):
+        raise PDB_fileException("XYZ file does not start with an atom count: " + repr(head[0][:80]))
+
+    lines = head[2].split("\n", n_atoms)[:n_atoms] if len(head) == 3 else []
+    if len(lines) < n_atoms:
+        raise PDB_fileException("XYZ file gives " + str(n_atoms) + " atoms but only has " + str(len(lines)) + " atom lines")
+
+    # the usual "label x y z" lines split into one (N,4) block - anything
+    # with extra columns is split line by line
+    tokens = " ".join(lines).split()
+    if len(tokens) != 4 * n_atoms:
+        tokens = []
+        for line in lines:
+            tokens.extend(line.split()[:4])
+
+    try:
+        tokens = np.array(tokens, dtype="S").reshape(n_atoms, 4)
+        coords = tokens[:, 1:].astype(np.float64)
+    except ValueError:
+        raise PDB_fileException("XYZ atom lines must be \"label x y z\"")
+
+    return (coords, tokens[:, 0])
+
+
+def _load_coordinates(table, rows, source, format, dtype, check_names):
+    """ Loads a frame of coordinates into rows of table (see 
+        PDB_file.load_coordinates)
+    """
+
+    if format == "infer":
+        format = coordinate_format(source)
+
+    with pdbprofile.stage("load_coordinates", atoms=len(rows)):
+        (coords, labels) = read_coordinates(source, format, dtype, names=True)
+
+        if len(coords) != len(rows):
+            raise PDB_fileException("Coordinates are given for " + str(len(coords)) + " atoms but the structure has " + str(len(rows)))
+
+        # files list their atoms in the order the structure was read in
+        if labels is not None and table.source_rows is not None:
+            rows = rows[np.argsort(table.source_rows[rows], kind="mergesort")]
+
+        if check_names and labels is not None:
+            # an XYZ label may be the element rather than the atom name
+            matched = table.atom_name[rows] == labels
+            if format == "xyz":
+                matched |= table.element[rows] == labels
+
+            if not matched.all():
+                position = np.flatnonzero(~matched)[0]
+                row = rows[position]
+                raise PDB_fileException("Atom " + str(position + 1) + " of the coordinates is " + str(labels[position]) + " but the structure has " + 
+                                        str(table.atom_name[row]) + " (residue " + str(table.res_name[row]) + " " + str(table.res_id[row]) + ", chain " + str(table.chain[row]) + ")")
+
+        table.coords[rows] = coords
@@ -0,0 +1,98 @@
+# Benchmark for chain grouping in PDB_residue_organizer
+#
+# Times PDB_residue_organizer.group_by_chain on a fixed number of atoms
+# split into an increasing number of chains, against the previous
+# list-membership + per-chain rescan grouping (O(atoms x chains)).
+#
+# usage: python bench_chain_grouping.py [n_atoms] [max_legacy_chains]
+#
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import PDBParser
+
+
+CHAIN_COUNTS = (1, 10, 100, 1000, 5000)
+
+
+def build_table(n_atoms, n_chains):
+    """ Table of n_atoms atoms spread over n_chains chains. Every chain is
+        written as two segments, the second after all the first segments 
+        (as if the chain ID was reused after a TER)
+    """
+
+    table = PDBParser.PDB_atom_table(n_atoms)
+
+    per_segment = max(1, n_atoms // (2 * n_chains))
+    segment = np.arange(n_atoms) // per_segment
+    chains = segment % n_chains
+
+    table.chain = np.array([str(i) for i in xrange(n_chains)], dtype="S")[chains]
+    table.res_id = np.arange(n_atoms) // 10
+
+    return table
+
+
+def legacy_group_by_chain(parsed_atoms):
+    """ The grouping used before - a list membership test per atom and a 
+        full rescan of the atoms for every chain
+    """
+
+    chainid_list = []
+    for chain in parsed_atoms.chain:
+        if chain in chainid_list:
+            pass
+        else:
+            chainid_list.append(chain)
+
+    return np.concatenate([np.flatnonzero(parsed_atoms.chain == chainid) for chainid in chainid_list])
+
+
+def best_of(function, argument, repeats=3):
+    times = []
+    for i in xrange(repeats):
+        start = time.time()
+        result = function(argument)
+        times.append(time.time() - start)
+
+    return (min(times), result)
+
+
+def main():
+    n_atoms = 200000
+    max_legacy_chains = 1000
+
+    if len(sys.argv) > 1:
+        n_atoms = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        max_legacy_chains = int(sys.argv[2])
+
+    organizer = PDBParser.PDB_residue_organizer()
+
+    print "%i atoms" % n_atoms
+    print "%8s %14s %14s" % ("chains", "grouped (s)", "legacy (s)")
+
+    for n_chains in CHAIN_COUNTS:
+        table = build_table(n_atoms, n_chains)
+
+        (grouped, rows) = best_of(organizer.group_by_chain, table)
+
+        if n_chains <= max_legacy_chains:
+            (legacy, legacy_rows) = best_of(legacy_group_by_chain, table, repeats=1)
+            if not np.array_equal(rows, legacy_rows):
+                raise Exception("Grouped rows differ from the legacy grouping for %i chains" % n_chains)
+            legacy = "%14.4f" % legacy
+        else:
+            legacy = "%14s" % "-"
+
+        print "%8i %14.4f %s" % (n_chains, grouped, legacy)
+
+
+if __name__ == "__main__":
+    main()
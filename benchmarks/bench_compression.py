@@ -0,0 +1,98 @@
+# Benchmark for compressed PDB input/output
+#
+# Measures reading (pdbio.read_lines and a full PDB_file load) and
+# writing (PDB_file.write_file) of plain, gzip and bz2 (and xz where the
+# lzma module is available) files of a synthetic structure. Throughput is
+# given in MB/s of uncompressed PDB text. Reading a gzip file through the
+# previous workflow - decompress to a temporary file, parse that - is
+# shown for comparison.
+#
+# usage: python bench_compression.py [n_atoms]
+#
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import PDBParser
+import pdbio
+import synthetic
+
+
+EXTENSIONS = ((None, ""), ("gzip", ".gz"), ("bz2", ".bz2"), ("xz", ".xz"))
+
+
+def best_of(function, repeats=3):
+    times = []
+    for i in xrange(repeats):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+
+    return min(times)
+
+
+def decompress_then_parse(filename, scratch):
+    """ The workflow compressed input used to need """
+
+    with open(scratch, "wb") as out:
+        shutil.copyfileobj(gzip.open(filename, "rb"), out)
+
+    PDBParser.PDB_file(scratch)
+    os.remove(scratch)
+
+
+def main():
+    n_atoms = 200000
+    if len(sys.argv) > 1:
+        n_atoms = int(sys.argv[1])
+
+    workdir = tempfile.mkdtemp(prefix="pdbparser_compression_")
+
+    try:
+        # heuristic lines parse slowly but write cleanly, so the written
+        # files are what is read back. Written lines are read with the
+        # heuristic parser too, so chains are kept below 1000 residues
+        # (where a residue number runs into the chain ID)
+        source = os.path.join(workdir, "source.pdb")
+        n_chains = max(1, min(len(synthetic.CHAIN_IDS), n_atoms // 5000 + 1))
+        synthetic.write_structure(source, n_atoms, n_chains=n_chains, fixed_width=False)
+        pdb = PDBParser.PDB_file(source)
+
+        plain = os.path.join(workdir, "structure.pdb")
+        pdb.write_file(plain)
+        megabytes = os.path.getsize(plain) / 1048576.0
+
+        print "%i atoms, %.1f MB of PDB text" % (len(pdb.table), megabytes)
+        print
+        print "%-22s %10s %10s %12s %12s %12s" % ("format", "size (MB)", "write", "read lines", "load", "load")
+        print "%-22s %10s %10s %12s %12s %12s" % ("", "", "(MB/s)", "(MB/s)", "(MB/s)", "(atoms/s)")
+
+        for (compression, extension) in EXTENSIONS:
+            if compression == "xz" and pdbio.lzma is None:
+                print "%-22s %s" % ("xz", "skipped - no lzma module")
+                continue
+
+            filename = plain + extension
+
+            write = best_of(lambda: pdb.write_file(filename))
+            read = best_of(lambda: pdbio.read_lines(filename))
+            load = best_of(lambda: PDBParser.PDB_file(filename))
+
+            print "%-22s %10.2f %10.1f %12.1f %12.1f %12.0f" % (compression or "plain", os.path.getsize(filename) / 1048576.0,
+                                                                  megabytes / write, megabytes / read, megabytes / load, len(pdb.table) / load)
+
+        load = best_of(lambda: decompress_then_parse(plain + ".gz", os.path.join(workdir, "scratch.pdb")))
+        print "%-22s %10s %10s %12s %12.1f %12.0f" % ("gzip via temp file", "", "", "", megabytes / load, len(pdb.table) / load)
+
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmark for parallel parsing of a single large PDB file
+#
+# Loads a synthetic fixed width structure serially and then with an
+# increasing number of worker processes (PDB_file(..., processes=n)),
+# giving the whole load time and the time of the parse_atoms and 
+# fingerprint stages (the part run by the workers) with the speedup of each over the serial
+# load. Every parallel load is checked against the serial one.
+#
+# usage: python bench_parallel.py [n_atoms] [max_processes]
+#
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import PDBParser
+import pdbprofile
+import synthetic
+
+
+def timed_load(filename, processes):
+    """ (PDB_file, whole load seconds, parse_atoms seconds) """
+
+    start = time.time()
+    with pdbprofile.PDB_profiler() as report:
+        pdb = PDBParser.PDB_file(filename, processes=processes)
+    seconds = time.time() - start
+
+    # a parallel parse takes the row fingerprints in the workers
+    parse = sum([i.seconds for i in report.find("parse_atoms") + report.find("fingerprint")])
+
+    return (pdb, seconds, parse)
+
+
+def same_table(a, b):
+    for name in a.column_names() + ["residue_offsets", "chain_offsets", "source_rows"]:
+        (x, y) = (getattr(a, name), getattr(b, name))
+        if x.dtype != y.dtype or x.shape != y.shape or not ((x == y) | ((x != x) & (y != y))).all():
+            return False
+
+    return a.chain_names == b.chain_names
+
+
+def main():
+    n_atoms = 5000000
+    if len(sys.argv) > 1:
+        n_atoms = int(sys.argv[1])
+
+    max_processes = multiprocessing.cpu_count()
+    if len(sys.argv) > 2:
+        max_processes = int(sys.argv[2])
+
+    workdir = tempfile.mkdtemp(prefix="pdbparser_parallel_")
+
+    try:
+        filename = os.path.join(workdir, "structure.pdb")
+        n_chains = max(1, min(len(synthetic.CHAIN_IDS), n_atoms // 100000 + 1))
+        synthetic.write_structure(filename, n_atoms, n_chains=n_chains)
+
+        (serial, serial_load, serial_parse) = timed_load(filename, 1)
+
+        print "%i atoms in %i chains, %i CPUs" % (len(serial.table), n_chains, multiprocessing.cpu_count())
+        print
+        print "%-10s %10s %10s %12s %10s" % ("processes", "load (s)", "speedup", "parse (s)", "speedup")
+        print "%-10s %10.3f %10s %12.3f %10s" % ("serial", serial_load, "", serial_parse, "")
+
+        processes = 2
+        while processes <= max_processes:
+            (pdb, load, parse) = timed_load(filename, processes)
+            check = "" if same_table(serial.table, pdb.table) else "DIFFERS FROM SERIAL"
+
+            print "%-10i %10.3f %10.2f %12.3f %10.2f %s" % (processes, load, serial_load / load, parse, serial_parse / parse, check)
+            processes = processes * 2
+
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
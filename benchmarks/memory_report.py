@@ -0,0 +1,148 @@
+# Memory report for the atom representation
+#
+# Builds a synthetic system (see synthetic.py) of well formatted lines and reports the
+# bytes used per atom by
+#
+#   - the original object-per-atom representation (an instance __dict__
+#     holding a separate string/int/float object for every field, res_id
+#     kept as a string), reproduced here as LegacyAtom
+#   - the PDB_atom_table columns
+#   - PDB_atom views onto the table, which only carry __slots__
+#
+# Sizes are counted with sys.getsizeof over every distinct object reached
+# (shared objects - interned strings, cached small ints - count once), and
+# the change in resident memory while building each representation is
+# shown alongside.
+#
+# usage: python memory_report.py [n_atoms]
+#
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import PDBParser
+import synthetic
+
+
+class LegacyAtom:
+    """ The original PDB_atom - every field is an attribute in the
+        instance __dict__, parsed from an 80 character line
+    """
+
+    def __init__(self, line):
+        self.record_name    = line[0:6].strip()
+        self.atom_id        = int(line[6:11].strip())
+        self.atom_name      = line[12:16].strip()
+        self.alt_location   = line[16]
+        self.res_name       = line[17:20].strip()
+        self.chain          = line[21]
+        self.res_id         = line[22:26].strip()
+        self.res_ins_code   = line[26]
+        self.coord_X        = float(line[30:38].strip())
+        self.coord_Y        = float(line[38:46].strip())
+        self.coord_Z        = float(line[46:54].strip())
+        self.occupancy      = float(line[54:60].strip())
+        self.beta           = float(line[60:66].strip())
+        self.seg_ID         = line[72:76].strip()
+        self.element        = line[76:78].strip()
+        self.charge         = 0.0
+        self.chain_local_id = -1
+        self.formatted_ok   = True
+
+
+def deep_size(objects):
+    """ Total sys.getsizeof of every distinct object reachable from
+        objects through instance dicts and containers (the table a
+        view points to is not followed)
+    """
+
+    seen = set()
+    total = 0
+    stack = list(objects)
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total = total + sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+
+    return total
+
+
+def resident_bytes():
+    """ Current resident set size (Linux), or None """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def measure(build):
+    """ Builds a representation and returns (result, change in RSS) """
+
+    gc.collect()
+    before = resident_bytes()
+    result = build()
+    gc.collect()
+    after = resident_bytes()
+
+    if before is None or after is None:
+        return (result, None)
+    return (result, after - before)
+
+
+def report(label, n_atoms, counted, rss):
+    if rss is None:
+        rss = "%12s" % "-"
+    else:
+        rss = "%12.1f" % (float(rss) / n_atoms)
+
+    print "%-34s %12.1f %s" % (label, float(counted) / n_atoms, rss)
+
+
+def main():
+    n_atoms = 1000000
+    if len(sys.argv) > 1:
+        n_atoms = int(sys.argv[1])
+
+    lines = [line for line in synthetic.structure_lines(n_atoms) if line[:4] == "ATOM"]
+    n_atoms = len(lines)
+
+    print "%i atoms" % n_atoms
+    print "%-34s %12s %12s" % ("representation", "bytes/atom", "RSS/atom")
+
+    (table, rss) = measure(lambda: PDBParser.PDB_atom.parse_block(lines))
+    counted = sum(getattr(table, name).nbytes for name in table.column_names())
+    report("PDB_atom_table columns", n_atoms, counted, rss)
+
+    # views are normally built on demand, but this is what holding one
+    # for every atom costs
+    (views, rss) = measure(lambda: list(PDBParser.PDB_atom_sequence(table)))
+    report("PDB_atom views (__slots__)", n_atoms, deep_size(views) - sys.getsizeof(views), rss)
+
+    # measured last, so memory it frees can not flatter the others
+    (legacy, rss) = measure(lambda: [LegacyAtom(line) for line in lines])
+    report("object per atom (original)", n_atoms, deep_size(legacy) - sys.getsizeof(legacy), rss)
+
+    # every read of the same residue name gives back the same object
+    names = [view.res_name for view in views[:1000]]
+    print
+    print "text values read through views are interned: %s" % (len(set(map(id, names))) == len(set(names)))
+
+
+if __name__ == "__main__":
+    main()
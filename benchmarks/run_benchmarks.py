@@ -0,0 +1,373 @@
+# Benchmark suite for PDBParser/camparipdbtools
+#
+# Generates synthetic structures (see synthetic.py) from 1k up to 10M
+# atoms - single chain and many chain layouts, well formatted 80
+# character files and files which need the heuristic parser, and multi
+# MODEL files - and times
+#
+#   parse          PDB_file construction
+#   write          PDB_file.write_file
+#   edit           rename_atom (there and back) and define_residue_order
+#                  (reversed) on each residue, up to --edit-limit residues
+#   CAMPARI_to_GMX CAMPARI_pdb.convert_from_CAMPARI_to_GMX
+#   GMX_to_CAMPARI CAMPARI_pdb.convert_from_GMX_to_CAMPARI
+#   trajectory     PDB_trajectory indexing plus reading every frame
+#
+# Every case runs in its own process so its peak RSS can be recorded.
+# Results are written as JSON, and two result files can be compared:
+#
+# usage: python run_benchmarks.py [--sizes 1k,10k,100k,1M] [--output results.json]
+#        python run_benchmarks.py --compare base.json new.json [--threshold 1.1]
+#
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import numpy as np
+
+import PDBParser
+import camparipdbtools
+import pdbtrajectory
+import synthetic
+
+
+DEFAULT_SIZES = "1k,10k,100k,1M"
+FULL_SIZES    = "1k,10k,100k,1M,10M"
+QUICK_SIZES   = "1k,10k"
+
+# layout -> number of chains for n_atoms atoms
+LAYOUTS = {"single" : lambda n_atoms: 1,
+           "many"   : lambda n_atoms: max(1, min(len(synthetic.CHAIN_IDS), n_atoms // 100))}
+
+FORMATS = ("fixed", "heuristic")
+
+SINGLE_MODEL_OPERATIONS = ("parse", "write", "edit", "CAMPARI_to_GMX", "GMX_to_CAMPARI")
+MULTI_MODEL_OPERATIONS  = ("parse", "trajectory")
+
+
+def parse_size(text):
+    """ "10k" -> 10000, "1M" -> 1000000 """
+
+    text = text.strip()
+    scale = {"k" : 1000, "K" : 1000, "m" : 1000000, "M" : 1000000}.get(text[-1])
+    if scale is None:
+        return int(text)
+    return int(float(text[:-1]) * scale)
+
+
+def build_cases(sizes, n_models):
+    """ The list of cases (dicts) to run """
+
+    cases = []
+    for n_atoms in sizes:
+        for layout in sorted(LAYOUTS):
+            for fmt in FORMATS:
+                for operation in SINGLE_MODEL_OPERATIONS:
+                    cases.append({"n_atoms"   : n_atoms,
+                                  "layout"    : layout,
+                                  "format"    : fmt,
+                                  "n_models"  : 1,
+                                  "operation" : operation})
+
+        if n_models > 1:
+            for operation in MULTI_MODEL_OPERATIONS:
+                cases.append({"n_atoms"   : n_atoms,
+                              "layout"    : "single",
+                              "format"    : "fixed",
+                              "n_models"  : n_models,
+                              "operation" : operation})
+
+    return cases
+
+
+def case_name(case):
+    name = "%i-%s-%s" % (case["n_atoms"], case["layout"], case["format"])
+    if case["n_models"] > 1:
+        name = name + "-%imodels" % case["n_models"]
+    return name + "/" + case["operation"]
+
+
+def input_file(case, data_dir):
+    """ Generates (once) and returns the structure file for a case """
+
+    # GMX_to_CAMPARI reads files with GROMACS cap names
+    flavour = "GMX" if case["operation"] == "GMX_to_CAMPARI" else "CAMPARI"
+    n_chains = LAYOUTS[case["layout"]](case["n_atoms"])
+
+    filename = os.path.join(data_dir, "synthetic_%i_%ichains_%s_%imodels_%s.pdb" % (case["n_atoms"], n_chains, case["format"], case["n_models"], flavour))
+
+    if not os.path.exists(filename):
+        tmpfile = filename + ".tmp%i" % os.getpid()
+        synthetic.write_structure(tmpfile, case["n_atoms"], n_chains, case["format"] == "fixed", case["n_models"], flavour)
+        os.rename(tmpfile, filename)
+
+    return filename
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on OS X
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+def edit_residues(pdb, limit):
+    """ rename_atom there and back and define_residue_order (reversed) on
+        up to limit residues. Returns the number of residues edited.
+    """
+
+    targets = []
+    for chainID in sorted(pdb.chains):
+        for (position, residue) in enumerate(pdb.chains[chainID].residues):
+            if len(targets) == limit:
+                break
+            names = [atom.atom_name for atom in residue.atoms]
+            if "CA" in names:
+                targets.append((chainID, position + 1, names[::-1]))
+
+    start = time.time()
+    for (chainID, resID, order) in targets:
+        pdb.rename_atom(chainID, resID, "CA", "CX")
+        pdb.rename_atom(chainID, resID, "CX", "CA")
+        pdb.define_residue_order(chainID, resID, order)
+
+    return (time.time() - start, len(targets))
+
+
+def run_operation(case, filename, scratch, edit_limit):
+    """ Runs one repeat of a case, returning (parse seconds, operation
+        seconds, operation count)
+    """
+
+    operation = case["operation"]
+
+    if operation == "trajectory":
+        start = time.time()
+        trajectory = pdbtrajectory.PDB_trajectory(filename, cache_size=0)
+        for frame in trajectory:
+            pass
+        trajectory.close()
+        return (None, time.time() - start, len(trajectory))
+
+    start = time.time()
+    if operation in ("CAMPARI_to_GMX", "GMX_to_CAMPARI"):
+        converter = camparipdbtools.CAMPARI_pdb(filename)
+        pdb = converter.pdbfile
+    else:
+        pdb = PDBParser.PDB_file(filename)
+    parse_time = time.time() - start
+
+    if operation == "parse":
+        return (parse_time, parse_time, 1)
+
+    if operation == "write":
+        start = time.time()
+        pdb.write_file(scratch)
+        return (parse_time, time.time() - start, 1)
+
+    if operation == "edit":
+        (seconds, count) = edit_residues(pdb, edit_limit)
+        return (parse_time, seconds, count)
+
+    start = time.time()
+    getattr(converter, camparipdbtools.CONVERSIONS[operation][0])()
+    return (parse_time, time.time() - start, 1)
+
+
+def run_case(case, data_dir, repeats, edit_limit):
+    """ Runs a case (in this process) and returns its result dict. The
+        best (smallest) time over the repeats is reported.
+    """
+
+    result = dict(case)
+    result["name"] = case_name(case)
+
+    (handle, scratch) = tempfile.mkstemp(suffix=".pdb", dir=data_dir)
+    os.close(handle)
+
+    try:
+        filename = input_file(case, data_dir)
+        result["file_bytes"] = os.path.getsize(filename)
+
+        times = []
+        parse_times = []
+        for repeat in xrange(repeats):
+            (parse_time, seconds, count) = run_operation(case, filename, scratch, edit_limit)
+            times.append(seconds)
+            if parse_time is not None:
+                parse_times.append(parse_time)
+
+        result["status"] = "ok"
+        result["seconds"] = min(times)
+        result["count"] = count
+        result["parse_seconds"] = min(parse_times) if parse_times else None
+        result["atoms_per_second"] = case["n_atoms"] * case["n_models"] / result["seconds"] if result["seconds"] > 0 else None
+
+    except Exception, e:
+        result["status"] = "error"
+        result["message"] = "%s: %s" % (type(e).__name__, e)
+
+    finally:
+        os.remove(scratch)
+
+    result["peak_rss_bytes"] = peak_rss()
+
+    return result
+
+
+def run_in_subprocess(case, args):
+    """ Runs a case in a fresh interpreter and returns its result dict """
+
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case),
+               "--data-dir", args.data_dir, "--repeats", str(args.repeats), "--edit-limit", str(args.edit_limit)]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    (output, error) = process.communicate()
+
+    if process.returncode == 0:
+        try:
+            return json.loads(output)
+        except ValueError:
+            pass
+
+    result = dict(case)
+    result["name"] = case_name(case)
+    result["status"] = "crashed"
+    result["message"] = "benchmark process exited with code %i" % process.returncode
+
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=HERE, stderr=open(os.devnull, "w")).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {"python"    : platform.python_version(),
+            "numpy"     : np.__version__,
+            "platform"  : platform.platform(),
+            "machine"   : platform.machine(),
+            "revision"  : git_revision(),
+            "timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def print_result(result):
+    if result["status"] == "ok":
+        print "%-46s %10.4f s %12.0f atoms/s %8.1f MB" % (result["name"], result["seconds"], result["atoms_per_second"] or 0, result["peak_rss_bytes"] / 1048576.0)
+    else:
+        print "%-46s %s (%s)" % (result["name"], result["status"].upper(), result.get("message", ""))
+    sys.stdout.flush()
+
+
+def compare(base_file, new_file, threshold):
+    """ Prints the time and peak RSS ratio (new/base) of every case found
+        in both files. Returns the number of cases slower than threshold.
+    """
+
+    with open(base_file) as f:
+        base = dict((i["name"], i) for i in json.load(f)["results"])
+    with open(new_file) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+
+    print "%-46s %10s %10s %8s %8s" % ("case", "base (s)", "new (s)", "time", "RSS")
+    for result in new:
+        old = base.get(result["name"])
+        if old is None:
+            continue
+
+        if old["status"] != "ok" or result["status"] != "ok":
+            print "%-46s %10s %10s" % (result["name"], old["status"], result["status"])
+            continue
+
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        rss_ratio = float(result["peak_rss_bytes"]) / old["peak_rss_bytes"]
+
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            regressions = regressions + 1
+        elif ratio < 1.0 / threshold:
+            flag = "  faster"
+
+        print "%-46s %10.4f %10.4f %7.2fx %7.2fx%s" % (result["name"], old["seconds"], result["seconds"], ratio, rss_ratio, flag)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks parsing, editing, writing and converting synthetic PDB files")
+
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated atom counts, e.g. 1k,10k,1M (default %(default)s)")
+    parser.add_argument("--full", action="store_true", help="run every size up to 10M atoms (" + FULL_SIZES + ")")
+    parser.add_argument("--quick", action="store_true", help="only the small sizes (" + QUICK_SIZES + ")")
+    parser.add_argument("--models", type=int, default=10, help="frames in the multi-MODEL cases, 1 to skip them (default %(default)s)")
+    parser.add_argument("--only", help="only run cases whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=3, help="repeats per case, the best time is kept (default %(default)s)")
+    parser.add_argument("--edit-limit", type=int, default=20000, help="residues edited in the edit cases (default %(default)s)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "pdbparser_benchmarks"), help="where generated structures are kept (default %(default)s)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="result file (default %(default)s)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=1.10, help="time ratio counted as a regression by --compare (default %(default)s)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(args.compare[0], args.compare[1], args.threshold)
+        print "%i case(s) slower than %.2fx" % (regressions, args.threshold)
+        return 1 if regressions else 0
+
+    if not os.path.isdir(args.data_dir):
+        os.makedirs(args.data_dir)
+
+    if args.run_case:
+        print json.dumps(run_case(json.loads(args.run_case), args.data_dir, args.repeats, args.edit_limit))
+        return 0
+
+    sizes = args.sizes
+    if args.full:
+        sizes = FULL_SIZES
+    elif args.quick:
+        sizes = QUICK_SIZES
+
+    cases = build_cases([parse_size(i) for i in sizes.split(",")], args.models)
+    if args.only:
+        cases = [i for i in cases if args.only in case_name(i)]
+
+    env = environment()
+    results = []
+    for case in cases:
+        result = run_in_subprocess(case, args)
+        print_result(result)
+        results.append(result)
+
+        # rewritten after every case so a long run can be inspected
+        with open(args.output, "w") as f:
+            json.dump({"environment" : env, "results" : results}, f, indent=1, sort_keys=True)
+
+    print "results written to " + args.output
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# Synthetic PDB structure generator for the benchmarks
+#
+# Writes capped peptide chains of any size, as well formatted 80
+# character files or as the short whitespace separated lines which go
+# through the heuristic parser, optionally as a multi-MODEL trajectory.
+#
+# usage: python synthetic.py filename n_atoms [n_chains] [fixed|heuristic] [n_models] [CAMPARI|GMX]
+#
+
+import sys
+
+
+# atoms of the repeating residues (names and elements)
+RESIDUES = (("ALA", ("N", "H", "CA", "HA", "CB", "HB1", "HB2", "HB3", "C", "O")),
+            ("GLY", ("N", "H", "CA", "HA1", "HA2", "C", "O")),
+            ("SER", ("N", "H", "CA", "HA", "CB", "HB1", "HB2", "OG", "HG", "C", "O")),
+            ("HIS", ("N", "H", "CA", "HA", "CB", "HB1", "HB2", "CG", "ND1", "CE1", "HE1", "NE2", "HE2", "CD2", "HD2", "C", "O")),
+            ("LEU", ("N", "H", "CA", "HA", "CB", "HB1", "HB2", "CG", "HG", "CD1", "CD2", "C", "O")))
+
+# N- and C-terminal caps as written by each package (camparipdbtools
+# converts between the two)
+CAPS = {"CAMPARI" : (("ACE", ("CH3", "1H", "2H", "3H", "C", "O")),
+                     ("NME", ("N", "HN", "CH3", "1H", "2H", "3H"))),
+        "GMX"     : (("ACE", ("CH3", "C", "O", "1HH3", "2HH3", "3HH3")),
+                     ("NAC", ("N", "CH3", "H", "1HH3", "2HH3", "3HH3")))}
+
+# single character chain IDs - a PDB file can not hold more distinct
+# chains than this
+CHAIN_IDS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+FIXED_FORMAT     = "%-6s%5i %-4s %3s %1s%4i    %8.3f%8.3f%8.3f%6.2f%6.2f      %-4s%2s  \n"
+HEURISTIC_FORMAT = "ATOM %6i  %-4s %3s %s %4i    %8.3f%8.3f%8.3f  1.00  0.00\n"
+
+
+def chain_residues(n_atoms, flavour="CAMPARI"):
+    """ Residues (name, atom names) of one capped chain holding about
+        n_atoms atoms (never fewer than the two caps)
+    """
+
+    (n_cap, c_cap) = CAPS[flavour]
+
+    residues = [n_cap]
+    count = len(n_cap[1]) + len(c_cap[1])
+
+    position = 0
+    while True:
+        residue = RESIDUES[position % len(RESIDUES)]
+        if count + len(residue[1]) > n_atoms:
+            break
+        residues.append(residue)
+        count = count + len(residue[1])
+        position = position + 1
+
+    residues.append(c_cap)
+
+    return residues
+
+
+def structure_lines(n_atoms, n_chains=1, fixed_width=True, flavour="CAMPARI", model=0):
+    """ Generates the atom (and TER) lines of one model. The atoms are
+        split over n_chains capped chains (at most len(CHAIN_IDS)).
+        Atom serials and residue numbers wrap where the PDB fields run
+        out of digits, and coordinates stay within +/-100 so heuristic
+        lines always split on whitespace.
+    """
+
+    if n_chains < 1 or n_chains > len(CHAIN_IDS):
+        raise ValueError("n_chains must be between 1 and %i" % len(CHAIN_IDS))
+
+    serial = 0
+    for chain_index in xrange(n_chains):
+        chain = CHAIN_IDS[chain_index]
+        residues = chain_residues(n_atoms // n_chains, flavour)
+
+        for (res_index, (res_name, atom_names)) in enumerate(residues):
+            res_id = (res_index % 9999) + 1
+
+            for atom_name in atom_names:
+                serial = serial + 1
+                element = atom_name.lstrip("0123456789")[0]
+
+                # a cheap space filling walk, shifted a little per model
+                x = (serial * 1.53) % 190.0 - 95.0
+                y = (serial * 0.377 + chain_index * 7.1) % 190.0 - 95.0
+                z = (res_index * 0.61 + model * 0.25) % 190.0 - 95.0
+
+                if fixed_width:
+                    if len(atom_name) < 4:
+                        atom_name = " " + atom_name
+                    yield FIXED_FORMAT % ("ATOM", serial % 100000, atom_name, res_name, chain, res_id,
+                                          x, y, z, 1.0, 0.0, "PROT", element)
+                else:
+                    yield HEURISTIC_FORMAT % (serial % 100000, atom_name, res_name, chain, res_id, x, y, z)
+
+        yield "TER\n"
+
+
+def write_structure(filename, n_atoms, n_chains=1, fixed_width=True, n_models=1, flavour="CAMPARI"):
+    """ Writes a synthetic structure of about n_atoms atoms (per model)
+        and returns the number of atoms actually written per model
+
+        # INPUT
+        filename    :   String
+        n_atoms     :   Int
+        n_chains    :   Int (1 to len(CHAIN_IDS))
+        fixed_width :   True for 80 character lines, False for lines
+                        which need the heuristic parser
+        n_models    :   Int - more than 1 writes MODEL/ENDMDL blocks
+        flavour     :   "CAMPARI" or "GMX" cap naming
+    """
+
+    count = 0
+    with open(filename, "w") as f:
+        f.write("REMARK   1 SYNTHETIC STRUCTURE %i ATOMS %i CHAINS\n" % (n_atoms, n_chains))
+
+        for model in xrange(n_models):
+            if n_models > 1:
+                f.write("MODEL     %4i\n" % (model + 1))
+
+            count = 0
+            for line in structure_lines(n_atoms, n_chains, fixed_width, flavour, model):
+                f.write(line)
+                if line[:4] == "ATOM":
+                    count = count + 1
+
+            if n_models > 1:
+                f.write("ENDMDL\n")
+
+        f.write("END\n")
+
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print "usage: python synthetic.py filename n_atoms [n_chains] [fixed|heuristic] [n_models] [CAMPARI|GMX]"
+        sys.exit(1)
+
+    filename = sys.argv[1]
+    n_atoms = int(sys.argv[2])
+    n_chains = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    fixed_width = (sys.argv[4] != "heuristic") if len(sys.argv) > 4 else True
+    n_models = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+    flavour = sys.argv[6] if len(sys.argv) > 6 else "CAMPARI"
+
+    print "%s: %i atoms per model" % (filename, write_structure(filename, n_atoms, n_chains, fixed_width, n_models, flavour))
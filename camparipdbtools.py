@@ -1,4 +1,14 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
 import PDBParser
+import pdbio
+import pdbnaming
+import pdbprofile
 
 class CAMPARI_pdbException(Exception):
     pass
@@ -11,121 +21,287 @@ class CAMPARI_pdb:
         self.pdbfile = PDBParser.PDB_file(filename)
 
         
-    def write_file(self, outputfilename):
-        self.pdbfile.write_file(outputfilename)
+    def write_file(self, outputfilename, compression="infer"):
+        self.pdbfile.write_file(outputfilename, compression)
         
 
     def convert_from_CAMPARI_to_GMX(self, capChange=True):
+        """ Renames (and reorders) the ACE/NME caps for GROMACS. There is
+            no need to make the HIE/HID/HIP->HIS correction as GROMACS can
+            typically deal with one of these. The rules are the CAMPARI and
+            GMX tables in pdbnaming. Returns the number of residues 
+            changed.
+        """
 
-        # reorder ACE and NAC if needed
-
-
-        chains = self.pdbfile.chains
-
-        for chainID in chains:
-
-            if capChange:
-
-                if chains[chainID][0].res_name == "ACE":                            
-                    self.pdbfile.define_residue_order(chainID, 1, ["CH3", "1H","2H","3H","C", "O"])
-
-                    # rename ACE atoms...
-                    self.pdbfile.rename_atom(chainID, 1, "1H", "1HH3")
-                    self.pdbfile.rename_atom(chainID, 1, "2H", "2HH3")
-                    self.pdbfile.rename_atom(chainID, 1, "3H", "3HH3")
-
-
-                if chains[chainID][len(chains[chainID])-1].res_name == "NME":
-                
-                    finalRes = len(chains[chainID])
-                
-                    self.pdbfile.define_residue_order(chainID, finalRes, ["N", "HN", "CH3", "1H", "2H", "3H"])
-                    self.pdbfile.rename_residue(chainID, finalRes, "NAC")
-                
-                    self.pdbfile.rename_atom(chainID, finalRes, "HN", "H")
-                    self.pdbfile.rename_atom(chainID, finalRes, "1H", "1HH3")
-                    self.pdbfile.rename_atom(chainID, finalRes, "2H", "2HH3")
-                    self.pdbfile.rename_atom(chainID, finalRes, "3H", "3HH3")
-
-
-            # no need to make the HIE/HID/HIP->HIS correction as GROMACS can typically deal with one of these
-
-
-    def convert_from_GMX_to_CAMPARI(self, capChange=False):
-
-        # reorder ACE and NAC if needed
-        chains = self.pdbfile.chains
-        
-        for chainID in chains:
-            
+        with pdbprofile.stage("CAMPARI_to_GMX"):
+            return self.convert_naming("CAMPARI", "GMX", capChange)
 
-            ## So sometimes it seems like re-setting the CAP atom orders is important?
-            ## In any case, if this is desired you can set capChange to true, else just leave it
-            ## false...
-            ##
-            if capChange:
-                if chains[chainID][0].res_name == "ACE":            
-                    self.pdbfile.define_residue_order(chainID, 1, ["CH3", "C", "O", "1HH3", "2HH3", "3HH3"])
 
-                    # rename ACE atoms...
-                    self.pdbfile.rename_atom(chainID, 1, "1HH3", "1H")
-                    self.pdbfile.rename_atom(chainID, 1, "2HH3", "2H")
-                    self.pdbfile.rename_atom(chainID, 1, "3HH3", "3H")
+    def convert_from_GMX_to_CAMPARI(self, capChange=False, errors=None):
+        """ Renames each HIS to HIE, HID or HIP (CAMPARI expects the 
+            protonation state in the name) from where its hydrogens are.
+            A histidine in an odd state raises a CAMPARI_pdbException, or
+            if errors is a list its message is added there and the rest
+            are still renamed.
 
+            So sometimes it seems like re-setting the CAP atom orders is 
+            important? In any case, if this is desired you can set 
+            capChange to true, else just leave it false...
 
-                if chains[chainID][len(chains[chainID])-1].res_name == "NAC":
+            Returns the number of residues changed.
+        """
 
-                    finalRes = len(chains[chainID])
+        with pdbprofile.stage("GMX_to_CAMPARI"):
+            return self.convert_naming("GMX", "CAMPARI", capChange, errors)
 
-                    self.pdbfile.define_residue_order(chainID, finalRes, ["N", "CH3", "H", "1HH3", "2HH3", "3HH3"])
 
-                    # rename NAC to NME
-                    self.pdbfile.rename_residue(chainID, finalRes, "NME")
+    def convert_naming(self, source, target, capChange=True, errors=None):
+        """ Converts residue/atom naming between any two of the 
+            conventions in pdbnaming.FORCEFIELDS (CAMPARI, GMX, AMBER,
+            CHARMM) in one pass over the residues
 
-               
-                    self.pdbfile.rename_atom(chainID, finalRes, "H", "HN")
-                    self.pdbfile.rename_atom(chainID, finalRes, "1HH3", "1H")
-                    self.pdbfile.rename_atom(chainID, finalRes, "2HH3", "2H")
-                    self.pdbfile.rename_atom(chainID, finalRes, "3HH3", "3H")
+            # INPUT
+            source    :   String
+            target    :   String
+            capChange :   Bool - also convert the chain terminal caps
+            errors    :   List to collect odd protonation states in 
+                          (None raises on the first)
 
-                
-            chainlocal_residue_count=1
-            for res in chains[chainID]:
+            # OUTPUT
+            -         :   Number of residues changed
+        """
 
+        try:
+            return pdbnaming.convert(self.pdbfile, source, target, capChange, errors)
+        except pdbnaming.PDB_namingException, e:
+            raise CAMPARI_pdbException(str(e))
 
-                
 
-                ##----------------------------------------------------------------------
-                ## HISTADINE RENAMING
-                ##
-                # if you find a histadine CAMPARI expects HIE or HID
-                # figure out where the hydrogen is and deal accordingly
-                
-                if res.res_name == "HIS":
 
-                    # set initialization counts for histadine nitrogen 
-                    # protons
-                    HIE=0
-                    HID=0
+##-------------------------------------------------------##
+##                 Batch conversion                      ##
+##-------------------------------------------------------##
 
-                    for atom in res:
-                        if atom.atom_name == "HE1" or atom.atom_name == "HE2" :
-                            HIE=HIE+1
-                        if atom.atom_name == "HD1" or atom.atom_name == "HD2" :
-                            HID=HID+1
+# conversion direction -> (CAMPARI_pdb method, default capChange)
+CONVERSIONS = {"CAMPARI_to_GMX" : ("convert_from_CAMPARI_to_GMX", True),
+               "GMX_to_CAMPARI" : ("convert_from_GMX_to_CAMPARI", False)}
 
-                    if HIE == 2 and HID == 2:
-                        self.pdbfile.rename_residue(chainID, chainlocal_residue_count, "HIP")
-                    elif HIE == 2:
-                        self.pdbfile.rename_residue(chainID, chainlocal_residue_count, "HIE")
-                    elif HID == 2:
-                        self.pdbfile.rename_residue(chainID, chainlocal_residue_count, "HID")
-                    else:
-                        raise CAMPARI_pdbException("ERROR: Histadine residue " + str(res.res_id) + " has an odd protonation state...")        
-                ##----------------------------------------------------------------------
 
+def convert_file(inputfile, outputfile, direction, capChange=None):
+    """ Converts a single PDB file and writes the result to outputfile. 
+        The output is written to a temporary file next to outputfile and
+        moved into place, so a failed conversion never leaves a partial
+        (or apparently up to date) output behind.
 
-                # increment residue counter
-                chainlocal_residue_count=chainlocal_residue_count+1
-                            
+        # INPUT
+        inputfile   :   String
+        outputfile  :   String
+        direction   :   "CAMPARI_to_GMX" or "GMX_to_CAMPARI"
+        capChange   :   Bool (None uses the default for direction)
 
+        # OUTPUT
+        -           :   Number of atoms converted
+    """
+
+    (method, defaultCapChange) = CONVERSIONS[direction]
+    if capChange is None:
+        capChange = defaultCapChange
+
+    with pdbprofile.stage("convert_file"):
+        pdb = CAMPARI_pdb(inputfile)
+        getattr(pdb, method)(capChange=capChange)
+
+        # the temporary name hides the extension, so pass the compression
+        tmpfile = outputfile + ".tmp%i" % os.getpid()
+        try:
+            pdb.write_file(tmpfile, pdbio.compression_from_name(outputfile))
+            os.rename(tmpfile, outputfile)
+        finally:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
+    return len(pdb.pdbfile.atoms)
+
+
+# files picked up from an input directory
+INPUT_PATTERNS = ("*.pdb", "*.pdb.gz", "*.pdb.bz2", "*.pdb.xz")
+
+
+def find_input_files(inputs, pattern=INPUT_PATTERNS):
+    """ Expands a list of files, directories (every file matching pattern,
+        or any of a tuple of patterns, in the directory) and glob patterns
+        into a sorted list of files with no duplicates.
+    """
+
+    if isinstance(pattern, basestring):
+        pattern = (pattern,)
+
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for i in pattern:
+                found.extend(glob.glob(os.path.join(item, i)))
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            found.extend(glob.glob(item))
+
+    return sorted(set(os.path.abspath(i) for i in found if os.path.isfile(i)))
+
+
+def _up_to_date(inputfile, outputfile):
+    return os.path.exists(outputfile) and os.path.getmtime(outputfile) >= os.path.getmtime(inputfile)
+
+
+def _convert_job(job):
+    """ Process pool worker - converts one file and reports the outcome 
+        rather than raising, so one bad file never aborts the batch
+    """
+
+    (inputfile, outputfile, direction, capChange) = job
+
+    start = time.time()
+    try:
+        n_atoms = convert_file(inputfile, outputfile, direction, capChange)
+    except Exception, e:
+        return (inputfile, outputfile, "failed", "%s: %s" % (e.__class__.__name__, e), 0, time.time() - start)
+
+    return (inputfile, outputfile, "converted", "", n_atoms, time.time() - start)
+
+
+def batch_convert(inputs, outputdir, direction, workers=None, capChange=None, force=False, verbose=True):
+    """ Converts every PDB file found in inputs (files, directories or glob
+        patterns - see find_input_files) with a pool of worker processes,
+        writing each result to outputdir under the same file name as it 
+        is finished. Files whose output already exists and is newer than 
+        the input are skipped unless force is set. A file which fails to 
+        convert (e.g. a CAMPARI_pdbException for an odd histidine) is 
+        reported and the rest of the batch carries on. Two inputs with 
+        the same file name (from different directories) would overwrite
+        each other's output, so they raise a CAMPARI_pdbException before
+        anything is converted.
+
+        # INPUT
+        inputs      :   List of strings
+        outputdir   :   String (created if needed)
+        direction   :   "CAMPARI_to_GMX" or "GMX_to_CAMPARI"
+        workers     :   Number of worker processes (None = one per CPU)
+        capChange   :   Bool (None uses the default for direction)
+        force       :   Bool - convert even if the output is up to date
+        verbose     :   Bool - print per-file results and a summary
+
+        # OUTPUT
+        -           :   List of (inputfile, outputfile, status, message, 
+                        n_atoms, seconds) tuples, one per input file. 
+                        status is "converted", "skipped" or "failed"
+    """
+
+    if direction not in CONVERSIONS:
+        raise CAMPARI_pdbException("Unknown conversion " + str(direction) + " - must be one of " + ", ".join(sorted(CONVERSIONS)))
+
+    files = []
+    written_from = {}
+    for inputfile in find_input_files(inputs):
+        outputfile = os.path.join(outputdir, os.path.basename(inputfile))
+        if outputfile in written_from:
+            raise CAMPARI_pdbException("Both " + written_from[outputfile] + " and " + inputfile + " would be written to " + outputfile)
+        written_from[outputfile] = inputfile
+        files.append((inputfile, outputfile))
+
+    if not os.path.isdir(outputdir):
+        os.makedirs(outputdir)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    results = []
+    jobs = []
+    for (inputfile, outputfile) in files:
+        if not force and _up_to_date(inputfile, outputfile):
+            results.append((inputfile, outputfile, "skipped", "up to date", 0, 0.0))
+        else:
+            jobs.append((inputfile, outputfile, direction, capChange))
+
+    start = time.time()
+
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        try:
+            for result in pool.imap_unordered(_convert_job, jobs):
+                results.append(result)
+                if verbose:
+                    _report(result)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    else:
+        for job in jobs:
+            result = _convert_job(job)
+            results.append(result)
+            if verbose:
+                _report(result)
+
+    if verbose:
+        _summarize(results, time.time() - start)
+
+    return results
+
+
+def _report(result):
+    (inputfile, outputfile, status, message, n_atoms, seconds) = result
+
+    if status == "failed":
+        print "FAILED    " + inputfile + " - " + message
+    else:
+        print "converted " + inputfile + " -> " + outputfile + " (%i atoms, %.3f s)" % (n_atoms, seconds)
+
+
+def _summarize(results, elapsed):
+    converted = [i for i in results if i[2] == "converted"]
+    failed    = [i for i in results if i[2] == "failed"]
+    skipped   = [i for i in results if i[2] == "skipped"]
+
+    n_atoms = sum(i[4] for i in converted)
+    rate = 1.0 / max(elapsed, 1e-9)
+
+    print "%i converted, %i skipped (up to date), %i failed" % (len(converted), len(skipped), len(failed))
+    print "%i atoms in %.2f s - %.1f files/s, %.0f atoms/s" % (n_atoms, elapsed, len(converted) * rate, n_atoms * rate)
+
+    for i in failed:
+        print "  failed: " + i[0] + " - " + i[3]
+
+
+def main(argv=None):
+    """ Command line entry point - see --help """
+
+    parser = argparse.ArgumentParser(description="Batch convert PDB files between CAMPARI and GROMACS naming conventions")
+    parser.add_argument("direction", choices=sorted(CONVERSIONS), help="conversion to run")
+    parser.add_argument("inputs", nargs="+", help="PDB files, directories or glob patterns")
+    parser.add_argument("-o", "--outputdir", required=True, help="directory the converted files are written to")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--capchange", dest="capChange", action="store_true", default=None, help="reorder/rename ACE and NME/NAC caps")
+    parser.add_argument("--no-capchange", dest="capChange", action="store_false", help="leave ACE and NME/NAC caps as they are")
+    parser.add_argument("-f", "--force", action="store_true", help="convert files even if the output is up to date")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only report failures")
+
+    args = parser.parse_args(argv)
+
+    try:
+        results = batch_convert(args.inputs, args.outputdir, args.direction, workers=args.workers, 
+                                capChange=args.capChange, force=args.force, verbose=not args.quiet)
+    except CAMPARI_pdbException, e:
+        parser.error(str(e))
+
+    failed = [i for i in results if i[2] == "failed"]
+    if args.quiet:
+        for i in failed:
+            print "FAILED    " + i[0] + " - " + i[3]
+
+    return 1 if len(failed) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+# On-disk cache of parsed PDB structures
+#
+#
+#
+#
+
+import cPickle
+import hashlib
+import os
+import struct
+
+import numpy as np
+
+import PDBParser
+
+
+##-------------------------------------------------------##
+##                 PDB_cacheException                    ##
+##-------------------------------------------------------##
+
+class PDB_cacheException(Exception):
+        """ Generic exception from PDB_cache errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                      PDB_cache                        ##
+##-------------------------------------------------------##
+
+class PDB_cache(object):
+    """ Opt-in cache of parsed structures, so a PDB file which is opened
+        again and again only pays for the text parse once.
+
+        Each source file has one entry file in cache_dir holding the atom
+        table columns as raw arrays (each aligned so it can be memory
+        mapped), the residue/chain boundaries, the header and the footer,
+        and the source lines with their row fingerprints (see
+        PDBParser.PDB_atom_table.attach_source) - so a structure loaded
+        from the cache writes unedited atoms back exactly as they were
+        read, as a freshly parsed one does.
+
+        An entry records the path, size, modification time and content
+        hash (SHA-1) of the file it was made from. An entry is used if the
+        size matches and either the modification time or the content
+        hash matches (so touching a file does not throw its entry away -
+        the entry takes the new modification time, so the file is only
+        hashed again after its next change).
+        With verify_content=True the content hash is always checked.
+        Anything else is a miss, and the file is parsed and the entry
+        replaced.
+
+        The cache directory is kept under max_bytes by deleting the least
+        recently used entries (entry modification times are bumped on
+        every hit).
+    """
+
+    MAGIC = "PDBCACHE2\n"
+    ALIGNMENT = 64
+
+    def __init__(self, cache_dir=None, max_bytes=1<<30, mmap=True, verify_content=False):
+        """
+            # INPUT
+            cache_dir      :   Directory holding the entries (default
+                               $PDBPARSER_CACHE_DIR or ~/.cache/pdbparser)
+            max_bytes      :   Size cap for the whole cache directory
+            mmap           :   Memory map the arrays of an entry (copy on
+                               write, so edits never reach the cache)
+                               rather than reading them in
+            verify_content :   Always check the content hash on a hit
+        """
+
+        if cache_dir is None:
+            cache_dir = os.environ.get("PDBPARSER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pdbparser"))
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.verify_content = verify_content
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+
+    def load(self, filename):
+        """ Returns the structure in filename as a PDB_file - from the
+            cache if there is an up to date entry, otherwise by parsing
+            the file (and adding it to the cache)
+
+            # INPUT
+            filename :   String
+
+            # OUTPUT
+            -        :   PDB_file
+        """
+
+        pdb = self.lookup(filename)
+
+        if pdb is None:
+            pdb = PDBParser.PDB_file(filename)
+            self.store(filename, pdb)
+
+        return pdb
+
+    def lookup(self, filename):
+        """ Returns the cached PDB_file for filename, or None if there is
+            no up to date entry
+        """
+
+        entry = self.entry_path(filename)
+        if not os.path.exists(entry):
+            return None
+
+        try:
+            (meta, data_offset) = self.__read_meta(entry)
+        except (IOError, EOFError, PDB_cacheException, cPickle.UnpicklingError):
+            return None
+
+        stat = os.stat(filename)
+        if meta["path"] != os.path.abspath(filename) or meta["size"] != stat.st_size:
+            return None
+
+        if self.verify_content or meta["mtime"] != stat.st_mtime:
+            if meta["hash"] != _content_hash(filename):
+                return None
+
+        pdb = self.__read_entry(entry, meta, data_offset)
+
+        if meta["mtime"] != stat.st_mtime:
+            meta["mtime"] = stat.st_mtime
+            if not self.__rewrite_meta(entry, meta, data_offset):
+                self.store(filename, pdb)
+
+        # mark as recently used
+        os.utime(entry, None)
+
+        return pdb
+
+    def store(self, filename, pdb):
+        """ Writes the entry for filename (parsed into pdb). Entries are
+            written to a temporary file and renamed into place so readers
+            never see a partial entry.
+        """
+
+        stat = os.stat(filename)
+        table = pdb.table
+
+        arrays = [(name, getattr(table, name)) for name in table.column_names()]
+        arrays.append(("residue_offsets", table.residue_offsets))
+        arrays.append(("chain_offsets", table.chain_offsets))
+        if table.source_rows is not None:
+            arrays.append(("source_rows", table.source_rows))
+        if table.source_text is not None:
+            arrays.append(("source_text", np.frombuffer(table.source_text, dtype=np.uint8)))
+            arrays.append(("source_starts", table.source_starts))
+            arrays.append(("source_stops", table.source_stops))
+            arrays.append(("source_fingerprint", table.source_fingerprint))
+
+        # lay the arrays out one after another, each aligned
+        columns = []
+        offset = 0
+        for (name, array) in arrays:
+            array = np.ascontiguousarray(array)
+            columns.append((name, array.dtype.str, array.shape, offset))
+            offset = _align(offset + array.nbytes, self.ALIGNMENT)
+
+        meta = {"path"        : os.path.abspath(filename),
+                "size"        : stat.st_size,
+                "mtime"       : stat.st_mtime,
+                "hash"        : _content_hash(filename),
+                "header"      : pdb.header,
+                "footer"      : pdb.footer,
+                "chain_names" : table.chain_names,
+                "columns"     : columns}
+
+        entry = self.entry_path(filename)
+        tmpfile = entry + ".tmp%i" % os.getpid()
+
+        packed_meta = cPickle.dumps(meta, 2)
+        data_offset = _align(len(self.MAGIC) + 8 + len(packed_meta), self.ALIGNMENT)
+
+        try:
+            with open(tmpfile, "wb") as f:
+                f.write(self.MAGIC)
+                f.write(struct.pack("<Q", len(packed_meta)))
+                f.write(packed_meta)
+
+                for ((name, array), column) in zip(arrays, columns):
+                    f.seek(data_offset + column[3])
+                    f.write(np.ascontiguousarray(array).tobytes())
+
+            os.rename(tmpfile, entry)
+        finally:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
+        self.evict()
+
+    def evict(self):
+        """ Deletes least recently used entries until the cache is no
+            larger than max_bytes
+        """
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pdbc"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(i[1] for i in entries)
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total = total - size
+
+    def clear(self):
+        """ Deletes every entry """
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pdbc"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def entry_path(self, filename):
+        """ The entry file used for filename """
+
+        key = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+        return os.path.join(self.cache_dir, key + ".pdbc")
+
+    def __str__(self):
+        return "<PDB_cache " + self.cache_dir + ">"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+    def __read_meta(self, entry):
+        with open(entry, "rb") as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise PDB_cacheException("Not a cache entry: " + entry)
+
+            (length,) = struct.unpack("<Q", f.read(8))
+            meta = cPickle.loads(f.read(length))
+
+        return (meta, _align(len(self.MAGIC) + 8 + length, self.ALIGNMENT))
+
+    def __rewrite_meta(self, entry, meta, data_offset):
+        """ Writes meta over the entry's own in place, if it fits in front
+            of the arrays (as it does when only the modification time has
+            changed). Returns False if it does not.
+        """
+
+        space = data_offset - len(self.MAGIC) - 8
+        packed_meta = cPickle.dumps(meta, 2)
+        if len(packed_meta) > space:
+            return False
+
+        # padded out to the arrays - unpickling ignores the bytes after
+        # the end of the pickled object
+        with open(entry, "r+b") as f:
+            f.seek(len(self.MAGIC))
+            f.write(struct.pack("<Q", space))
+            f.write(packed_meta.ljust(space, "\0"))
+
+        return True
+
+    def __read_entry(self, entry, meta, data_offset):
+        if self.mmap:
+            size = os.path.getsize(entry) - data_offset
+            if size > 0:
+                data = np.memmap(entry, dtype=np.uint8, mode="c", offset=data_offset, shape=(size,))
+            else:
+                data = np.zeros(0, dtype=np.uint8)
+        else:
+            with open(entry, "rb") as f:
+                f.seek(data_offset)
+                data = np.frombuffer(bytearray(f.read()), dtype=np.uint8)
+
+        table = PDBParser.PDB_atom_table(0)
+
+        for (name, dtype, shape, offset) in meta["columns"]:
+            dtype = np.dtype(dtype)
+            n_bytes = int(np.prod(shape)) * dtype.itemsize
+            array = np.ndarray(shape, dtype=dtype, buffer=data, offset=offset) if n_bytes > 0 else np.zeros(shape, dtype=dtype)
+            setattr(table, name, array)
+
+        table.chain_names = list(meta["chain_names"])
+
+        if table.source_text is not None:
+            table.attach_source(table.source_text.tostring(), table.source_starts, table.source_stops, table.source_fingerprint)
+
+        return PDBParser.PDB_file.from_table(table, list(meta["header"]), list(meta["footer"]))
+
+##-------------------END-OF-CLASS------------------------##
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _content_hash(filename, block_size=1<<20):
+    sha = hashlib.sha1()
+    with open(filename, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+_DEFAULT_CACHE = None
+
+def load_pdb(filename, cache_dir=None):
+    """ Opens filename as a PDB_file through a PDB_cache (the default
+        cache unless cache_dir is given)
+    """
+
+    global _DEFAULT_CACHE
+
+    if cache_dir is not None:
+        return PDB_cache(cache_dir).load(filename)
+
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = PDB_cache()
+
+    return _DEFAULT_CACHE.load(filename)
@@ -0,0 +1,380 @@
+# Vectorized backbone and side chain dihedral angles of PDB structures
+#
+#
+#
+#
+
+from collections import OrderedDict
+
+import numpy as np
+
+import PDBParser
+import pdbnaming
+
+
+##-------------------------------------------------------##
+##               PDB_dihedralException                   ##
+##-------------------------------------------------------##
+
+class PDB_dihedralException(Exception):
+        """ Generic exception from dihedral angle errors """
+        pass
+
+##-------------------------------------------------------##
+
+
+
+BACKBONE_ANGLES = ("phi", "psi", "omega")
+CHI_ANGLES = ("chi1", "chi2", "chi3", "chi4")
+ANGLES = BACKBONE_ANGLES + CHI_ANGLES
+
+# backbone angle -> (residue offset, backbone atom) of its four atoms,
+# for the residue the angle belongs to. omega is the peptide bond before
+# the residue (CA(i-1)-C(i-1)-N(i)-CA(i)), as used by CAMPARI
+BACKBONE_ATOMS = {"phi"   : ((-1, "C"),  (0, "N"),  (0, "CA"), (0, "C")),
+                  "psi"   : ((0, "N"),   (0, "CA"), (0, "C"),  (1, "N")),
+                  "omega" : ((-1, "CA"), (-1, "C"), (0, "N"),  (0, "CA"))}
+
+# names of the backbone atoms, and of their stand-ins in the caps (the
+# methyl carbon takes the place of CA). A cap has no atom for the other
+# backbone positions
+BACKBONE_NAMES = {"N" : ("N",), "CA" : ("CA",), "C" : ("C",)}
+CAP_NAMES = {"N" : {"CA" : ("CH3",), "C" : ("C",)},
+             "C" : {"N" : ("N",), "CA" : ("CH3", "CAT")}}
+
+# residue -> the four atoms of each of its chi angles. A tuple of names
+# gives alternatives (first found is used)
+CHI_ATOMS = {
+    "ARG" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD"), ("CB", "CG", "CD", "NE"), ("CG", "CD", "NE", "CZ")),
+    "ASN" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "OD1")),
+    "ASP" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "OD1")),
+    "CYS" : (("N", "CA", "CB", "SG"),),
+    "GLN" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD"), ("CB", "CG", "CD", "OE1")),
+    "GLU" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD"), ("CB", "CG", "CD", "OE1")),
+    "HIS" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "ND1")),
+    "ILE" : (("N", "CA", "CB", "CG1"), ("CA", "CB", "CG1", ("CD1", "CD"))),
+    "LEU" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD1")),
+    "LYS" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD"), ("CB", "CG", "CD", "CE"), ("CG", "CD", "CE", "NZ")),
+    "MET" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "SD"), ("CB", "CG", "SD", "CE")),
+    "PHE" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD1")),
+    "PRO" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD")),
+    "SER" : (("N", "CA", "CB", "OG"),),
+    "THR" : (("N", "CA", "CB", "OG1"),),
+    "TRP" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD1")),
+    "TYR" : (("N", "CA", "CB", "CG"), ("CA", "CB", "CG", "CD1")),
+    "VAL" : (("N", "CA", "CB", "CG1"),),
+    }
+
+# other names of the residues in CHI_ATOMS (protonation states)
+CHI_ALIASES = {"HID" : "HIS", "HIE" : "HIS", "HIP" : "HIS",
+               "CYX" : "CYS", "CYM" : "CYS",
+               "ASH" : "ASP", "GLH" : "GLU", "LYN" : "LYS"}
+
+# longest peptide bond (Angstroms) for consecutive residues to count as
+# linked - anything longer is a chain break
+BOND_CUTOFF = 2.0
+
+
+def _cap_names():
+    """ Residue name -> terminus ("N" or "C") of every cap name used by
+        the forcefields in pdbnaming
+    """
+
+    caps = {}
+    for (cap, terminus) in pdbnaming.TERMINI.iteritems():
+        caps[cap] = terminus
+        for forcefield in pdbnaming.FORCEFIELDS.itervalues():
+            caps[forcefield["residues"].get(cap, cap)] = terminus
+
+    return caps
+
+
+def _chi_residue_names():
+    """ Residue name -> key of CHI_ATOMS, including the forcefield names
+        of the protonation states in pdbnaming
+    """
+
+    names = dict((i, i) for i in CHI_ATOMS)
+    names.update(CHI_ALIASES)
+
+    for forcefield in pdbnaming.FORCEFIELDS.itervalues():
+        for (canonical, name) in forcefield["residues"].iteritems():
+            if canonical in names:
+                names[name] = names[canonical]
+
+    return names
+
+
+def dihedral_angles(coords, quadruplets):
+    """ Dihedral angles (degrees, -180 to 180, IUPAC sign convention)
+        of many sets of four atoms at once, in one frame or in many
+
+        # INPUT
+        coords      :   (N,3) or (F,N,3) float array
+        quadruplets :   (M,4) int array of atom rows. Rows holding a
+                        negative index give NaN
+
+        # OUTPUT
+        -           :   (M,) or (F,M) float array
+    """
+
+    coords = np.asarray(coords, dtype=np.float64)
+    quadruplets = np.asarray(quadruplets, dtype=np.int64).reshape(-1, 4)
+
+    valid = np.flatnonzero((quadruplets >= 0).all(axis=1))
+    rows = quadruplets[valid]
+
+    p = [coords[..., rows[:, i], :] for i in xrange(4)]
+    b0 = p[1] - p[0]
+    b1 = p[2] - p[1]
+    b2 = p[3] - p[2]
+
+    n1 = np.cross(b0, b1)
+    n2 = np.cross(b1, b2)
+
+    x = np.einsum("...i,...i->...", n1, n2)
+    y = np.sqrt(np.einsum("...i,...i->...", b1, b1)) * np.einsum("...i,...i->...", b0, n2)
+
+    angles = np.empty(coords.shape[:-2] + (len(quadruplets),), dtype=np.float64)
+    angles.fill(np.nan)
+    angles[..., valid] = np.degrees(np.arctan2(y, x))
+
+    return angles
+
+
+##-------------------------------------------------------##
+##                 PDB_backbone_index                    ##
+##-------------------------------------------------------##
+
+class PDB_backbone_index(object):
+    """ Where the backbone (N, CA, C) and side chain torsion atoms of each
+        residue of a chain are, so the dihedral angles of the whole chain
+        (in one frame or many) are a handful of array operations.
+
+        Residue k of the index is the residue with chain local ID k+1.
+        Atoms are table rows (-1 where a residue has no such atom).
+        ACE/NME caps (and their forcefield names, e.g. NAC or CT3) take
+        part in the neighbouring angles through their methyl carbon and
+        their C or N, so the first and last real residues get phi and psi.
+        Two residues are linked when the C of the first and the N of the
+        second are less than bond_cutoff apart in the structure the index
+        was built from (bond_cutoff=None links every consecutive pair
+        which has the atoms), and angles across an unlinked pair (a chain
+        break) are NaN.
+
+        res_names : residue names
+        local_ids : chain local IDs (1 ... n_residues)
+        atoms     : backbone atom ("N", "CA", "C") -> rows
+        chi       : chi angle name -> (n_residues,4) rows
+        linked    : True where residue k is bonded to residue k-1
+        first_row : the first row of the chain in its table
+    """
+
+    def __init__(self, chain, bond_cutoff=BOND_CUTOFF):
+        """
+            # INPUT
+            chain       :   PDB_chain
+            bond_cutoff :   Float (Angstroms) or None
+        """
+
+        table = chain.table
+        (first_res, last_res) = table.get_chain_range(chain._index)
+        offsets = table.residue_offsets[first_res:last_res+1]
+
+        self.table = table
+        self.chain_name = chain.chain_name
+        self.first_row = int(offsets[0])
+
+        n_residues = last_res - first_res
+        self.res_names = table.res_name[offsets[:-1]]
+        self.local_ids = np.arange(1, n_residues + 1)
+
+        names = table.atom_name[offsets[0]:offsets[-1]]
+        residue_of = np.repeat(np.arange(n_residues), np.diff(offsets))
+
+        # first row of each residue holding each atom name, looked up once
+        first_rows = {}
+        def first_row(candidates):
+            if isinstance(candidates, basestring):
+                candidates = (candidates,)
+
+            found = np.empty(n_residues, dtype=np.int64)
+            found.fill(-1)
+            for name in candidates:
+                if name not in first_rows:
+                    hits = np.flatnonzero(names == name)
+                    rows = np.empty(n_residues, dtype=np.int64)
+                    rows.fill(-1)
+                    rows[residue_of[hits][::-1]] = hits[::-1] + self.first_row
+                    first_rows[name] = rows
+                found = np.where(found < 0, first_rows[name], found)
+
+            return found
+
+        caps = _cap_names()
+        terminus = np.array([caps.get(str(i), "") for i in self.res_names], dtype="S1")
+
+        self.atoms = OrderedDict()
+        for (atom, candidates) in BACKBONE_NAMES.iteritems():
+            rows = np.where(terminus == "", first_row(candidates), -1)
+            for (end, cap_names) in CAP_NAMES.iteritems():
+                if atom in cap_names:
+                    rows = np.where(terminus == end, first_row(cap_names[atom]), rows)
+            self.atoms[atom] = rows
+
+        chi_names = _chi_residue_names()
+        residue_keys = np.array([chi_names.get(str(i), "") for i in self.res_names], dtype="S3")
+
+        self.chi = OrderedDict()
+        for (number, angle) in enumerate(CHI_ANGLES):
+            rows = np.empty((n_residues, 4), dtype=np.int64)
+            rows.fill(-1)
+            for (key, definitions) in CHI_ATOMS.iteritems():
+                if len(definitions) <= number:
+                    continue
+                of_key = residue_keys == key
+                if of_key.any():
+                    rows[of_key] = np.column_stack([first_row(i) for i in definitions[number]])[of_key]
+            rows[(rows < 0).any(axis=1)] = -1
+            self.chi[angle] = rows
+
+        (C, N) = (self.atoms["C"], self.atoms["N"])
+        self.linked = np.zeros(n_residues, dtype=bool)
+        self.linked[1:] = (C[:-1] >= 0) & (N[1:] >= 0)
+
+        if bond_cutoff is not None and n_residues > 1:
+            pairs = np.flatnonzero(self.linked)
+            bonds = table.coords[C[pairs - 1]] - table.coords[N[pairs]]
+            self.linked[pairs] = np.einsum("ij,ij->i", bonds, bonds) < bond_cutoff ** 2
+
+    def quadruplets(self, angle):
+        """ The four atom rows of angle for every residue - (n_residues,4)
+            int array, a row of -1 where the angle is undefined
+        """
+
+        if angle in self.chi:
+            return self.chi[angle]
+
+        if angle not in BACKBONE_ATOMS:
+            raise PDB_dihedralException("Unknown dihedral angle " + str(angle) + " (choose from " + ", ".join(ANGLES) + ")")
+
+        n_residues = len(self.res_names)
+        rows = np.empty((n_residues, 4), dtype=np.int64)
+        rows.fill(-1)
+
+        valid = np.ones(n_residues, dtype=bool)
+        for (position, (shift, atom)) in enumerate(BACKBONE_ATOMS[angle]):
+            shifted = np.empty(n_residues, dtype=np.int64)
+            shifted.fill(-1)
+            if shift < 0:
+                shifted[-shift:] = self.atoms[atom][:shift]
+            elif shift > 0:
+                shifted[:-shift] = self.atoms[atom][shift:]
+            else:
+                shifted[:] = self.atoms[atom]
+            rows[:, position] = shifted
+
+        # the angle crosses the bond to the previous or next residue
+        if any([shift < 0 for (shift, atom) in BACKBONE_ATOMS[angle]]):
+            valid &= self.linked
+        if any([shift > 0 for (shift, atom) in BACKBONE_ATOMS[angle]]):
+            valid[:-1] &= self.linked[1:]
+            valid[-1:] = False
+
+        # a residue missing any of the atoms (e.g. the cap on the far side
+        # of the angle) does not have it either
+        valid &= (rows >= 0).all(axis=1)
+        rows[~valid] = -1
+
+        return rows
+
+    def dihedrals(self, angles=ANGLES, frames=None, base_row=None):
+        """ Dihedral angles of every residue (degrees, NaN where a residue
+            does not have the angle), arrays aligned to local_ids
+
+            # INPUT
+            angles   :   Names from ANGLES
+            frames   :   Optional (N,3) coordinates or (F,N,3) frames of
+                         the atoms of the table (by default the table's
+                         own coordinates)
+            base_row :   Table row of the first atom in frames (0 - pass
+                         first_row for frames of just this chain)
+
+            # OUTPUT
+            -        :   OrderedDict angle -> (n_residues,) float array,
+                         or (F,n_residues) for frames
+        """
+
+        if isinstance(angles, basestring):
+            angles = (angles,)
+
+        if frames is None:
+            coords = self.table.coords
+            base_row = 0
+        else:
+            coords = np.asarray(frames, dtype=np.float64)
+            if coords.ndim not in (2, 3) or coords.shape[-1] != 3:
+                raise PDB_dihedralException("Frames must be an (N,3) or (F,N,3) array (got shape " + str(coords.shape) + ")")
+            if base_row is None:
+                base_row = 0
+
+        # every angle of every residue in one pass over the frames
+        rows = np.concatenate([self.quadruplets(i) for i in angles])
+        rows = np.where(rows >= 0, rows - base_row, -1)
+
+        if (rows >= coords.shape[-2]).any():
+            raise PDB_dihedralException("Frames of " + str(coords.shape[-2]) + " atoms do not hold every atom of chain " + str(self.chain_name))
+
+        values = dihedral_angles(coords, rows)
+
+        n_residues = len(self.res_names)
+        results = OrderedDict()
+        for (number, angle) in enumerate(angles):
+            results[angle] = values[..., number*n_residues:(number+1)*n_residues]
+
+        return results
+
+    def __len__(self):
+        return len(self.res_names)
+
+    def __str__(self):
+        return "<PDB_backbone_index of chain " + str(self.chain_name) + " - " + str(len(self)) + " residues, " + str(int((~self.linked[1:]).sum())) + " breaks>"
+
+    def __repr__(self):
+        return self.__str__()
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+def dihedrals(structure, angles=ANGLES, frames=None, bond_cutoff=BOND_CUTOFF):
+    """ Dihedral angles of every residue of a PDB_file (per chain) or of
+        a PDB_chain, in one frame or across many
+
+        # INPUT
+        structure   :   PDB_file or PDB_chain
+        angles      :   Names from ANGLES ("phi", "psi", "omega", "chi1"
+                        ... "chi4")
+        frames      :   Optional (N,3) coordinates or (F,N,3) frames of
+                        the atoms of structure, in the order of its rows
+                        (as table.coords, pdbtrajectory frames, ...)
+        bond_cutoff :   See PDB_backbone_index
+
+        # OUTPUT
+        -           :   For a PDB_chain, OrderedDict angle -> array of
+                        one value per residue (aligned to chain local
+                        IDs), or (F,n_residues) for frames. For a
+                        PDB_file, OrderedDict chain ID -> that dictionary
+    """
+
+    if isinstance(structure, PDBParser.PDB_chain):
+        index = PDB_backbone_index(structure, bond_cutoff)
+        return index.dihedrals(angles, frames, index.first_row)
+
+    if isinstance(structure, PDBParser.PDB_file):
+        results = OrderedDict()
+        for (name, chain) in structure.chains.iteritems():
+            results[name] = PDB_backbone_index(chain, bond_cutoff).dihedrals(angles, frames, 0)
+        return results
+
+    raise PDB_dihedralException("Dihedrals need a PDB_file or PDB_chain, not " + str(type(structure)))
@@ -0,0 +1,473 @@
+# Vectorized geometric analysis of PDB structures and ensembles
+#
+#
+#
+#
+
+import numpy as np
+
+import PDBParser
+import pdbselect
+
+
+##-------------------------------------------------------##
+##               PDB_geometryException                   ##
+##-------------------------------------------------------##
+
+class PDB_geometryException(Exception):
+        """ Generic exception from geometric analysis errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+# atomic masses (Daltons) by upper case element symbol
+ATOMIC_MASSES = {"H"  :   1.008,
+                 "D"  :   2.014,
+                 "C"  :  12.011,
+                 "N"  :  14.007,
+                 "O"  :  15.999,
+                 "F"  :  18.998,
+                 "NA" :  22.990,
+                 "MG" :  24.305,
+                 "P"  :  30.974,
+                 "S"  :  32.06,
+                 "CL" :  35.45,
+                 "K"  :  39.098,
+                 "CA" :  40.078,
+                 "MN" :  54.938,
+                 "FE" :  55.845,
+                 "CO" :  58.933,
+                 "NI" :  58.693,
+                 "CU" :  63.546,
+                 "ZN" :  65.38,
+                 "SE" :  78.971,
+                 "BR" :  79.904,
+                 "I"  : 126.904}
+
+# frames handled per vectorized step of the ensemble functions
+BLOCK_SIZE = 1024
+
+
+def atom_rows(source):
+    """ The table and rows a structure's atoms occupy
+
+        # INPUT
+        source :   PDB_file, PDB_chain, PDB_residue, PDB_atom_selection
+                   or PDB_atom_table
+
+        # OUTPUT
+        -      :   (PDB_atom_table, int array of rows), or (None, None)
+                   for anything else
+    """
+
+    if isinstance(source, PDBParser.PDB_file):
+        return (source.table, np.arange(len(source.table)))
+
+    if isinstance(source, PDBParser.PDB_chain):
+        (first_res, last_res) = source.table.get_chain_range(source._index)
+        return (source.table, np.arange(source.table.residue_offsets[first_res], source.table.residue_offsets[last_res]))
+
+    if isinstance(source, PDBParser.PDB_residue):
+        (start, stop) = source._table.get_residue_range(source._index)
+        return (source._table, np.arange(start, stop))
+
+    if isinstance(source, pdbselect.PDB_atom_selection):
+        return (source.table, source.indices)
+
+    if isinstance(source, PDBParser.PDB_atom_table):
+        return (source, np.arange(len(source)))
+
+    return (None, None)
+
+
+def coordinates(source):
+    """ The coordinates of a structure (see atom_rows) as an (N,3) float
+        array, or source itself as a float array of (N,3) coordinates or
+        (F,N,3) frames
+    """
+
+    (table, rows) = atom_rows(source)
+    if table is not None:
+        return table.coords[rows]
+
+    coords = np.asarray(source, dtype=np.float64)
+    if coords.ndim not in (2, 3) or coords.shape[-1] != 3:
+        raise PDB_geometryException("Coordinates must be an (N,3) or (F,N,3) array (got shape " + str(coords.shape) + ")")
+
+    return coords
+
+
+def atom_masses(source):
+    """ Mass of each atom of a structure, from its element - or, where
+        the element column is blank, from the first letter of its atom
+        name (so CA is a carbon)
+
+        # INPUT
+        source :   PDB_file, PDB_chain, PDB_residue, PDB_atom_selection
+                   or PDB_atom_table
+
+        # OUTPUT
+        -      :   (N,) float array
+    """
+
+    (table, rows) = atom_rows(source)
+    if table is None:
+        raise PDB_geometryException("Masses need a structure with elements or atom names, not a coordinate array")
+
+    (symbols, inverse) = np.unique(table.element[rows], return_inverse=True)
+    (names, name_inverse) = np.unique(table.atom_name[rows], return_inverse=True)
+
+    masses = np.empty(len(symbols), dtype=np.float64)
+    for (i, symbol) in enumerate(symbols):
+        masses[i] = ATOMIC_MASSES.get(symbol.strip().upper(), np.nan)
+
+    # blank elements from the atom names (computed for every name but
+    # only used where the element is missing)
+    name_masses = np.empty(len(names), dtype=np.float64)
+    for (i, name) in enumerate(names):
+        name_masses[i] = ATOMIC_MASSES.get(name.lstrip("0123456789 ")[:1].upper(), np.nan)
+
+    result = masses[inverse]
+    blank = np.array([len(i.strip()) == 0 for i in symbols], dtype=bool)[inverse]
+    result[blank] = name_masses[name_inverse[blank]]
+
+    if np.isnan(result).any():
+        row = rows[np.flatnonzero(np.isnan(result))[0]]
+        raise PDB_geometryException("No mass for atom " + str(table.atom_name[row]) + " (element '" + str(table.element[row]) + "') of residue " +
+                                    str(table.res_name[row]) + " " + str(table.res_id[row]))
+
+    return result
+
+
+def _weights(source, n_atoms, mass_weighted, weights):
+    """ Per-atom weights normalised to sum to 1 """
+
+    if weights is None and mass_weighted:
+        weights = atom_masses(source)
+
+    if weights is None:
+        return np.ones(n_atoms, dtype=np.float64) / max(n_atoms, 1)
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (n_atoms,):
+        raise PDB_geometryException("Need one weight per atom (" + str(n_atoms) + "), got shape " + str(weights.shape))
+
+    return weights / weights.sum()
+
+
+def centroid(source, mass_weighted=False, weights=None):
+    """ Centre of geometry (or of mass)
+
+        # INPUT
+        source        :   Structure (see atom_rows), (N,3) coordinates or
+                          (F,N,3) frames
+        mass_weighted :   Bool - centre of mass (structures only)
+        weights       :   Optional (N,) per-atom weights
+
+        # OUTPUT
+        -             :   (3,) array, or (F,3) for frames
+    """
+
+    coords = coordinates(source)
+    if coords.shape[-2] == 0:
+        raise PDB_geometryException("The centroid of no atoms is undefined")
+
+    w = _weights(source, coords.shape[-2], mass_weighted, weights)
+
+    return np.dot(w, coords) if coords.ndim == 2 else np.einsum("n,fni->fi", w, coords)
+
+
+def radius_of_gyration(source, mass_weighted=False, weights=None):
+    """ Radius of gyration about the centroid (see centroid for the
+        arguments)
+
+        # OUTPUT
+        - :   Float, or (F,) array for frames
+    """
+
+    coords = coordinates(source)
+    if coords.shape[-2] == 0:
+        raise PDB_geometryException("The radius of gyration of no atoms is undefined")
+
+    w = _weights(source, coords.shape[-2], mass_weighted, weights)
+    centre = centroid(coords, weights=w)
+    offsets = coords - centre[..., np.newaxis, :]
+
+    values = np.sqrt(np.einsum("n,...ni,...ni->...", w, offsets, offsets))
+
+    return float(values) if coords.ndim == 2 else values
+
+
+def kabsch(mobile, reference, weights=None):
+    """ Optimal (least squares) superposition of mobile onto reference
+        by the Kabsch algorithm, for one set of coordinates or a batch of
+        frames at once. The superposed coordinates are
+        np.dot(mobile, rotation) + translation (batched as
+        np.matmul(mobile, rotation) + translation[:, np.newaxis]).
+
+        # INPUT
+        mobile    :   (N,3) or (F,N,3) float array
+        reference :   (N,3) float array
+        weights   :   Optional (N,) per-atom weights
+
+        # OUTPUT
+        -         :   (rotation, translation, rmsd) - (3,3), (3,) and
+                      float, or (F,3,3), (F,3) and (F,) for frames
+    """
+
+    mobile = np.asarray(mobile, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+
+    single = mobile.ndim == 2
+    if single:
+        mobile = mobile[np.newaxis]
+
+    n_atoms = reference.shape[0]
+    if mobile.shape[1:] != reference.shape or reference.ndim != 2 or reference.shape[1] != 3:
+        raise PDB_geometryException("Can not superpose coordinates of shape " + str(mobile.shape[1:]) + " onto " + str(reference.shape))
+    if n_atoms == 0:
+        raise PDB_geometryException("Can not superpose no atoms")
+
+    w = _weights(None, n_atoms, False, weights)
+
+    mobile_centre = np.einsum("n,fni->fi", w, mobile)
+    reference_centre = np.dot(w, reference)
+
+    P = mobile - mobile_centre[:, np.newaxis, :]
+    Q = reference - reference_centre
+
+    # weighted covariance of every frame with the reference, and its SVD
+    H = np.matmul(P.transpose(0, 2, 1), w[:, np.newaxis] * Q)
+    (U, S, Vt) = np.linalg.svd(H)
+
+    # no reflections - flip the smallest singular direction if needed
+    d = np.sign(np.linalg.det(U) * np.linalg.det(Vt))
+    d[d == 0] = 1.0
+    U[:, :, 2] *= d[:, np.newaxis]
+
+    rotation = np.matmul(U, Vt)
+    translation = reference_centre - np.matmul(mobile_centre[:, np.newaxis, :], rotation)[:, 0]
+
+    # weighted mean square deviation from the sums of squares and the
+    # singular values
+    squares = np.einsum("n,fni,fni->f", w, P, P) + np.einsum("n,ni,ni->", w, Q, Q)
+    msd = squares - 2.0 * (S[:, 0] + S[:, 1] + d * S[:, 2])
+    rmsd = np.sqrt(np.maximum(msd, 0.0))
+
+    if single:
+        return (rotation[0], translation[0], float(rmsd[0]))
+
+    return (rotation, translation, rmsd)
+
+
+def superpose(mobile, reference, weights=None):
+    """ Returns the coordinates of mobile superposed onto reference (see
+        kabsch). Structures are not moved - to move one, assign the
+        result to its coordinates (e.g. pdb.load_coordinates(...)).
+
+        # INPUT
+        mobile    :   Structure (see atom_rows), (N,3) coordinates or
+                      (F,N,3) frames
+        reference :   Structure or (N,3) coordinates
+        weights   :   Optional (N,) per-atom weights
+
+        # OUTPUT
+        -         :   (N,3) or (F,N,3) float array
+    """
+
+    coords = coordinates(mobile)
+    (rotation, translation, rmsd) = kabsch(coords, coordinates(reference), weights)
+
+    if coords.ndim == 2:
+        return np.dot(coords, rotation) + translation
+
+    return np.matmul(coords, rotation) + translation[:, np.newaxis, :]
+
+
+def rmsd(a, b, superpose=True, weights=None):
+    """ Root mean square deviation between two structures (or coordinate
+        arrays) with the same atoms in the same order - after optimal
+        superposition unless superpose=False. a may also be (F,N,3)
+        frames, each compared with b.
+
+        # INPUT
+        a         :   Structure (see atom_rows), (N,3) or (F,N,3) array
+        b         :   Structure or (N,3) array
+        superpose :   Bool
+        weights   :   Optional (N,) per-atom weights
+
+        # OUTPUT
+        -         :   Float, or (F,) array for frames
+    """
+
+    coords = coordinates(a)
+    reference = coordinates(b)
+
+    if coords.shape[-2:] != reference.shape:
+        raise PDB_geometryException("Can not compare coordinates of shape " + str(coords.shape[-2:]) + " with " + str(reference.shape))
+
+    if superpose:
+        return kabsch(coords, reference, weights)[2]
+
+    w = _weights(None, reference.shape[0], False, weights)
+    difference = coords - reference
+
+    values = np.sqrt(np.einsum("n,...ni,...ni->...", w, difference, difference))
+
+    return float(values) if coords.ndim == 2 else values
+
+
+def iter_blocks(frames, block_size=BLOCK_SIZE):
+    """ Yields (F,N,3) float arrays of up to block_size frames from an
+        (F,N,3) array or any iterable of (N,3) frames (e.g. a
+        pdbtrajectory.PDB_trajectory), so ensembles larger than memory
+        are handled a block at a time
+    """
+
+    if isinstance(frames, np.ndarray):
+        if frames.ndim != 3 or frames.shape[2] != 3:
+            raise PDB_geometryException("Frames must be an (F,N,3) array (got shape " + str(frames.shape) + ")")
+        for start in xrange(0, len(frames), block_size):
+            yield np.asarray(frames[start:start+block_size], dtype=np.float64)
+        return
+
+    block = []
+    for frame in frames:
+        block.append(frame)
+        if len(block) == block_size:
+            yield np.array(block, dtype=np.float64)
+            block = []
+
+    if block:
+        yield np.array(block, dtype=np.float64)
+
+
+def rmsd_frames(frames, reference, superpose=True, atoms=None, weights=None, block_size=BLOCK_SIZE):
+    """ RMSD of every frame of an ensemble from a reference, worked out a
+        block of frames at a time
+
+        # INPUT
+        frames     :   (F,N,3) array or iterable of (N,3) frames
+        reference  :   Structure (see atom_rows) or (N,3) coordinates of
+                       the same N atoms
+        superpose  :   Bool - superpose each frame first
+        atoms      :   Optional rows of the frames (and reference) to
+                       compare, e.g. selection.indices for the CA atoms
+        weights    :   Optional per-atom weights (of the atoms compared)
+        block_size :   Frames per vectorized step
+
+        # OUTPUT
+        -          :   (F,) float array
+    """
+
+    reference = coordinates(reference)
+    if atoms is not None:
+        reference = reference[atoms]
+
+    values = []
+    for block in iter_blocks(frames, block_size):
+        if atoms is not None:
+            block = block[:, atoms]
+        values.append(rmsd(block, reference, superpose, weights))
+
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    return np.concatenate(values)
+
+
+def rmsf(frames, reference=None, superpose=True, atoms=None, weights=None, block_size=BLOCK_SIZE):
+    """ Root mean square fluctuation of each atom about its mean position
+        over an ensemble, with every frame first superposed onto
+        reference (by default the first frame) unless superpose=False.
+
+        # INPUT
+        frames     :   (F,N,3) array or iterable of (N,3) frames
+        reference  :   Optional structure or (N,3) coordinates to
+                       superpose onto
+        superpose  :   Bool
+        atoms      :   Optional rows used for the superposition (e.g.
+                       backbone atoms) - every atom is superposed by
+                       that fit and gets an RMSF
+        weights    :   Optional per-atom weights of the fitted atoms
+        block_size :   Frames per vectorized step
+
+        # OUTPUT
+        -          :   (N,) float array
+    """
+
+    if reference is not None:
+        reference = coordinates(reference)
+
+    n_frames = 0
+    (total, squares) = (None, None)
+
+    for block in iter_blocks(frames, block_size):
+        if reference is None:
+            reference = block[0]
+
+        if superpose:
+            fitted = block if atoms is None else block[:, atoms]
+            target = reference if atoms is None else reference[atoms]
+            (rotation, translation, deviation) = kabsch(fitted, target, weights)
+            block = np.matmul(block, rotation) + translation[:, np.newaxis, :]
+
+        if total is None:
+            total = np.zeros(block.shape[1:], dtype=np.float64)
+            squares = np.zeros(block.shape[1], dtype=np.float64)
+
+        # shifted by the reference so the sums stay small
+        block = block - reference
+        total += block.sum(axis=0)
+        squares += np.einsum("fni,fni->n", block, block)
+        n_frames = n_frames + len(block)
+
+    if n_frames == 0:
+        raise PDB_geometryException("RMSF needs at least one frame")
+
+    mean = total / n_frames
+
+    return np.sqrt(np.maximum(squares / n_frames - np.einsum("ni,ni->n", mean, mean), 0.0))
+
+
+def residue_rmsf(structure, frames, reference=None, superpose=True, atoms=None, weights=None, mass_weighted=False, block_size=BLOCK_SIZE):
+    """ Per-residue RMSF - the (optionally mass weighted) mean of the
+        atom RMSFs (see rmsf) of each residue of structure. frames hold
+        the atoms of structure, in the order of its rows.
+
+        # INPUT
+        structure     :   PDB_file, PDB_chain or PDB_atom_table
+        mass_weighted :   Bool
+
+        # OUTPUT
+        -             :   (n_residues,) float array, residues in table
+                          order
+    """
+
+    if isinstance(structure, PDBParser.PDB_chain):
+        (first_res, last_res) = structure.table.get_chain_range(structure._index)
+    elif isinstance(structure, (PDBParser.PDB_file, PDBParser.PDB_atom_table)):
+        (first_res, last_res) = (0, atom_rows(structure)[0].n_residues)
+    else:
+        raise PDB_geometryException("Per-residue RMSF needs a PDB_file, PDB_chain or PDB_atom_table")
+
+    (table, rows) = atom_rows(structure)
+
+    values = rmsf(frames, reference, superpose, atoms, weights, block_size)
+    if len(values) != len(rows):
+        raise PDB_geometryException("Frames hold " + str(len(values)) + " atoms but the structure has " + str(len(rows)))
+
+    if last_res == first_res:
+        return np.zeros(0, dtype=np.float64)
+
+    if mass_weighted:
+        w = atom_masses(structure)
+    else:
+        w = np.ones(len(rows), dtype=np.float64)
+
+    # first atom of each residue, as a position in rows
+    starts = table.residue_offsets[first_res:last_res] - table.residue_offsets[first_res]
+
+    return np.add.reduceat(w * values, starts) / np.add.reduceat(w, starts)
@@ -0,0 +1,192 @@
+# Python functions for hybrid-36 encoding of PDB atom serial numbers and
+# residue numbers
+#
+#
+#
+# Hybrid-36 keeps the plain decimal numbers of a width w field (up to
+# 10**w - 1) and carries on with base-36 numbers written with upper case
+# letters (A000 ...) and then lower case letters (a000 ...), the first
+# character always being a letter. A 5 character atom serial then counts
+# to 87,440,031 and a 4 character residue number to 2,436,111 - the
+# same scheme as cctbx/iotbx and the PDB's own large structure files.
+
+import numpy as np
+
+
+DIGITS_UPPER = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DIGITS_LOWER = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def max_value(width):
+    """ The largest number a width character hybrid-36 field holds """
+    return 10**width + 2 * 26 * 36**(width-1) - 1
+
+
+def min_value(width):
+    """ The smallest (most negative) number a width character field holds """
+    return -(10**(width-1) - 1)
+
+
+def encode(value, width):
+    """ Returns value as a width character (right justified) hybrid-36
+        string. Raises ValueError if it does not fit.
+
+        # INPUT
+        value :   Int
+        width :   Int (4 for residue numbers, 5 for atom serials)
+
+        # OUTPUT
+        -     :   String
+    """
+
+    value = int(value)
+
+    if min_value(width) <= value < 10**width:
+        return "%*i" % (width, value)
+
+    if value < min_value(width) or value > max_value(width):
+        raise ValueError("value out of range for a hybrid-36 field of width %i: %i" % (width, value))
+
+    value = value - 10**width
+    if value < 26 * 36**(width-1):
+        (digits, value) = (DIGITS_UPPER, value + 10 * 36**(width-1))
+    else:
+        (digits, value) = (DIGITS_LOWER, value - 16 * 36**(width-1))
+
+    chars = []
+    for i in xrange(width):
+        chars.append(digits[value % 36])
+        value = value // 36
+
+    return "".join(reversed(chars))
+
+
+def decode(string, width):
+    """ Returns the number held in a hybrid-36 field (which may be given
+        with or without its padding). Plain decimal fields read exactly as
+        int() reads them. Raises ValueError for anything else.
+
+        # INPUT
+        string :   String
+        width  :   Int (4 for residue numbers, 5 for atom serials)
+
+        # OUTPUT
+        -      :   Int
+    """
+
+    field = string.strip()
+
+    if len(field) == 0 or not field[0].isalpha():
+        return int(field)
+
+    if len(field) != width:
+        raise ValueError("invalid hybrid-36 field of width %i: %r" % (width, string))
+
+    if field[0].isupper():
+        digits = DIGITS_UPPER
+        offset = 10**width - 10 * 36**(width-1)
+    else:
+        digits = DIGITS_LOWER
+        offset = 10**width + 16 * 36**(width-1)
+
+    value = 0
+    for char in field:
+        position = digits.find(char)
+        if position < 0:
+            raise ValueError("invalid hybrid-36 field of width %i: %r" % (width, string))
+        value = value * 36 + position
+
+    return value + offset
+
+
+def is_encoded(columns):
+    """ Elementwise test of a (w,N) uint8 array of fixed width fields
+        (character position major) for those written in letters (i.e.
+        whose first character is a letter)
+    """
+
+    first = columns[0] | np.uint8(32)
+    return (first >= 97) & (first <= 122)
+
+
+def decode_columns(columns):
+    """ Vectorized decode of a (w,N) uint8 array holding N full width
+        hybrid-36 (letter) fields, character position major. Raises
+        ValueError naming the first field which is not valid hybrid-36.
+
+        # INPUT
+        columns :   (w,N) uint8 array
+
+        # OUTPUT
+        -       :   Int array
+    """
+
+    (width, n_fields) = columns.shape
+
+    upper = (columns[0] >= 65) & (columns[0] <= 90)
+
+    values = np.zeros(n_fields, dtype=np.int64)
+    bad = ~(upper | ((columns[0] >= 97) & (columns[0] <= 122)))
+
+    for position in xrange(width):
+        char = columns[position].astype(np.int64)
+
+        digit  = (char >= 48) & (char <= 57)
+        letter = np.where(upper, (char >= 65) & (char <= 90), (char >= 97) & (char <= 122))
+        bad |= ~(digit | letter)
+
+        value = np.where(digit, char - 48, np.where(upper, char - 55, char - 87))
+        values = values * 36 + value
+
+    if bad.any():
+        field = np.ascontiguousarray(columns[:, np.flatnonzero(bad)[0]]).tostring()
+        raise ValueError("invalid hybrid-36 field of width %i: %r" % (width, field))
+
+    return values + np.where(upper, 10**width - 10 * 36**(width-1), 10**width + 16 * 36**(width-1))
+
+
+def encode_chars(values, width):
+    """ Vectorized encode of an integer array of values which are all
+        beyond the decimal range (10**width and up, at most
+        max_value(width)) into an (N,width) uint8 character array
+    """
+
+    values = np.asarray(values, dtype=np.int64) - 10**width
+
+    upper = values < 26 * 36**(width-1)
+    values = np.where(upper, values + 10 * 36**(width-1), values - 16 * 36**(width-1))
+
+    digits_upper = np.frombuffer(DIGITS_UPPER, dtype=np.uint8)
+    digits_lower = np.frombuffer(DIGITS_LOWER, dtype=np.uint8)
+
+    chars = np.empty((len(values), width), dtype=np.uint8)
+    for position in xrange(width-1, -1, -1):
+        digit = values % 36
+        chars[:, position] = np.where(upper, digits_upper[digit], digits_lower[digit])
+        values = values // 36
+
+    return chars
+
+
+# character columns of the (up to 5) bonded atom serials of a CONECT
+# record, after the atom itself in columns 7-11
+CONECT_COLUMNS = ((6, 11), (11, 16), (16, 21), (21, 26), (26, 31))
+
+def conect_serials(line):
+    """ Returns the atom serials of a CONECT record (the atom and then
+        the atoms bonded to it), decoding hybrid-36 serials
+
+        # INPUT
+        line :   String
+
+        # OUTPUT
+        -    :   List of ints
+    """
+
+    serials = []
+    for (first, last) in CONECT_COLUMNS:
+        field = line[first:last]
+        if field.strip() != "":
+            serials.append(decode(field, 5))
+
+    return serials
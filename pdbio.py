@@ -0,0 +1,278 @@
+# Python functions for reading and writing (optionally compressed) PDB
+# files
+#
+#
+#
+
+import bz2
+import gzip
+import os
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+##-------------------------------------------------------##
+##                   PDB_ioException                     ##
+##-------------------------------------------------------##
+
+class PDB_ioException(Exception):
+        """ Generic exception from PDB input/output errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+# file name extension -> compression
+COMPRESSION_EXTENSIONS = {".gz"  : "gzip",
+                          ".bz2" : "bz2",
+                          ".xz"  : "xz"}
+
+# leading bytes of each compressed format
+COMPRESSION_MAGIC = (("\x1f\x8b",         "gzip"),
+                     ("BZh",              "bz2"),
+                     ("\xfd7zXZ\x00",     "xz"))
+
+MAGIC_LENGTH = 6
+
+BLOCK_SIZE = 1 << 20
+
+
+def compression_from_name(filename):
+    """ Returns the compression ("gzip", "bz2", "xz") implied by the
+        extension of filename, or None
+    """
+
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(str(filename))[1].lower())
+
+
+def compression_from_magic(head):
+    """ Returns the compression whose magic bytes start head, or None """
+
+    for (magic, compression) in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+
+    return None
+
+
+def _decompressor(compression):
+    if compression == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Decompressor()
+    if compression == "xz":
+        _require_lzma()
+        return lzma.LZMADecompressor()
+
+    raise PDB_ioException("Unknown compression " + str(compression))
+
+
+def _compressor(compression, compresslevel):
+    if compression == "bz2":
+        return bz2.BZ2Compressor(compresslevel)
+    if compression == "xz":
+        _require_lzma()
+        return lzma.LZMACompressor(preset=min(compresslevel, 9))
+
+    raise PDB_ioException("Unknown compression " + str(compression))
+
+
+def _require_lzma():
+    if lzma is None:
+        raise PDB_ioException("xz compressed files need the lzma module (Python 3.3+, or backports.lzma on Python 2)")
+
+
+def iter_chunks(source, block_size=BLOCK_SIZE):
+    """ Yields the (decompressed) contents of source in chunks. source is
+        a file name or an open binary file object/in-memory buffer (which
+        is read from its current position and left open). Compression is
+        recognised from the leading magic bytes, so a compressed file
+        does not need a telling extension. Concatenated compressed
+        streams (e.g. from cat a.gz b.gz) are read one after another.
+    """
+
+    if hasattr(source, "read"):
+        handle = source
+        owned = False
+    else:
+        handle = open(source, "rb")
+        owned = True
+
+    try:
+        head = handle.read(MAGIC_LENGTH)
+        compression = compression_from_magic(head)
+
+        if compression is None:
+            data = head
+            while data:
+                yield data
+                data = handle.read(block_size)
+            return
+
+        decompressor = _decompressor(compression)
+        data = head
+        while data:
+            while data:
+                try:
+                    chunk = decompressor.decompress(data)
+                except EOFError:
+                    # the previous stream ended exactly at a block boundary
+                    decompressor = _decompressor(compression)
+                    continue
+
+                if chunk:
+                    yield chunk
+
+                # anything after the end of a stream is the next stream
+                data = decompressor.unused_data
+                if data:
+                    decompressor = _decompressor(compression)
+
+            data = handle.read(block_size)
+
+    finally:
+        if owned:
+            handle.close()
+
+
+def iter_lines(source, block_size=BLOCK_SIZE):
+    """ Yields the lines of source (see iter_chunks) one at a time, each
+        with its trailing newline (except perhaps the last), without
+        holding more than a block of the file in memory.
+    """
+
+    tail = ""
+    for chunk in iter_chunks(source, block_size):
+        parts = (tail + chunk).split("\n")
+        tail = parts.pop()
+
+        for line in parts:
+            yield line + "\n"
+
+    if tail:
+        yield tail
+
+
+def read_lines(source, block_size=BLOCK_SIZE):
+    """ Returns the lines of source (see iter_chunks) as a list """
+
+    # plain files on disk are read directly
+    if not hasattr(source, "read"):
+        with open(source, "rb") as f:
+            if compression_from_magic(f.read(MAGIC_LENGTH)) is None:
+                f.seek(0)
+                return f.readlines()
+
+    return list(iter_lines(source, block_size))
+
+
+def read_bytes(source, block_size=BLOCK_SIZE):
+    """ Returns the whole (decompressed) contents of source (see
+        iter_chunks) as one string
+    """
+
+    if not hasattr(source, "read"):
+        with open(source, "rb") as f:
+            if compression_from_magic(f.read(MAGIC_LENGTH)) is None:
+                f.seek(0)
+                return f.read()
+
+    return "".join(iter_chunks(source, block_size))
+
+
+def open_output(target, compression="infer", compresslevel=6):
+    """ Opens target (a file name, or an open binary file object/in-memory
+        buffer) for writing, returning a PDB_output_stream.
+
+        # INPUT
+        target        :   String or file object
+        compression   :   "infer" (from the extension of a file name -
+                          file objects are not compressed), None,
+                          "gzip", "bz2" or "xz"
+        compresslevel :   1 (fastest) to 9 (smallest)
+
+        # OUTPUT
+        -             :   PDB_output_stream
+    """
+
+    if compression == "infer":
+        if hasattr(target, "write"):
+            compression = None
+        else:
+            compression = compression_from_name(target)
+
+    if compression not in (None, "gzip", "bz2", "xz"):
+        raise PDB_ioException("Unknown compression " + str(compression))
+
+    if compression == "xz":
+        _require_lzma()
+
+    if hasattr(target, "write"):
+        return PDB_output_stream(target, False, compression, compresslevel)
+
+    return PDB_output_stream(open(target, "wb"), True, compression, compresslevel)
+
+
+##-------------------------------------------------------##
+##                  PDB_output_stream                    ##
+##-------------------------------------------------------##
+
+class PDB_output_stream(object):
+    """ Write-only stream which compresses (or not) everything written to
+        it on the way to an underlying file object. close() finishes the
+        compressed stream and closes the underlying file if it was opened
+        by open_output.
+    """
+
+    def __init__(self, handle, owned, compression=None, compresslevel=6):
+        self.compression = compression
+        self.bytes_written = 0
+
+        self.__handle = handle
+        self.__owned = owned
+        self.__gzip = None
+        self.__compressor = None
+
+        if compression == "gzip":
+            self.__gzip = gzip.GzipFile(filename="", mode="wb", compresslevel=compresslevel, fileobj=handle)
+        elif compression is not None:
+            self.__compressor = _compressor(compression, compresslevel)
+
+    def write(self, data):
+        self.bytes_written = self.bytes_written + len(data)
+
+        if self.__gzip is not None:
+            self.__gzip.write(data)
+        elif self.__compressor is not None:
+            self.__handle.write(self.__compressor.compress(data))
+        else:
+            self.__handle.write(data)
+
+    def close(self):
+        if self.__handle is None:
+            return
+
+        try:
+            if self.__gzip is not None:
+                self.__gzip.close()
+            elif self.__compressor is not None:
+                self.__handle.write(self.__compressor.flush())
+        finally:
+            if self.__owned:
+                self.__handle.close()
+            self.__handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+##-------------------END-OF-CLASS------------------------##
@@ -0,0 +1,501 @@
+# Python class for converting residue and atom naming between forcefield
+# conventions with declarative rule tables
+#
+#
+#
+
+import numpy as np
+
+import PDBParser
+import pdbprofile
+
+
+##-------------------------------------------------------##
+##                 PDB_namingException                   ##
+##-------------------------------------------------------##
+
+class PDB_namingException(Exception):
+        """ Generic exception from naming rule errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+## Naming tables
+##
+## Every convention names the same set of canonical residues (keys of
+## "residues") in its own way. Atoms are named canonically (the PDB
+## names) unless renamed in "atoms", and "order" gives the canonical
+## atom order a residue is written out in. Residues listed in TERMINI are
+## only converted at that end of a chain (and only when caps are being
+## changed), the rest wherever they appear.
+##
+## A name in "protonation" does not say which canonical residue it is
+## (e.g. HIS) - it is resolved from the hydrogens the residue carries
+## with the rule of that name in PROTONATION_RULES.
+##
+## Supporting a new forcefield means adding its table here.
+
+TERMINI = {"ACE" : "N",
+           "NME" : "C"}
+
+FORCEFIELDS = {
+    "CAMPARI" : {"residues"    : {"ACE" : "ACE", "NME" : "NME",
+                                  "HID" : "HID", "HIE" : "HIE", "HIP" : "HIP"},
+                 "atoms"       : {"ACE" : {"H1" : "1H", "H2" : "2H", "H3" : "3H"},
+                                  "NME" : {"H" : "HN", "H1" : "1H", "H2" : "2H", "H3" : "3H"}},
+                 "order"       : {"ACE" : ("CH3", "C", "O", "H1", "H2", "H3"),
+                                  "NME" : ("N", "CH3", "H", "H1", "H2", "H3")},
+                 "protonation" : {}},
+
+    # GROMACS (as written by pdb2gmx) - histidines are left as HIS
+    "GMX"     : {"residues"    : {"ACE" : "ACE", "NME" : "NAC",
+                                  "HID" : "HID", "HIE" : "HIE", "HIP" : "HIP"},
+                 "atoms"       : {"ACE" : {"H1" : "1HH3", "H2" : "2HH3", "H3" : "3HH3"},
+                                  "NME" : {"H1" : "1HH3", "H2" : "2HH3", "H3" : "3HH3"}},
+                 "order"       : {"ACE" : ("CH3", "H1", "H2", "H3", "C", "O"),
+                                  "NME" : ("N", "H", "CH3", "H1", "H2", "H3")},
+                 "protonation" : {"HIS" : "histidine"}},
+
+    "AMBER"   : {"residues"    : {"ACE" : "ACE", "NME" : "NME",
+                                  "HID" : "HID", "HIE" : "HIE", "HIP" : "HIP"},
+                 "atoms"       : {"ACE" : {"H1" : "HH31", "H2" : "HH32", "H3" : "HH33"},
+                                  "NME" : {"H1" : "HH31", "H2" : "HH32", "H3" : "HH33"}},
+                 "order"       : {"ACE" : ("H1", "CH3", "H2", "H3", "C", "O"),
+                                  "NME" : ("N", "H", "CH3", "H1", "H2", "H3")},
+                 "protonation" : {"HIS" : "histidine"}},
+
+    "CHARMM"  : {"residues"    : {"ACE" : "ACE", "NME" : "CT3",
+                                  "HID" : "HSD", "HIE" : "HSE", "HIP" : "HSP"},
+                 "atoms"       : {"ACE" : {"H1" : "HH31", "H2" : "HH32", "H3" : "HH33"},
+                                  "NME" : {"H" : "HN", "H1" : "HH31", "H2" : "HH32", "H3" : "HH33"}},
+                 "order"       : {"ACE" : ("CH3", "H1", "H2", "H3", "C", "O"),
+                                  "NME" : ("N", "H", "CH3", "H1", "H2", "H3")},
+                 "protonation" : {"HIS" : "histidine"}},
+    }
+
+# rule name -> (marker groups, states). A marker group is present when
+# the residue holds each of its atoms (source names). The first state
+# whose groups are all present gives the canonical residue, and a
+# residue matching none is an error
+PROTONATION_RULES = {
+    "histidine" : ({"HE" : ("HE1", "HE2"),
+                    "HD" : ("HD1", "HD2")},
+                   ((("HE", "HD"), "HIP"),
+                    (("HE",),      "HIE"),
+                    (("HD",),      "HID"))),
+    }
+
+
+##-------------------------------------------------------##
+##                  PDB_naming_rules                     ##
+##-------------------------------------------------------##
+
+class PDB_naming_rules(object):
+    """ The rules for converting from one naming convention (a key of
+        FORCEFIELDS) to another, compiled into lookup tables keyed on the
+        source residue name
+
+            rules = pdbnaming.compile_rules("GMX", "CAMPARI")
+            rules.apply(pdbfile)
+
+        With caps=False the chain terminal residues (TERMINI) are left
+        alone.
+    """
+
+    def __init__(self, source, target, caps=True, forcefields=None):
+
+        if forcefields is None:
+            forcefields = FORCEFIELDS
+
+        for name in (source, target):
+            if name not in forcefields:
+                raise PDB_namingException("Unknown naming convention " + str(name) + " - must be one of " + ", ".join(sorted(forcefields)))
+
+        self.source = source
+        self.target = target
+        self.caps = caps
+        self.forcefields = forcefields
+
+        # source residue name -> (target name, {source atom: target atom},
+        # source atom names in target order (or None), terminus (or None))
+        self.residues = {}
+
+        # source residue name -> protonation rule name
+        self.protonation = {}
+
+        source_table = forcefields[source]
+        target_table = forcefields[target]
+
+        for (canonical, name) in source_table["residues"].iteritems():
+            if canonical not in target_table["residues"]:
+                continue
+            if TERMINI.get(canonical) is not None and not caps:
+                continue
+
+            rule = self.__compile_residue(canonical, source_table, target_table)
+
+            # nothing to do - the names and order already agree
+            if rule[0] == name and len(rule[1]) == 0 and rule[2] is None:
+                continue
+
+            self.residues[name] = rule
+
+        for (name, rule) in source_table["protonation"].iteritems():
+            if rule not in PROTONATION_RULES:
+                raise PDB_namingException("Unknown protonation rule " + str(rule))
+            self.protonation[name] = rule
+
+    def __compile_residue(self, canonical, source_table, target_table):
+        source_atoms = source_table["atoms"].get(canonical, {})
+        target_atoms = target_table["atoms"].get(canonical, {})
+
+        # every canonical atom named by either side
+        renames = {}
+        for atom in set(source_atoms) | set(target_atoms):
+            (old, new) = (source_atoms.get(atom, atom), target_atoms.get(atom, atom))
+            if old != new:
+                renames[old] = new
+
+        order = target_table["order"].get(canonical)
+        if order is not None:
+            order = tuple([source_atoms.get(atom, atom) for atom in order])
+
+        return (target_table["residues"][canonical], renames, order, TERMINI.get(canonical))
+
+    def apply(self, pdbfile, errors=None):
+        """ Converts every chain of pdbfile in place, in a single sweep
+            over its residues. Only the residues with a cap rule are looked
+            at atom by atom - protonation states are assigned in bulk (see
+            classify_protonation) once the residues needing them are found.
+
+            A residue in an odd protonation state raises a 
+            PDB_namingException, unless a list is passed as errors - then
+            a message for each one is appended to it and the rest of the
+            structure is still converted.
+
+            # INPUT
+            pdbfile :     PDBParser.PDB_file
+            errors  :     List (or None)
+
+            # OUTPUT
+            -       :     Number of residues changed
+        """
+
+        chains = pdbfile.chains
+        candidates = np.array(sorted(set(self.residues) | set(self.protonation)), dtype="S")
+        protonated = np.array(sorted(self.protonation), dtype="S")
+
+        # table -> residues needing a protonation state (tables in order
+        # of first appearance - usually every chain is on the same table)
+        tables = []
+        residues = {}
+
+        # the cap (and other per-residue) renames, in one pass over the
+        # chains which also collects the residues needing a protonation
+        # state
+        with pdbprofile.stage("cap_change") as stage:
+            n_caps = 0
+            for chainID in chains:
+                chain = chains[chainID]
+                table = chain.table
+
+                (first_res, last_res) = table.get_chain_range(chain._index)
+                res_names = table.res_name[table.residue_offsets[first_res:last_res]]
+
+                # the residues worth looking at, found for the whole chain at once
+                positions = np.flatnonzero(np.in1d(res_names, candidates))
+
+                if len(protonated) > 0:
+                    by_state = np.in1d(res_names[positions], protonated)
+                    if by_state.any():
+                        if id(table) not in residues:
+                            tables.append(table)
+                            residues[id(table)] = []
+                        residues[id(table)].append(first_res + positions[by_state])
+                    positions = positions[~by_state]
+
+                for position in positions.tolist():
+                    n_caps = n_caps + self.__apply_residue(table, first_res + position, position, last_res - first_res)
+
+            stage.count(residues=n_caps)
+
+        with pdbprofile.stage("histidine_rename") as stage:
+            n_renamed = 0
+            for table in tables:
+                report = classify_protonation(table, np.concatenate(residues[id(table)]), self.source, self.target, self.forcefields)
+
+                if errors is None:
+                    report.raise_errors()
+                else:
+                    errors.extend(report.errors())
+
+                n_renamed = n_renamed + report.apply()
+
+            stage.count(residues=n_renamed)
+
+        n_changed = n_caps + n_renamed
+        pdbprofile.count(residues=n_changed)
+
+        return n_changed
+
+    def __apply_residue(self, table, residue_index, position, n_residues):
+        (start, stop) = table.get_residue_range(residue_index)
+        res_name = str(table.res_name[start])
+        atom_names = [str(i) for i in table.atom_name[start:stop]]
+
+        rule = self.residues.get(res_name)
+        if rule is None:
+            return 0
+
+        (new_name, renames, order, terminus) = rule
+
+        if terminus == "N" and position != 0:
+            return 0
+        if terminus == "C" and position != n_residues - 1:
+            return 0
+
+        if order is not None:
+            slots = {}
+            for (i, name) in enumerate(atom_names):
+                slots.setdefault(name, []).append(i)
+
+            perm = []
+            for name in order:
+                perm.extend(slots.get(name, []))
+
+            if len(perm) != len(atom_names):
+                raise PDBParser.PDB_residueException("Atoms of " + res_name + " residue " + str(table.res_id[start]) + " " + str(atom_names) +
+                                                     " do not match the " + self.source + " atoms " + str(list(order)))
+
+            table.permute_rows(start, perm, skip=("atom_id",))
+            atom_names = [atom_names[i] for i in perm]
+
+        for (i, name) in enumerate(atom_names):
+            if name in renames:
+                table.set_value("atom_name", start + i, renames[name])
+
+        if new_name != res_name:
+            table.set_value("res_name", slice(start, stop), new_name)
+
+        return 1
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_naming_rules " + self.source + " -> " + self.target + " - " + str(len(self.residues) + len(self.protonation)) + " rules>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+# (source, target, caps) -> PDB_naming_rules, so each set of rules is
+# only compiled once
+_COMPILED = {}
+
+def compile_rules(source, target, caps=True):
+    """ Returns the (cached) compiled rules for converting from the
+        source to the target naming convention
+    """
+
+    key = (source, target, bool(caps))
+    if key not in _COMPILED:
+        _COMPILED[key] = PDB_naming_rules(source, target, caps)
+
+    return _COMPILED[key]
+
+
+def convert(pdbfile, source, target, caps=True, errors=None):
+    """ Converts the residue and atom naming of pdbfile in place from the
+        source to the target convention (keys of FORCEFIELDS) and returns
+        the number of residues changed. See PDB_naming_rules.apply for
+        errors.
+    """
+
+    with pdbprofile.stage("naming_rules"):
+        return compile_rules(source, target, caps).apply(pdbfile, errors)
+
+
+
+##-------------------------------------------------------##
+##               PDB_protonation_report                  ##
+##-------------------------------------------------------##
+
+class PDB_protonation_report(object):
+    """ The protonation states assigned to a set of residues of a 
+        PDB_atom_table by classify_protonation. Per residue (in the
+        order they were given):
+
+        residues  : residue indices in table
+        res_names : current residue names
+        states    : canonical state (e.g. "HIE"), "" where odd
+        names     : name of that state in the target convention, "" where
+                    odd or where the target has no name for it
+        odd       : True for residues which match no state
+    """
+
+    def __init__(self, table, residues, res_names, states, names, odd):
+        self.table     = table
+        self.residues  = residues
+        self.res_names = res_names
+        self.states    = states
+        self.names     = names
+        self.odd       = odd
+
+    def renames(self):
+        """ Returns (residue index, old name, new name) for every residue
+            whose name changes
+        """
+
+        changed = np.flatnonzero(self.__changed())
+
+        return zip(self.residues[changed].tolist(), [str(i) for i in self.res_names[changed]], [str(i) for i in self.names[changed]])
+
+    def errors(self):
+        """ Returns a message for every residue in an odd protonation
+            state
+        """
+
+        messages = []
+        for i in np.flatnonzero(self.odd):
+            start = self.table.residue_offsets[self.residues[i]]
+            messages.append("ERROR: " + str(self.res_names[i]) + " residue " + str(self.table.res_id[start]) + " (chain " + str(self.table.chain[start]) + ") has an odd protonation state...")
+
+        return messages
+
+    def raise_errors(self):
+        """ Raises a PDB_namingException for the first odd residue (if
+            there is one)
+        """
+
+        errors = self.errors()
+        if len(errors) > 0:
+            raise PDB_namingException(errors[0])
+
+    def apply(self):
+        """ Renames the residues in bulk (one array assignment per new 
+            name) and returns how many were renamed. Odd residues are 
+            left as they are.
+        """
+
+        changed = self.__changed()
+        if not changed.any():
+            return 0
+
+        offsets = self.table.residue_offsets
+        starts  = offsets[self.residues[changed]]
+        lengths = offsets[self.residues[changed] + 1] - starts
+
+        # every atom row of the renamed residues
+        rows = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        new_names = np.repeat(self.names[changed], lengths)
+
+        for name in np.unique(new_names):
+            self.table.set_value("res_name", rows[new_names == name], str(name))
+
+        return int(changed.sum())
+
+    def __changed(self):
+        return ~self.odd & (self.names != "") & (self.names != self.res_names)
+
+    def __len__(self):
+        return len(self.residues)
+
+    def __iter__(self):
+        """ Yields (residue index, residue name, state, target name, odd) """
+
+        for i in xrange(len(self.residues)):
+            yield (int(self.residues[i]), str(self.res_names[i]), str(self.states[i]), str(self.names[i]), bool(self.odd[i]))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_protonation_report - " + str(len(self.residues)) + " residues, " + str(int(self.__changed().sum())) + " renames, " + str(int(self.odd.sum())) + " odd>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+def classify_protonation(table, residues=None, source="GMX", target="CAMPARI", forcefields=None):
+    """ Assigns a protonation state to every residue whose name (in the
+        source convention) leaves it open, e.g. HIS, in one vectorized 
+        pass: the marker atoms of each rule in PROTONATION_RULES are 
+        counted per residue over the atom name column at once.
+
+        Nothing is renamed - call apply() on the report for that.
+
+        # INPUT
+        table       :     PDBParser.PDB_atom_table (with boundaries)
+        residues    :     Residue indices to look at (None = every 
+                          residue)
+        source      :     Naming convention the residues are in
+        target      :     Naming convention of the names to assign
+        forcefields :     Naming tables (default FORCEFIELDS)
+
+        # OUTPUT
+        -           :     PDB_protonation_report
+    """
+
+    if forcefields is None:
+        forcefields = FORCEFIELDS
+
+    for name in (source, target):
+        if name not in forcefields:
+            raise PDB_namingException("Unknown naming convention " + str(name) + " - must be one of " + ", ".join(sorted(forcefields)))
+
+    rules = forcefields[source]["protonation"]
+    target_names = forcefields[target]["residues"]
+
+    offsets = table.residue_offsets
+    if residues is None:
+        residues = np.arange(len(offsets) - 1)
+    residues = np.asarray(residues, dtype=np.int64)
+
+    res_names = table.res_name[offsets[residues]]
+    keep = np.in1d(res_names, np.array(sorted(rules), dtype="S"))
+    residues = residues[keep]
+    res_names = res_names[keep]
+
+    n_residues = len(residues)
+    width  = max([len(i) for i in target_names.values()] + [len(i[1]) for j in PROTONATION_RULES.values() for i in j[1]])
+    states = np.zeros(n_residues, dtype="S%i" % width)
+    names  = np.zeros(n_residues, dtype="S%i" % width)
+    odd    = np.zeros(n_residues, dtype=bool)
+
+    starts  = offsets[residues]
+    lengths = offsets[residues + 1] - starts
+
+    # every atom row of those residues, and which of them it belongs to
+    rows  = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    owner = np.repeat(np.arange(n_residues), lengths)
+    atom_names = table.atom_name[rows]
+
+    for (res_name, rule_name) in rules.iteritems():
+        if rule_name not in PROTONATION_RULES:
+            raise PDB_namingException("Unknown protonation rule " + str(rule_name))
+
+        (markers, rule_states) = PROTONATION_RULES[rule_name]
+        selected = res_names == res_name
+
+        present = {}
+        for (group, atoms) in markers.iteritems():
+            count = np.zeros(n_residues, dtype=np.int64)
+            for atom in atoms:
+                count += np.bincount(owner[atom_names == atom], minlength=n_residues)
+            present[group] = count == len(atoms)
+
+        # the first matching state wins
+        unassigned = selected.copy()
+        for (groups, canonical) in rule_states:
+            match = unassigned.copy()
+            for group in groups:
+                match &= present[group]
+
+            states[match] = canonical
+            names[match] = target_names.get(canonical, "")
+            unassigned &= ~match
+
+        odd |= unassigned
+
+    return PDB_protonation_report(table, residues, res_names, states, names, odd)
@@ -0,0 +1,367 @@
+# Python class for optional per-stage instrumentation of PDB loading,
+# writing and conversion
+#
+#
+#
+
+import resource
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+##-------------------------------------------------------##
+##                 PDB_profileException                  ##
+##-------------------------------------------------------##
+
+class PDB_profileException(Exception):
+        """ Generic exception from PDB_profiler errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+# profilers currently recording (innermost last). Stages are only timed
+# while this is non-empty
+_ACTIVE = []
+
+
+##-------------------------------------------------------##
+##                  PDB_stage_record                     ##
+##-------------------------------------------------------##
+
+class PDB_stage_record(object):
+    """ One timed stage. path is the names of the enclosing stages and
+        this one joined by "/" (e.g. "load/parse_atoms"), counts
+        holds whatever was counted in the stage (lines, atoms, ...) and
+        memory_peak is the most memory in use during the stage above the
+        level when it started (bytes, None unless memory is traced).
+    """
+
+    __slots__ = ("name", "path", "depth", "seconds", "counts", "memory_peak")
+
+    def __init__(self, name, path, depth):
+        self.name        = name
+        self.path        = path
+        self.depth       = depth
+        self.seconds     = None
+        self.counts      = {}
+        self.memory_peak = None
+
+    def as_dict(self):
+        return {"name"        : self.name,
+                "path"        : self.path,
+                "depth"       : self.depth,
+                "seconds"     : self.seconds,
+                "counts"      : dict(self.counts),
+                "memory_peak" : self.memory_peak}
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return "<PDB_stage_record " + self.path + " - " + ("%.6f" % self.seconds if self.seconds is not None else "running") + " s>"
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                  PDB_profile_report                   ##
+##-------------------------------------------------------##
+
+class PDB_profile_report(object):
+    """ The stages recorded by a PDB_profiler, in the order they started.
+        A stage which runs more than once (e.g. once per chain) gives a
+        record per run - summary() adds them up by path.
+    """
+
+    # counts shown as columns by __str__
+    COUNT_COLUMNS = ("lines", "atoms")
+
+    def __init__(self, memory_source=None):
+        self.records = []
+        self.memory_source = memory_source
+
+    @property
+    def total_seconds(self):
+        """ Time spent in the outermost stages """
+        return sum(i.seconds for i in self.records if i.depth == 0 and i.seconds is not None)
+
+    def find(self, name):
+        """ Returns every record of the stage called name (or with path
+            name)
+        """
+        return [i for i in self.records if i.name == name or i.path == name]
+
+    def summary(self):
+        """ Returns one dictionary per stage path (in the order the paths
+            first appear) with the number of calls, the total seconds,
+            the summed counts and the largest memory peak
+        """
+
+        summary = []
+        by_path = {}
+
+        for record in self.records:
+            entry = by_path.get(record.path)
+            if entry is None:
+                entry = {"path" : record.path, "name" : record.name, "depth" : record.depth,
+                         "calls" : 0, "seconds" : 0.0, "counts" : {}, "memory_peak" : None}
+                by_path[record.path] = entry
+                summary.append(entry)
+
+            entry["calls"] = entry["calls"] + 1
+            if record.seconds is not None:
+                entry["seconds"] = entry["seconds"] + record.seconds
+
+            for (key, value) in record.counts.iteritems():
+                entry["counts"][key] = entry["counts"].get(key, 0) + value
+
+            if record.memory_peak is not None:
+                entry["memory_peak"] = max(entry["memory_peak"], record.memory_peak)
+
+        return summary
+
+    def as_dicts(self):
+        """ The records as plain dictionaries (e.g. for json) """
+        return [i.as_dict() for i in self.records]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __repr__(self):
+        return "<PDB_profile_report of " + str(len(self.records)) + " stages - " + "%.6f" % self.total_seconds + " s>"
+
+    def __str__(self):
+        total = self.total_seconds
+
+        lines = ["%-40s %6s %12s %7s %10s %10s %12s" % ("stage", "calls", "seconds", "%", "lines", "atoms", "memory")]
+        for entry in self.summary():
+            if total > 0:
+                percent = "%7.1f" % (100.0 * entry["seconds"] / total)
+            else:
+                percent = "%7s" % "-"
+
+            counts = ["%10s" % entry["counts"].get(i, "") for i in self.COUNT_COLUMNS]
+
+            if entry["memory_peak"] is None:
+                memory = "%12s" % ""
+            else:
+                memory = "%10.1fMB" % (entry["memory_peak"] / 1048576.0)
+
+            lines.append("%-40s %6i %12.6f %s %s %s" % ("  " * entry["depth"] + entry["name"], entry["calls"], entry["seconds"], percent, " ".join(counts), memory))
+
+        return "\n".join(lines)
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                    PDB_profiler                       ##
+##-------------------------------------------------------##
+
+class PDB_profiler(object):
+    """ Context manager which records the instrumented stages of
+        everything run inside it
+
+            with pdbprofile.PDB_profiler() as report:
+                pdb = PDBParser.PDB_file("big.pdb")
+            print report
+
+        Stages are timed (wall clock) and annotated with line/atom
+        counts. With trace_memory=True the memory peak of every stage is
+        recorded as well - from tracemalloc where it is available,
+        otherwise from the growth of the process' peak RSS (which only
+        sees a stage that pushes memory use to a new high). callback, if
+        given, is called with each PDB_stage_record as its stage ends.
+
+        When no profiler is active the instrumented stages cost a single
+        function call each.
+    """
+
+    def __init__(self, trace_memory=False, callback=None):
+        self.trace_memory = trace_memory
+        self.callback = callback
+
+        if not trace_memory:
+            memory_source = None
+        elif tracemalloc is not None:
+            memory_source = "tracemalloc"
+        else:
+            memory_source = "rss"
+
+        self.report = PDB_profile_report(memory_source)
+
+        # open stages (innermost last)
+        self._open = []
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        if self.report.memory_source == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        _ACTIVE.append(self)
+
+        return self.report
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if len(_ACTIVE) == 0 or _ACTIVE[-1] is not self:
+            raise PDB_profileException("PDB_profiler contexts must be closed in the reverse order they were opened")
+
+        _ACTIVE.pop()
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        return False
+
+    def _resets_peak(self):
+        return self.report.memory_source == "tracemalloc" and hasattr(tracemalloc, "reset_peak")
+
+    def _memory(self):
+        """ (current, peak) memory in bytes for the memory source """
+
+        if self.report.memory_source == "tracemalloc":
+            return tracemalloc.get_traced_memory()
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            peak = peak * 1024
+
+        return (peak, peak)
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                      _Stage                           ##
+##-------------------------------------------------------##
+
+class _Stage(object):
+    """ A stage being recorded by a profiler (returned by stage()) """
+
+    __slots__ = ("_profiler", "record", "_start", "_memory_start", "_peak_at_enter", "_memory_peak")
+
+    def __init__(self, profiler, name, counts):
+        self._profiler = profiler
+
+        parent = profiler._open[-1].record.path + "/" if profiler._open else ""
+        self.record = PDB_stage_record(name, parent + name, len(profiler._open))
+        self.record.counts.update(counts)
+
+    def count(self, **counts):
+        """ Adds to the counts of this stage (e.g. lines=..., atoms=...) """
+
+        for (key, value) in counts.iteritems():
+            self.record.counts[key] = self.record.counts.get(key, 0) + value
+
+    def __enter__(self):
+        profiler = self._profiler
+
+        if profiler.trace_memory:
+            (current, peak) = profiler._memory()
+
+            # where the peak can be reset, hand the peak so far to the
+            # enclosing stage first and measure this stage from here
+            if profiler._resets_peak():
+                if profiler._open:
+                    profiler._open[-1]._memory_peak = max(profiler._open[-1]._memory_peak, peak)
+                tracemalloc.reset_peak()
+                peak = current
+
+            self._memory_start  = current
+            self._peak_at_enter = peak
+            self._memory_peak   = current
+
+        profiler._open.append(self)
+        profiler.report.records.append(self.record)
+
+        self._start = time.time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record.seconds = time.time() - self._start
+
+        profiler = self._profiler
+        profiler._open.pop()
+
+        if profiler.trace_memory:
+            (current, peak) = profiler._memory()
+
+            # without a reset the peak only belongs to this stage if it 
+            # went up while the stage ran
+            if profiler._resets_peak() or peak > self._peak_at_enter:
+                stage_peak = max(self._memory_peak, peak)
+            else:
+                stage_peak = max(self._memory_peak, current)
+
+            self.record.memory_peak = stage_peak - self._memory_start
+
+            if profiler._open:
+                profiler._open[-1]._memory_peak = max(profiler._open[-1]._memory_peak, stage_peak)
+
+        if profiler.callback is not None:
+            profiler.callback(self.record)
+
+        return False
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+class _NullStage(object):
+    """ Stand-in returned by stage() when nothing is being recorded """
+
+    __slots__ = ()
+
+    def count(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **counts):
+    """ Returns a context manager timing the named stage for the active
+        profiler (a no-op if there is none). Counts (lines=...,
+        atoms=...) can be given here or added with count() on the object
+        returned by the with statement.
+    """
+
+    if not _ACTIVE:
+        return _NULL_STAGE
+
+    return _Stage(_ACTIVE[-1], name, counts)
+
+
+def count(**counts):
+    """ Adds counts (lines=..., atoms=...) to the innermost stage being
+        recorded, if any
+    """
+
+    if _ACTIVE and _ACTIVE[-1]._open:
+        _ACTIVE[-1]._open[-1].count(**counts)
+
+
+def profile(trace_memory=False, callback=None):
+    """ Shorthand for PDB_profiler(trace_memory, callback) """
+    return PDB_profiler(trace_memory, callback)
@@ -0,0 +1,515 @@
+# Atom selection language for PDB structures
+#
+#
+#
+#
+
+import fnmatch
+import re
+
+import numpy as np
+
+import PDBParser
+import pdbspatial
+
+
+##-------------------------------------------------------##
+##               PDB_selectionException                  ##
+##-------------------------------------------------------##
+
+class PDB_selectionException(Exception):
+        """ Generic exception from parsing or evaluating a selection """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+# selection keyword -> atom table column
+STRING_KEYWORDS = {"chain"   : "chain",
+                   "resname" : "res_name",
+                   "name"    : "atom_name",
+                   "altloc"  : "alt_location",
+                   "icode"   : "res_ins_code",
+                   "segid"   : "seg_ID",
+                   "element" : "element",
+                   "record"  : "record_name"}
+
+# integer keywords, which take values and ranges (10-20 or 10:20). index
+# is the (0 based) row of the atom in the table
+INT_KEYWORDS = {"resid"  : "res_id",
+                "local"  : "chain_local_id",
+                "serial" : "atom_id",
+                "index"  : None}
+
+# float keywords, which take a comparison (e.g. beta > 50)
+FLOAT_KEYWORDS = {"x"         : "coord_X",
+                  "y"         : "coord_Y",
+                  "z"         : "coord_Z",
+                  "occupancy" : "occupancy",
+                  "beta"      : "beta"}
+
+COMPARISONS = {"<"  : np.less,
+               "<=" : np.less_equal,
+               ">"  : np.greater,
+               ">=" : np.greater_equal,
+               "==" : np.equal,
+               "!=" : np.not_equal}
+
+OPERATORS = ("and", "or", "not", "within", "of", "byres", "all", "none", "(", ")")
+
+_TOKEN = re.compile(r"\(|\)|[<>!=]=|[<>]|[^\s()<>=!]+")
+_RANGE = re.compile(r"^(-?\d+)[-:](-?\d+)$")
+
+
+
+##-------------------------------------------------------##
+##                    PDB_selection                      ##
+##-------------------------------------------------------##
+
+class PDB_selection(object):
+    """ A selection query compiled once into a tree of mask functions,
+        which can then be evaluated against any atom table.
+
+        Grammar (keywords are case insensitive, values are not)
+
+            chain A B            resname HIS HIE      name CA C* H?1
+            altloc A             icode A              segid PROT
+            element C            record ATOM
+            resid 1 5-10 20:30   local 1-3            serial 1-100
+            index 0-9            (0 based table row)
+            beta > 50            occupancy <= 0.5     x/y/z < 10.0
+            within 5.0 of <selection>  (atoms within 5 A of the selection)
+            byres <selection>          (whole residues of the selection)
+            all                  none
+            <selection> and <selection>, ... or ..., not ..., ( ... )
+
+        String values may use shell wildcards (*, ?, [..]). "and" binds
+        tighter than "or", so "a or b and c" is "a or (b and c)". A list 
+        of values runs up to the next operator or lower case keyword.
+    """
+
+    def __init__(self, text):
+        """
+            # INPUT
+            text  :   String selection query
+        """
+
+        self.text = text
+        self.__tokens = _TOKEN.findall(text)
+        self.__position = 0
+
+        if len(self.__tokens) == 0:
+            raise PDB_selectionException("Empty selection")
+
+        self.__evaluate = self.__parse_or()
+
+        if self.__position != len(self.__tokens):
+            self.__error("Unexpected '" + self.__tokens[self.__position] + "'")
+
+    def mask(self, table):
+        """ Evaluates the selection against table
+
+            # INPUT
+            table :   PDB_atom_table
+
+            # OUTPUT
+            -     :   Bool array with one entry per atom row
+        """
+
+        return self.__evaluate(_Context(table))
+
+    def indices(self, table):
+        """ Rows of table matched by the selection (in row order) """
+
+        return np.flatnonzero(self.mask(table))
+
+    def __str__(self):
+        return "<PDB_selection '" + self.text + "'>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+    ## recursive descent parser - every rule returns a function of a
+    ## _Context which gives the atom mask
+
+    def __peek(self):
+        if self.__position < len(self.__tokens):
+            return self.__tokens[self.__position]
+        return None
+
+    def __next(self):
+        token = self.__peek()
+        if token is None:
+            self.__error("Unexpected end of selection")
+        self.__position += 1
+        return token
+
+    def __error(self, msg):
+        raise PDB_selectionException(msg + " in selection '" + self.text + "' (at token " + str(self.__position + 1) + ")")
+
+    def __keyword(self):
+        token = self.__peek()
+        if token is None:
+            return None
+        return token.lower()
+
+    def __parse_or(self):
+        terms = [self.__parse_and()]
+        while self.__keyword() == "or":
+            self.__next()
+            terms.append(self.__parse_and())
+
+        if len(terms) == 1:
+            return terms[0]
+
+        def evaluate(context):
+            mask = terms[0](context)
+            for term in terms[1:]:
+                mask = mask | term(context)
+            return mask
+        return evaluate
+
+    def __parse_and(self):
+        terms = [self.__parse_not()]
+        while self.__keyword() == "and":
+            self.__next()
+            terms.append(self.__parse_not())
+
+        if len(terms) == 1:
+            return terms[0]
+
+        def evaluate(context):
+            mask = terms[0](context)
+            for term in terms[1:]:
+                mask = mask & term(context)
+            return mask
+        return evaluate
+
+    def __parse_not(self):
+        keyword = self.__keyword()
+
+        if keyword == "not":
+            self.__next()
+            term = self.__parse_not()
+            return lambda context: ~term(context)
+
+        if keyword == "byres":
+            self.__next()
+            term = self.__parse_not()
+            return lambda context: context.whole_residues(term(context))
+
+        if keyword == "within":
+            self.__next()
+            distance = self.__number(self.__next())
+            if self.__keyword() != "of":
+                self.__error("Expected 'of' after 'within " + str(distance) + "'")
+            self.__next()
+            term = self.__parse_not()
+            return lambda context: context.within(distance, term(context))
+
+        return self.__parse_primary()
+
+    def __parse_primary(self):
+        token = self.__next()
+        keyword = token.lower()
+
+        if token == "(":
+            term = self.__parse_or()
+            if self.__next() != ")":
+                self.__error("Expected ')'")
+            return term
+
+        if keyword == "all":
+            return lambda context: np.ones(context.n_atoms, dtype=bool)
+
+        if keyword == "none":
+            return lambda context: np.zeros(context.n_atoms, dtype=bool)
+
+        if keyword in STRING_KEYWORDS:
+            return self.__string_clause(STRING_KEYWORDS[keyword], self.__values(keyword))
+
+        if keyword in INT_KEYWORDS:
+            return self.__int_clause(INT_KEYWORDS[keyword], self.__values(keyword))
+
+        if keyword in FLOAT_KEYWORDS:
+            return self.__float_clause(FLOAT_KEYWORDS[keyword], keyword)
+
+        self.__position -= 1
+        self.__error("Unknown keyword '" + token + "'")
+
+    def __values(self, keyword):
+        """ Collects the values following a keyword, up to the next
+            keyword or operator
+        """
+
+        values = []
+        while True:
+            token = self.__peek()
+            if token is None:
+                break
+            # operators end a value list in any case, but other keywords
+            # only in lower case so that e.g. "chain X Y" works
+            if token.lower() in OPERATORS or token in STRING_KEYWORDS or token in INT_KEYWORDS or token in FLOAT_KEYWORDS:
+                break
+            values.append(self.__next())
+
+        if len(values) == 0:
+            self.__error("No values given for '" + keyword + "'")
+
+        return values
+
+    def __number(self, token):
+        try:
+            return float(token)
+        except ValueError:
+            self.__error("Expected a number but found '" + token + "'")
+
+    def __string_clause(self, column, values):
+        exact = [i for i in values if not _is_pattern(i)]
+        patterns = [i for i in values if _is_pattern(i)]
+
+        def evaluate(context):
+            # compare the distinct values of the column (usually a
+            # handful) and map back to the atoms
+            (unique, inverse) = context.unique(column)
+            matched = np.zeros(len(unique), dtype=bool)
+
+            for (i, value) in enumerate(unique.tolist()):
+                value = str(value).strip()
+                if value in exact:
+                    matched[i] = True
+                else:
+                    for pattern in patterns:
+                        if fnmatch.fnmatchcase(value, pattern):
+                            matched[i] = True
+                            break
+
+            return matched[inverse]
+        return evaluate
+
+    def __int_clause(self, column, values):
+        singles = []
+        ranges = []
+        for value in values:
+            match = _RANGE.match(value)
+            if match:
+                ranges.append((int(match.group(1)), int(match.group(2))))
+            else:
+                try:
+                    singles.append(int(value))
+                except ValueError:
+                    self.__error("Expected an integer or range but found '" + value + "'")
+
+        singles = np.array(singles, dtype=np.int64)
+
+        def evaluate(context):
+            if column is None:
+                array = np.arange(context.n_atoms)
+            else:
+                array = getattr(context.table, column)
+
+            mask = np.in1d(array, singles)
+            for (low, high) in ranges:
+                mask |= (array >= low) & (array <= high)
+            return mask
+        return evaluate
+
+    def __float_clause(self, column, keyword):
+        operator = self.__next()
+        if operator not in COMPARISONS:
+            self.__error("Expected a comparison (" + " ".join(sorted(COMPARISONS)) + ") after '" + keyword + "'")
+
+        comparison = COMPARISONS[operator]
+        value = self.__number(self.__next())
+
+        def evaluate(context):
+            if column in PDBParser.PDB_atom_table.COORD_COLUMNS:
+                array = context.table.coords[:, PDBParser.PDB_atom_table.COORD_COLUMNS.index(column)]
+            else:
+                array = getattr(context.table, column)
+            return comparison(array, value)
+        return evaluate
+
+##-------------------END-OF-CLASS------------------------##
+
+
+def _is_pattern(value):
+    return "*" in value or "?" in value or "[" in value
+
+
+class _Context(object):
+    """ Per evaluation state - the table plus anything worth computing
+        only once per evaluation (e.g. distinct column values)
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.n_atoms = len(table)
+        self.__unique = {}
+
+    def unique(self, column):
+        if column not in self.__unique:
+            self.__unique[column] = np.unique(getattr(self.table, column), return_inverse=True)
+        return self.__unique[column]
+
+    def whole_residues(self, mask):
+        residue_of = np.searchsorted(self.table.residue_offsets, np.arange(self.n_atoms), side="right") - 1
+        selected = np.zeros(self.table.n_residues, dtype=bool)
+        selected[residue_of[mask]] = True
+        return selected[residue_of]
+
+    def within(self, distance, mask):
+        if not mask.any():
+            return np.zeros(self.n_atoms, dtype=bool)
+
+        index = pdbspatial.PDB_cell_list(self.table.coords[mask], cell_size=max(distance, 1.0))
+        return index.any_within(self.table.coords, distance)
+
+
+
+##-------------------------------------------------------##
+##                 PDB_atom_selection                    ##
+##-------------------------------------------------------##
+
+class PDB_atom_selection(object):
+    """ The atoms matched by a selection - a view onto a set of rows of a
+        PDB_atom_table. Edits made through the selection act on all of
+        its atoms (or residues) at once and are written straight into the
+        table.
+    """
+
+    def __init__(self, table, indices):
+        self.table = table
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    @property
+    def atoms(self):
+        return [PDBParser.PDB_atom(table=self.table, index=int(i)) for i in self.indices]
+
+    @property
+    def coords(self):
+        return self.table.coords[self.indices]
+
+    def residue_indices(self):
+        """ Indices (in the table) of the residues with at least one
+            selected atom
+        """
+        return np.unique(np.searchsorted(self.table.residue_offsets, self.indices, side="right") - 1)
+
+    def residues(self):
+        return [PDBParser.PDB_residue(self.table, int(i)) for i in self.residue_indices()]
+
+    def get_values(self, column):
+        """ Array of the column values of the selected atoms """
+        if column in PDBParser.PDB_atom_table.COORD_COLUMNS:
+            return self.table.coords[self.indices, PDBParser.PDB_atom_table.COORD_COLUMNS.index(column)]
+        return getattr(self.table, column)[self.indices]
+
+    def set_value(self, column, value):
+        """ Sets column to value for every selected atom """
+        self.table.set_value(column, self.indices, value)
+
+    def rename_atoms(self, newName):
+        self.set_value("atom_name", newName)
+
+    def rename_residues(self, newName):
+        """ Renames every residue with a selected atom (all of its atoms,
+            not only the selected ones)
+        """
+        for i in self.residue_indices():
+            (start, stop) = self.table.get_residue_range(i)
+            self.table.set_value("res_name", slice(start, stop), newName)
+
+    def set_residue_order(self, atomname_list):
+        """ Reorders the atoms of every residue with a selected atom (see
+            PDB_residue.set_residue_order)
+        """
+        for residue in self.residues():
+            residue.set_residue_order(atomname_list)
+
+    def centroid(self, mass_weighted=False):
+        """ Centre of geometry (or of mass) of the selected atoms """
+
+        import pdbgeometry
+
+        return pdbgeometry.centroid(self, mass_weighted)
+
+    def radius_of_gyration(self, mass_weighted=False):
+        """ Radius of gyration of the selected atoms """
+
+        import pdbgeometry
+
+        return pdbgeometry.radius_of_gyration(self, mass_weighted)
+
+    def rmsd(self, other, superpose=True):
+        """ RMSD of the selected atoms from other (e.g. the same selection
+            of another structure) after optimal superposition, unless 
+            superpose=False (see pdbgeometry)
+        """
+
+        import pdbgeometry
+
+        return pdbgeometry.rmsd(self, other, superpose)
+
+    def __str__(self):
+        return "<PDB_atom_selection of " + str(len(self.indices)) + " atoms>"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __getitem__(self, indx):
+        return self.atoms[indx]
+
+    def __iter__(self):
+        for i in self.indices:
+            yield PDBParser.PDB_atom(table=self.table, index=int(i))
+
+    def __len__(self):
+        return len(self.indices)
+
+##-------------------END-OF-CLASS------------------------##
+
+
+# compiled queries, so repeated select() calls with the same text are only
+# parsed once
+_COMPILED = {}
+_COMPILED_LIMIT = 256
+
+def compile_selection(query):
+    """ Returns the compiled PDB_selection for query (a string, or an
+        already compiled PDB_selection which is returned as is)
+    """
+
+    if isinstance(query, PDB_selection):
+        return query
+
+    if query not in _COMPILED:
+        if len(_COMPILED) >= _COMPILED_LIMIT:
+            _COMPILED.clear()
+        _COMPILED[query] = PDB_selection(query)
+
+    return _COMPILED[query]
+
+
+def select(table, query, rows=None):
+    """ Selects atoms from table
+
+        # INPUT
+        table :   PDB_atom_table
+        query :   String or PDB_selection
+        rows  :   Optional slice/range of rows the selection is limited to
+
+        # OUTPUT
+        -     :   PDB_atom_selection
+    """
+
+    mask = compile_selection(query).mask(table)
+
+    if rows is not None:
+        limit = np.zeros(len(mask), dtype=bool)
+        limit[rows] = True
+        mask &= limit
+
+    return PDB_atom_selection(table, np.flatnonzero(mask))
@@ -0,0 +1,443 @@
+# Python class for neighbour and contact queries on PDB structures
+#
+#
+#
+#
+
+import numpy as np
+
+import PDBParser
+
+
+##-------------------------------------------------------##
+##               PDB_spatialException                    ##
+##-------------------------------------------------------##
+
+class PDB_spatialException(Exception):
+        """ Generic exception from spatial index errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                    PDB_cell_list                      ##
+##-------------------------------------------------------##
+
+class PDB_cell_list(object):
+    """ Uniform cell list over the atom coordinates of a PDB_file, a
+        PDB_chain, a PDB_atom_table or a plain (N,3) coordinate array.
+
+        Space is divided into cubic cells of side cell_size and the atoms
+        are sorted by cell, so every query only looks at the atoms in the
+        cells around it rather than at every atom.
+
+        All results are index arrays of atom rows - rows of the source's
+        PDB_atom_table (which are also the positions in PDB_file.atoms),
+        or positions in the array when built from a coordinate array.
+        Residue results are residue indices in the table.
+
+        The index holds a copy of the coordinates. After coordinates have
+        been changed call update(), which re-reads them and re-sorts the
+        atoms into cells (a single vectorized sort).
+    """
+
+    # the 13 cell offsets which, with the cell itself, visit every pair
+    # of neighbouring cells exactly once
+    HALF_SHELL = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
+
+    def __init__(self, source, cell_size=5.0):
+        """
+            # INPUT
+            source    :   PDB_file, PDB_chain, PDB_atom_table or (N,3)
+                          float array
+            cell_size :   Side of a cell (in Angstroms). Queries are
+                          fastest when the cutoff is about cell_size
+        """
+
+        if cell_size <= 0:
+            raise PDB_spatialException("cell_size must be positive (got " + str(cell_size) + ")")
+
+        self.cell_size = float(cell_size)
+
+        self.table = None
+        self.first_residue = 0
+        self.n_residues = 0
+
+        if isinstance(source, PDBParser.PDB_file):
+            self.table = source.table
+            self.rows = np.arange(len(self.table))
+            self.n_residues = self.table.n_residues
+
+        elif isinstance(source, PDBParser.PDB_chain):
+            self.table = source.table
+            (first_res, last_res) = self.table.get_chain_range(source._index)
+            self.rows = np.arange(self.table.residue_offsets[first_res], self.table.residue_offsets[last_res])
+            self.first_residue = first_res
+            self.n_residues = last_res - first_res
+
+        elif isinstance(source, PDBParser.PDB_atom_table):
+            self.table = source
+            self.rows = np.arange(len(self.table))
+            self.n_residues = self.table.n_residues
+
+        else:
+            coords = np.asarray(source, dtype=np.float64)
+            if coords.ndim != 2 or coords.shape[1] != 3:
+                raise PDB_spatialException("Coordinates must be an (N,3) array (got shape " + str(coords.shape) + ")")
+            self.__source_coords = coords
+            self.rows = np.arange(len(coords))
+
+        self.update()
+
+
+    def update(self):
+        """ Re-reads the atom coordinates and rebuilds the cell list """
+
+        if self.table is not None:
+            coords = self.table.coords[self.rows]
+        else:
+            coords = np.array(self.__source_coords, dtype=np.float64)
+
+        if not np.isfinite(coords).all():
+            raise PDB_spatialException("Can not build a cell list over non-finite coordinates")
+
+        self.coords = coords
+
+        if len(coords) == 0:
+            self.origin = np.zeros(3)
+            self.dims = np.ones(3, dtype=np.int64)
+        else:
+            self.origin = coords.min(axis=0)
+            self.dims = np.floor((coords.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1
+
+        cells = self.__cell_of(coords)
+
+        # atoms sorted by cell, and the [start, stop) block of each
+        # occupied cell in that order
+        self.order = np.argsort(self.__keys(cells), kind="mergesort")
+        self.sorted_cells = cells[self.order]
+
+        sorted_keys = self.__keys(self.sorted_cells)
+        self.cell_keys = np.unique(sorted_keys)
+        self.cell_start = np.searchsorted(sorted_keys, self.cell_keys, side="left")
+        self.cell_stop = np.searchsorted(sorted_keys, self.cell_keys, side="right")
+
+    def query_radius(self, point, radius):
+        """ Atoms within radius of point, nearest first
+
+            # INPUT
+            point  :   Sequence of 3 floats
+            radius :   Float
+
+            # OUTPUT
+            -      :   Int array of atom rows
+        """
+
+        (local, distance) = self.__within(np.asarray(point, dtype=np.float64), radius)
+
+        return self.rows[local[np.argsort(distance, kind="mergesort")]]
+
+    def query_atom(self, row, radius):
+        """ Atoms within radius of the atom at row (the atom itself
+            included), nearest first
+        """
+
+        return self.query_radius(self.__coordinate_of(row), radius)
+
+    def query_residue(self, residue_index, radius):
+        """ Atoms within radius of any atom of residue residue_index (the
+            residue's own atoms included), in row order
+        """
+
+        (start, stop) = self.__residue_rows(residue_index)
+
+        hits = [self.__within(self.__coordinate_of(row), radius)[0] for row in xrange(start, stop)]
+        if len(hits) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return self.rows[np.unique(np.concatenate(hits))]
+
+    def k_nearest(self, point, k):
+        """ The k atoms nearest to point (fewer if there are not k atoms),
+            nearest first
+
+            # INPUT
+            point  :   Sequence of 3 floats
+            k      :   Int
+
+            # OUTPUT
+            -      :   (Int array of atom rows, float array of distances)
+        """
+
+        point = np.asarray(point, dtype=np.float64)
+        k = min(int(k), len(self.coords))
+
+        if k <= 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        # grow the search sphere until it holds k atoms - the k nearest
+        # are then certainly inside it
+        radius = self.cell_size
+        while True:
+            (local, distance) = self.__within(point, radius)
+            if len(local) >= k:
+                break
+            radius = radius * 2
+
+        nearest = np.argsort(distance, kind="mergesort")[:k]
+
+        return (self.rows[local[nearest]], distance[nearest])
+
+    def pairs_within(self, cutoff, chunk=65536):
+        """ Every pair of atoms closer than (or at) cutoff
+
+            # INPUT
+            cutoff :   Float
+            chunk  :   Number of atoms whose candidate pairs are built at
+                       a time (bounds the memory used)
+
+            # OUTPUT
+            -      :   (i, j) Int arrays of atom rows with i < j, sorted
+                       by i then j
+        """
+
+        reach = int(np.ceil(cutoff / self.cell_size))
+
+        if reach <= 1:
+            offsets = [(0, 0, 0)] + self.HALF_SHELL
+        else:
+            span = range(-reach, reach + 1)
+            offsets = [(dx, dy, dz) for dx in span for dy in span for dz in span if (dx, dy, dz) >= (0, 0, 0)]
+
+        cutoff_sq = float(cutoff) * cutoff
+        sorted_coords = self.coords[self.order]
+        n_atoms = len(sorted_coords)
+
+        first = []
+        second = []
+        for offset in offsets:
+            for start in xrange(0, n_atoms, chunk):
+                atoms = np.arange(start, min(start + chunk, n_atoms))
+                (i, j) = self.__candidate_pairs(atoms, offset)
+
+                if offset == (0, 0, 0):
+                    keep = j > i
+                    (i, j) = (i[keep], j[keep])
+
+                delta = sorted_coords[i] - sorted_coords[j]
+                close = np.einsum("ij,ij->i", delta, delta) <= cutoff_sq
+
+                first.append(self.order[i[close]])
+                second.append(self.order[j[close]])
+
+        if len(first) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        first = self.rows[np.concatenate(first)]
+        second = self.rows[np.concatenate(second)]
+
+        (low, high) = (np.minimum(first, second), np.maximum(first, second))
+
+        # each pair is found once, so sorting on one combined key is enough
+        order = np.argsort(low * (self.rows[-1] + 1) + high)
+
+        return (low[order], high[order])
+
+    def any_within(self, points, radius, chunk=65536):
+        """ For each of a set of points, whether any atom of the index lies
+            within radius of it
+
+            # INPUT
+            points :   (M,3) float array
+            radius :   Float
+            chunk  :   Number of points handled at a time
+
+            # OUTPUT
+            -      :   (M,) bool array
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        hits = np.zeros(len(points), dtype=bool)
+
+        if len(self.coords) == 0:
+            return hits
+
+        reach = int(np.ceil(radius / self.cell_size))
+        span = np.arange(-reach, reach + 1)
+        offsets = np.array([(dx, dy, dz) for dx in span for dy in span for dz in span], dtype=np.int64)
+
+        radius_sq = float(radius) * radius
+
+        for start in xrange(0, len(points), chunk):
+            block = points[start:start + chunk]
+            cells = self.__cell_of(block)
+
+            for offset in offsets:
+                neighbours = cells + offset
+                inside = np.flatnonzero(((neighbours >= 0) & (neighbours < self.dims)).all(axis=1))
+
+                (found, position) = self.__occupied(self.__keys(neighbours[inside]))
+                inside = inside[found]
+
+                counts = self.cell_stop[position] - self.cell_start[position]
+                i = np.repeat(inside, counts)
+                j = self.order[_expand_ranges(self.cell_start[position], self.cell_stop[position])]
+
+                delta = block[i] - self.coords[j]
+                close = i[np.einsum("ij,ij->i", delta, delta) <= radius_sq]
+                hits[start + close] = True
+
+        return hits
+
+    def residue_contacts(self, cutoff):
+        """ Every pair of different residues with at least one pair of
+            atoms within cutoff of each other
+
+            # OUTPUT
+            -      :   (i, j) Int arrays of residue indices with i < j
+        """
+
+        if self.table is None:
+            raise PDB_spatialException("Residue contacts need a PDB_file, PDB_chain or PDB_atom_table")
+
+        (first, second) = self.pairs_within(cutoff)
+
+        residue_of = np.searchsorted(self.table.residue_offsets, np.arange(len(self.table)), side="right") - 1
+        (res_i, res_j) = (residue_of[first], residue_of[second])
+
+        different = res_i != res_j
+        (low, high) = (np.minimum(res_i, res_j)[different], np.maximum(res_i, res_j)[different])
+
+        if len(low) == 0:
+            return (low, high)
+
+        pairs = np.unique(low * self.table.n_residues + high)
+
+        return (pairs // self.table.n_residues, pairs % self.table.n_residues)
+
+    def contact_map(self, cutoff):
+        """ Symmetric boolean residue-residue contact map over the
+            residues indexed (for a chain, position 0 is the chain's first
+            residue). A residue is always in contact with itself.
+        """
+
+        (res_i, res_j) = self.residue_contacts(cutoff)
+
+        contacts = np.eye(self.n_residues, dtype=bool)
+        contacts[res_i - self.first_residue, res_j - self.first_residue] = True
+        contacts[res_j - self.first_residue, res_i - self.first_residue] = True
+
+        return contacts
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __str__(self):
+        return "<PDB_cell_list of " + str(len(self)) + " atoms in " + str(len(self.cell_keys)) + " cells of " + str(self.cell_size) + " A>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+    def __cell_of(self, coords):
+        return np.floor((coords - self.origin) / self.cell_size).astype(np.int64)
+
+    def __keys(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def __coordinate_of(self, row):
+        """ Coordinates of an atom given as a row of the source """
+
+        local = np.searchsorted(self.rows, row)
+        if local >= len(self.rows) or self.rows[local] != row:
+            raise PDB_spatialException("Atom " + str(row) + " is not in this cell list")
+
+        return self.coords[local]
+
+    def __residue_rows(self, residue_index):
+        if self.table is None:
+            raise PDB_spatialException("Residue queries need a PDB_file, PDB_chain or PDB_atom_table")
+
+        if residue_index < self.first_residue or residue_index >= self.first_residue + self.n_residues:
+            raise PDB_spatialException("Residue " + str(residue_index) + " is not in this cell list")
+
+        return self.table.get_residue_range(residue_index)
+
+    def __within(self, point, radius):
+        """ Local indices and distances of the atoms within radius of
+            point
+        """
+
+        if len(self.coords) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        low = np.maximum(self.__cell_of((point - radius)[np.newaxis])[0], 0)
+        high = np.minimum(self.__cell_of((point + radius)[np.newaxis])[0], self.dims - 1)
+
+        if (high < low).any():
+            return (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        grid = np.mgrid[low[0]:high[0]+1, low[1]:high[1]+1, low[2]:high[2]+1].reshape(3, -1).T
+        keys = self.__keys(grid)
+
+        (found, position) = self.__occupied(keys)
+
+        if len(position) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        candidates = self.order[_expand_ranges(self.cell_start[position], self.cell_stop[position])]
+
+        distance = np.sqrt(((self.coords[candidates] - point)**2).sum(axis=1))
+        inside = distance <= radius
+
+        return (candidates[inside], distance[inside])
+
+    def __occupied(self, keys):
+        """ Which of keys are occupied cells, and the positions in 
+            cell_keys of those which are
+        """
+
+        position = np.searchsorted(self.cell_keys, keys)
+        found = position < len(self.cell_keys)
+        found[found] = self.cell_keys[position[found]] == keys[found]
+
+        return (found, position[found])
+
+    def __candidate_pairs(self, atoms, offset):
+        """ (i, j) positions in the sorted atom order of every atom in
+            atoms paired with every atom in the cell at offset from its
+            own cell
+        """
+
+        cells = self.sorted_cells[atoms] + np.array(offset, dtype=np.int64)
+        inside = ((cells >= 0) & (cells < self.dims)).all(axis=1)
+
+        (atoms, cells) = (atoms[inside], cells[inside])
+        (found, position) = self.__occupied(self.__keys(cells))
+        atoms = atoms[found]
+
+        counts = self.cell_stop[position] - self.cell_start[position]
+        i = np.repeat(atoms, counts)
+        j = _expand_ranges(self.cell_start[position], self.cell_stop[position])
+
+        return (i, j)
+
+##-------------------END-OF-CLASS------------------------##
+
+
+def _expand_ranges(starts, stops):
+    """ Concatenation of arange(start, stop) for every (start, stop) pair,
+        without a Python loop
+    """
+
+    counts = stops - starts
+    total = counts.sum()
+
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+
+    return offsets + np.arange(total)
@@ -0,0 +1,307 @@
+# Python class for random access to multi-MODEL PDB trajectories
+#
+#
+#
+#
+
+from collections import OrderedDict
+import tempfile
+
+import numpy as np
+
+import PDBParser
+import pdbio
+
+
+##-------------------------------------------------------##
+##               PDB_trajectoryException                 ##
+##-------------------------------------------------------##
+
+class PDB_trajectoryException(Exception):
+        """ Generic exception from PDB_trajectory errors """
+        pass
+
+##-------------------END-OF-CLASS------------------------##
+
+
+
+##-------------------------------------------------------##
+##                   PDB_trajectory                      ##
+##-------------------------------------------------------##
+
+class PDB_trajectory(object):
+    """ Multi-MODEL PDB file (e.g. MD output) read as a trajectory.
+
+        The file is scanned once on opening to build a frame index - the
+        byte offset of every MODEL record. The topology (chains, residues,
+        names and ordering) is parsed once from the first frame into a
+        PDB_file, and each frame's coordinates are only read and parsed
+        when that frame is asked for, so frame 40000 can be loaded
+        without touching frames 1-39999.
+
+        Frames are returned as read-only (n_atoms,3) float arrays with rows
+        in the same order as topology.table. The last cache_size decoded
+        frames are kept in an LRU cache (cache_size=0 disables caching).
+
+        Records other than ATOM/TER (HETATM, CONECT, REMARK, ...) are
+        kept as lines in the header and footer of a PDB_file, so they are
+        not part of the frame arrays - load_frame puts each frame's own
+        records into topology along with its coordinates.
+
+        A file with no MODEL records is read as a single frame. A gzip,
+        bz2 or xz compressed file is decompressed once (a block at a 
+        time) into a temporary file, which frames are then read from.
+    """
+
+    def __init__(self, filename, cache_size=16, block_size=1<<20):
+        """
+            # INPUT
+            filename   :   String (optionally compressed)
+            cache_size :   Number of decoded frames to keep in memory
+            block_size :   Bytes read at a time while indexing the file
+        """
+
+        self.filename   = filename
+        self.cache_size = cache_size
+
+        self.__handle = self.__open(filename, block_size)
+        self.__cache  = OrderedDict()
+
+        self.offsets = self.__index_frames(self.__handle, block_size)
+
+        # lines before the first MODEL record, which every frame shares
+        self.__handle.seek(0)
+        self.__preamble = self.__handle.read(self.offsets[0]).splitlines(True)
+
+        self.topology = self.__parse_topology()
+        self.n_atoms  = len(self.topology.table)
+
+
+    def get_frame(self, index):
+        """ Returns the coordinates of frame index (counting from 0,
+            negative values count back from the last frame)
+
+            # INPUT
+            index :     Int
+
+            # OUTPUT
+            -     :     (n_atoms,3) float array
+        """
+
+        return self.__get_frame(self.__frame_index(index))[0]
+
+    def load_frame(self, index):
+        """ Loads the coordinates of frame index into topology (see 
+            PDB_file.load_coordinates), replaces the header and footer of
+            topology with the frame's own (so its HETATM, CONECT, ... 
+            records are written with it) and returns it, so every frame 
+            can be written out without parsing the topology again
+
+                for i in xrange(len(trajectory)):
+                    trajectory.load_frame(i).write_file("frame%i.pdb" % i)
+
+            # INPUT
+            index :     Int
+
+            # OUTPUT
+            -     :     PDBParser.PDB_file
+        """
+
+        (coords, header, footer) = self.__get_frame(self.__frame_index(index))
+
+        self.topology.load_coordinates(coords)
+        self.topology.header = self.__preamble + header
+        self.topology.footer = footer
+
+        return self.topology
+
+    def read_frame_bytes(self, index):
+        """ Returns the raw text of frame index (from its MODEL record up
+            to the next MODEL record or the end of the file)
+        """
+
+        start = self.offsets[index]
+        stop  = self.offsets[index + 1]
+
+        self.__handle.seek(start)
+        return self.__handle.read(stop - start)
+
+    def read_frame_lines(self, index):
+        """ Returns the raw lines of frame index (from its MODEL record
+            up to the next MODEL record or the end of the file)
+        """
+
+        return self.read_frame_bytes(index).splitlines(True)
+
+    def close(self):
+        self.__handle.close()
+        self.__cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_frame(i) for i in xrange(*index.indices(len(self)))]
+        return self.get_frame(index)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self.get_frame(index)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __str__(self):
+        return "<PDB_trajectory " + str(self.filename) + " - [" + str(len(self)) + " frames of " + str(self.n_atoms) + " atoms]>"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+    def __frame_index(self, index):
+        """ index checked against the number of frames, with negative 
+            values counted back from the last frame
+        """
+
+        n_frames = len(self)
+        if index < 0:
+            index = index + n_frames
+
+        if index < 0 or index >= n_frames:
+            raise IndexError("Frame " + str(index) + " is out of range (trajectory has " + str(n_frames) + " frames)")
+
+        return index
+
+    def __get_frame(self, index):
+        """ (coords, header, footer) of frame index, from the cache if it
+            is there
+        """
+
+        if index in self.__cache:
+            # move to the most recently used end
+            frame = self.__cache.pop(index)
+            self.__cache[index] = frame
+            return frame
+
+        frame = self.__parse_frame(index)
+
+        if self.cache_size > 0:
+            self.__cache[index] = frame
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+
+        return frame
+
+    def __open(self, filename, block_size):
+        """ Opens filename for random access - a compressed file as a
+            temporary file holding its decompressed text
+        """
+
+        handle = open(filename, "rb")
+        if pdbio.compression_from_magic(handle.read(pdbio.MAGIC_LENGTH)) is None:
+            handle.seek(0)
+            return handle
+
+        handle.close()
+
+        text = tempfile.TemporaryFile()
+        try:
+            for chunk in pdbio.iter_chunks(filename, block_size):
+                text.write(chunk)
+        except:
+            text.close()
+            raise
+
+        text.seek(0)
+        return text
+
+    def __index_frames(self, handle, block_size):
+        """ Scans the file once and returns the byte offsets of the MODEL
+            records followed by the file size, so frame i occupies bytes
+            offsets[i]:offsets[i+1]. Without MODEL records the whole file
+            is one frame.
+        """
+
+        offsets = []
+
+        # a MODEL record is only recognised at the start of a line. The
+        # last 5 characters of each block are carried over so a record
+        # split across two blocks is still found (and can not be found
+        # twice). The leading newline lets a MODEL on the first line match
+        tail = "\n"
+        position = 0
+
+        handle.seek(0)
+        while True:
+            block = handle.read(block_size)
+            if not block:
+                break
+
+            text = tail + block
+            base = position - len(tail)
+
+            found = text.find("\nMODEL")
+            while found != -1:
+                offsets.append(base + found + 1)
+                found = text.find("\nMODEL", found + 1)
+
+            position = position + len(block)
+            tail = text[-5:]
+
+        if len(offsets) == 0:
+            offsets = [0]
+
+        offsets.append(position)
+
+        return np.array(offsets, dtype=np.int64)
+
+    def __parse_topology(self):
+        """ Parses the first frame (together with any header lines before
+            it) into a PDB_file. MODEL/ENDMDL records are dropped so the
+            topology can be written out as a single structure.
+        """
+
+        self.__handle.seek(0)
+        content = self.__handle.read(self.offsets[1]).splitlines(True)
+
+        return PDBParser.PDB_file.from_lines(_frame_lines(content))
+
+    def __parse_frame(self, index):
+        """ Reads and parses the coordinates of frame index, reordered to
+            match the rows of the topology table, along with the frame's
+            header and footer lines (see _frame_lines)
+        """
+
+        raw = self.read_frame_bytes(index)
+        (header, footer, atom_numbers, starts, stops) = PDBParser.PDB_chain_index.split_records(raw)
+
+        if len(starts) != self.n_atoms:
+            raise PDB_trajectoryException("Frame " + str(index) + " has " + str(len(starts)) + " atoms but the topology has " + str(self.n_atoms))
+
+        coords = PDBParser.PDB_atom.parse_text_coordinates(raw, starts, stops)[self.topology.table.source_rows]
+        coords.flags.writeable = False
+
+        return (coords, _frame_lines(header), _frame_lines(footer))
+
+##-------------------END-OF-CLASS------------------------##
+
+
+def _frame_lines(lines):
+    """ The lines of a frame without its MODEL record, and up to its 
+        ENDMDL record - anything after that (e.g. the END of the file) 
+        belongs to the file rather than to the frame
+    """
+
+    kept = []
+    for line in lines:
+        record = PDBParser.record_name(line)
+        if record == "ENDMDL":
+            break
+        if record != "MODEL":
+            kept.append(line)
+
+    return kept
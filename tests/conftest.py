@@ -0,0 +1,87 @@
+# Shared fixtures for the PDBParser tests
+#
+# The modules are flat files in the repository root (and the synthetic
+# structure generator lives with the benchmarks), so both directories
+# are put on the path here.
+#
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pytest
+
+import PDBParser
+import synthetic
+
+
+def same_column(a, b):
+    """ Elementwise equality of two table columns, NaN equal to NaN """
+
+    if a.shape != b.shape:
+        return False
+
+    if a.dtype.kind == "f":
+        return bool(((a == b) | (np.isnan(a) & np.isnan(b))).all())
+
+    return bool((a == b).all())
+
+
+def assert_same_table(a, b, columns=None):
+    """ Asserts two atom tables hold the same atoms and boundaries """
+
+    assert len(a) == len(b)
+
+    for name in columns or a.column_names():
+        assert same_column(getattr(a, name), getattr(b, name)), name
+
+    assert (a.residue_offsets == b.residue_offsets).all()
+    assert (a.chain_offsets == b.chain_offsets).all()
+
+
+def write_synthetic(path, n_atoms, n_chains=1, fixed_width=True, n_models=1):
+    """ Writes a synthetic structure to path (a py.path) and returns the
+        file name
+    """
+
+    path.dirpath().ensure(dir=True)
+
+    filename = str(path)
+    synthetic.write_structure(filename, n_atoms, n_chains, fixed_width, n_models)
+
+    return filename
+
+
+@pytest.fixture
+def fixed_file(tmpdir):
+    """ A well formatted (80 character) file of three capped chains """
+    return write_synthetic(tmpdir.join("fixed.pdb"), 3000, n_chains=3)
+
+
+@pytest.fixture
+def heuristic_file(tmpdir):
+    """ The same structure as fixed_file in whitespace separated lines """
+    return write_synthetic(tmpdir.join("heuristic.pdb"), 3000, n_chains=3, fixed_width=False)
+
+
+def first_difference(a, b):
+    """ The first (line number, line of a, line of b) where two texts
+        differ, or None - cheap to report for large files, unlike a full
+        assertion diff
+    """
+
+    (a, b) = (a.splitlines(True), b.splitlines(True))
+
+    for (number, (x, y)) in enumerate(zip(a, b)):
+        if x != y:
+            return (number, x, y)
+
+    if len(a) != len(b):
+        return (min(len(a), len(b)), None, None)
+
+    return None
@@ -0,0 +1,68 @@
+# Tests of the on-disk structure cache
+
+import os
+
+import pytest
+
+import PDBParser
+import pdbcache
+
+from conftest import assert_same_table, first_difference
+
+
+def written(pdb, path):
+    pdb.write_file(path)
+    return open(path).read()
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_cache_hit_matches_fresh_parse(tmpdir, fixed_file, mmap):
+    cache = pdbcache.PDB_cache(str(tmpdir.join("cache")), mmap=mmap)
+
+    fresh = PDBParser.PDB_file(fixed_file)
+    cache.load(fixed_file)
+    cached = cache.lookup(fixed_file)
+
+    assert cached is not None
+    assert_same_table(fresh.table, cached.table)
+    assert cached.table.chain_names == fresh.table.chain_names
+    assert (cached.header, cached.footer) == (fresh.header, fresh.footer)
+
+    # unedited atoms are copied from their lines, edited ones formatted
+    out = str(tmpdir.join("out.pdb"))
+    assert first_difference(written(cached, out), written(fresh, out)) is None
+    assert not cached.table.modified_rows().any()
+
+    for pdb in (fresh, cached):
+        pdb.rename_atom("B", 3, "CA", "CX")
+        pdb.table.coords[50] += 2.0
+
+    assert first_difference(written(cached, out), written(fresh, out)) is None
+
+
+def test_cache_miss_on_change(tmpdir, fixed_file):
+    cache = pdbcache.PDB_cache(str(tmpdir.join("cache")))
+    cache.load(fixed_file)
+
+    with open(fixed_file, "a") as f:
+        f.write("REMARK   2 APPENDED\n")
+
+    assert cache.lookup(fixed_file) is None
+
+
+def test_touch_rehashes_once(tmpdir, fixed_file, monkeypatch):
+    cache = pdbcache.PDB_cache(str(tmpdir.join("cache")))
+    cache.load(fixed_file)
+
+    stat = os.stat(fixed_file)
+    os.utime(fixed_file, (stat.st_atime, stat.st_mtime + 10))
+
+    hashed = []
+    content_hash = pdbcache._content_hash
+    monkeypatch.setattr(pdbcache, "_content_hash", lambda filename: hashed.append(filename) or content_hash(filename))
+
+    assert cache.lookup(fixed_file) is not None
+    assert cache.lookup(fixed_file) is not None
+    assert len(hashed) == 1
+
+    assert_same_table(PDBParser.PDB_file(fixed_file).table, cache.lookup(fixed_file).table)
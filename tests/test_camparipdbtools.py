@@ -0,0 +1,42 @@
+# Tests of the CAMPARI/GROMACS conversion tools
+
+import os
+
+import pytest
+
+import camparipdbtools
+
+from conftest import write_synthetic
+
+
+def test_batch_convert(tmpdir):
+    inputs = [write_synthetic(tmpdir.join("in", "a%i.pdb" % i), 500) for i in xrange(3)]
+    outputdir = str(tmpdir.join("out"))
+
+    results = camparipdbtools.batch_convert(inputs, outputdir, "CAMPARI_to_GMX", workers=1, verbose=False)
+    assert [i[2] for i in results] == ["converted"] * 3
+    assert sorted(os.listdir(outputdir)) == ["a0.pdb", "a1.pdb", "a2.pdb"]
+
+    # a second run finds the outputs up to date
+    results = camparipdbtools.batch_convert(inputs, outputdir, "CAMPARI_to_GMX", workers=1, verbose=False)
+    assert [i[2] for i in results] == ["skipped"] * 3
+
+
+def test_batch_convert_same_file_names(tmpdir):
+    inputs = [write_synthetic(tmpdir.join(i, "same.pdb"), 500) for i in ("a", "b")]
+    outputdir = str(tmpdir.join("out"))
+
+    with pytest.raises(camparipdbtools.CAMPARI_pdbException):
+        camparipdbtools.batch_convert(inputs, outputdir, "CAMPARI_to_GMX", workers=1, verbose=False)
+
+    assert not os.path.exists(outputdir)
+
+
+def test_conversions_return_residue_count(fixed_file):
+    (a, b) = (camparipdbtools.CAMPARI_pdb(fixed_file), camparipdbtools.CAMPARI_pdb(fixed_file))
+
+    changed = a.convert_from_CAMPARI_to_GMX()
+    assert changed > 0 and changed == b.convert_naming("CAMPARI", "GMX", True)
+
+    changed = a.convert_from_GMX_to_CAMPARI()
+    assert changed > 0 and changed == b.convert_naming("GMX", "CAMPARI", False)
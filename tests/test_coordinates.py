@@ -0,0 +1,92 @@
+# Tests of reading single coordinate frames into a parsed topology
+
+import numpy as np
+import pytest
+
+import PDBParser
+
+
+@pytest.fixture
+def frame(fixed_file):
+    """ A new frame of random coordinates for the atoms of fixed_file,
+        rounded to what a PDB file holds
+    """
+
+    n_atoms = len(PDBParser.PDB_file(fixed_file).table)
+    return np.round(np.random.RandomState(6).uniform(-50.0, 50.0, (n_atoms, 3)), 3)
+
+
+def write_xyz(path, coords, labels):
+    lines = ["%i\n" % len(coords), "frame\n"]
+    lines += ["%s %.3f %.3f %.3f\n" % ((label,) + tuple(xyz)) for (label, xyz) in zip(labels, coords)]
+    path.write("".join(lines))
+
+    return str(path)
+
+
+def test_frame_formats(tmpdir, fixed_file, frame):
+    moved = PDBParser.PDB_file(fixed_file)
+    moved.table.coords[:] = frame
+    moved.write_file(str(tmpdir.join("moved.pdb")))
+
+    xyz = write_xyz(tmpdir.join("moved.xyz"), frame, moved.table.element)
+
+    for (source, format) in [(frame, "infer"), (frame.tolist(), "infer"), (bytearray(frame.astype(np.float32).tostring()), "infer"),
+                             (frame.astype(np.float32).tostring(), "buffer"), (str(tmpdir.join("moved.pdb")), "infer"), (xyz, "infer")]:
+        pdb = PDBParser.PDB_file(fixed_file)
+        pdb.load_coordinates(source, format=format, dtype=np.float32, check_names=True)
+
+        assert np.allclose(pdb.table.coords, frame, atol=1e-3)
+
+
+def test_chain_frame(fixed_file, frame):
+    pdb = PDBParser.PDB_file(fixed_file)
+    before = pdb.table.coords.copy()
+
+    (first_res, last_res) = pdb.table.get_chain_range(pdb.chains["B"]._index)
+    rows = np.arange(pdb.table.residue_offsets[first_res], pdb.table.residue_offsets[last_res])
+
+    pdb.chains["B"].load_coordinates(frame[rows])
+
+    assert np.array_equal(pdb.table.coords[rows], frame[rows])
+    outside = np.ones(len(frame), dtype=bool)
+    outside[rows] = False
+    assert np.array_equal(pdb.table.coords[outside], before[outside])
+
+
+def test_atom_count_mismatch(tmpdir, fixed_file, frame):
+    lines = open(fixed_file).readlines()
+    last_atom = max([i for (i, line) in enumerate(lines) if line.startswith("ATOM")])
+    tmpdir.join("short.pdb").write("".join(lines[:last_atom] + lines[last_atom+1:]))
+
+    sources = [(frame[:-1], "infer"), (np.concatenate([frame, frame[:1]]), "infer"), (frame[:-1].tostring(), "buffer"),
+               (str(tmpdir.join("short.pdb")), "infer"), (write_xyz(tmpdir.join("short.xyz"), frame[:-1], ["C"] * (len(frame) - 1)), "infer")]
+
+    pdb = PDBParser.PDB_file(fixed_file)
+    before = pdb.table.coords.copy()
+
+    for (source, format) in sources:
+        with pytest.raises(PDBParser.PDB_fileException) as error:
+            pdb.load_coordinates(source, format=format)
+        assert "atoms but the structure has " + str(len(frame)) in str(error.value)
+
+    # a whole frame is too many atoms for one chain
+    with pytest.raises(PDBParser.PDB_fileException):
+        pdb.chains["A"].load_coordinates(frame)
+
+    assert np.array_equal(pdb.table.coords, before)
+
+
+def test_malformed_frames(tmpdir, fixed_file, frame):
+    pdb = PDBParser.PDB_file(fixed_file)
+
+    xyz = write_xyz(tmpdir.join("moved.xyz"), frame, ["X"] * len(frame))
+    with pytest.raises(PDBParser.PDB_fileException):
+        pdb.load_coordinates(xyz, check_names=True)
+
+    truncated = tmpdir.join("truncated.xyz")
+    truncated.write("".join(open(xyz).readlines()[:-5]))
+
+    for (source, format) in [(frame.ravel(), "infer"), (frame.ravel()[:-1].tostring(), "buffer"), (str(truncated), "infer")]:
+        with pytest.raises(PDBParser.PDB_fileException):
+            pdb.load_coordinates(source, format=format)
@@ -0,0 +1,134 @@
+# Tests of the backbone atom indexing (across ACE/NME caps) and angles
+
+import numpy as np
+import pytest
+
+import PDBParser
+import pdbdihedrals
+import synthetic
+
+
+RESIDUES = [synthetic.CAPS["CAMPARI"][0]] + list(synthetic.RESIDUES[:4]) + [synthetic.CAPS["CAMPARI"][1]]
+
+
+@pytest.fixture
+def pdb(tmpdir):
+    """ An ACE-ALA-GLY-SER-HIS-NME chain laid out as a random walk of
+        1.5 A steps, so no four consecutive atoms are collinear
+    """
+
+    random = np.random.RandomState(4)
+
+    lines = []
+    position = np.zeros(3)
+    for (res_index, (res_name, atom_names)) in enumerate(RESIDUES):
+        for atom_name in atom_names:
+            step = random.normal(size=3)
+            position = position + 1.5 * step / np.linalg.norm(step)
+            lines.append(synthetic.FIXED_FORMAT % ("ATOM", len(lines) + 1, " %-3s" % atom_name, res_name, "A", res_index + 1,
+                                                   position[0], position[1], position[2], 1.0, 0.0, "PROT", atom_name.lstrip("123")[0]))
+
+    filename = str(tmpdir.join("capped.pdb"))
+    with open(filename, "w") as f:
+        f.writelines(lines + ["END\n"])
+
+    pdb = PDBParser.PDB_file(filename)
+
+    # the peptide bonds are whatever the walk made them - put each N
+    # bonded to the C before it
+    table = pdb.table
+    for residue in xrange(1, table.n_residues):
+        (C, N) = (row(table, residue - 1, "C"), row(table, residue, "N"))
+        table.coords[N] = table.coords[C] + 1.33 * unit(random.normal(size=3))
+
+    return pdb
+
+
+def unit(vector):
+    return vector / np.linalg.norm(vector)
+
+
+def row(table, residue, name):
+    """ Row of atom name in residue, or -1 """
+
+    (start, stop) = table.residue_offsets[residue:residue+2]
+    hits = np.flatnonzero(table.atom_name[start:stop] == name)
+
+    return int(start + hits[0]) if len(hits) else -1
+
+
+def dihedral(p0, p1, p2, p3):
+    """ One dihedral angle in degrees, IUPAC sign convention """
+
+    b1 = unit(p2 - p1)
+    v = (p0 - p1) - np.dot(p0 - p1, b1) * b1
+    w = (p3 - p2) - np.dot(p3 - p2, b1) * b1
+
+    return np.degrees(np.arctan2(np.dot(np.cross(b1, v), w), np.dot(v, w)))
+
+
+def test_backbone_rows_across_caps(pdb):
+    table = pdb.table
+    index = pdbdihedrals.PDB_backbone_index(pdb.chains["A"])
+
+    # the ACE methyl carbon and NME nitrogen/methyl stand in for the
+    # backbone atoms a cap does not have
+    assert list(index.atoms["C"]) == [row(table, i, "C") for i in xrange(5)] + [-1]
+    assert list(index.atoms["N"]) == [-1] + [row(table, i, "N") for i in xrange(1, 6)]
+    assert list(index.atoms["CA"]) == [row(table, 0, "CH3")] + [row(table, i, "CA") for i in xrange(1, 5)] + [row(table, 5, "CH3")]
+    assert index.linked.tolist() == [False] + [True] * 5
+
+    phi = index.quadruplets("phi")
+    assert list(phi[1]) == [row(table, 0, "C"), row(table, 1, "N"), row(table, 1, "CA"), row(table, 1, "C")]
+    assert (phi[0] == -1).all() and (phi[5] == -1).all()
+
+    psi = index.quadruplets("psi")
+    assert list(psi[4]) == [row(table, 4, "N"), row(table, 4, "CA"), row(table, 4, "C"), row(table, 5, "N")]
+    assert (psi[0] == -1).all() and (psi[5] == -1).all()
+
+    omega = index.quadruplets("omega")
+    assert list(omega[1]) == [row(table, 0, "CH3"), row(table, 0, "C"), row(table, 1, "N"), row(table, 1, "CA")]
+    assert list(omega[5]) == [row(table, 4, "CA"), row(table, 4, "C"), row(table, 5, "N"), row(table, 5, "CH3")]
+
+    chi1 = index.quadruplets("chi1")
+    assert list(chi1[3]) == [row(table, 3, i) for i in ("N", "CA", "CB", "OG")]
+    assert (chi1[[0, 2, 5]] == -1).all()
+
+
+def test_angles_match_brute_force(pdb):
+    table = pdb.table
+    angles = pdbdihedrals.dihedrals(pdb)["A"]
+
+    for (angle, definition) in pdbdihedrals.BACKBONE_ATOMS.iteritems():
+        for residue in xrange(table.n_residues):
+            rows = [row(table, residue + shift, "CH3" if name == "CA" and residue + shift in (0, 5) else name)
+                    if 0 <= residue + shift < table.n_residues else -1 for (shift, name) in definition]
+
+            if min(rows) < 0:
+                assert np.isnan(angles[angle][residue]), (angle, residue)
+            else:
+                assert np.allclose(angles[angle][residue], dihedral(*table.coords[rows])), (angle, residue)
+
+
+def test_frames_and_breaks(pdb):
+    table = pdb.table
+    chain = pdb.chains["A"]
+
+    frames = table.coords + np.random.RandomState(9).normal(0.0, 0.05, (4,) + table.coords.shape)
+    angles = chain.dihedrals(("phi", "psi"), frames=frames)
+
+    for (number, frame) in enumerate(frames):
+        table.coords[:] = frame
+        single = chain.dihedrals(("phi", "psi"))
+        assert np.allclose(angles["phi"][number], single["phi"], equal_nan=True)
+        assert np.allclose(angles["psi"][number], single["psi"], equal_nan=True)
+
+    # pulling the SER away breaks the chain on both sides of it
+    table.coords[table.residue_offsets[3]:table.residue_offsets[4]] += 10.0
+    broken = chain.dihedrals(("phi", "psi", "omega"))
+
+    assert np.isnan(broken["psi"][2]) and np.isnan(broken["phi"][3]) and np.isnan(broken["omega"][3])
+    assert np.isnan(broken["psi"][3]) and np.isnan(broken["phi"][4]) and np.isnan(broken["omega"][4])
+    assert not np.isnan(broken["phi"][2]) and not np.isnan(broken["psi"][4])
+
+    assert not np.isnan(chain.dihedrals("phi", bond_cutoff=None)["phi"][3])
@@ -0,0 +1,111 @@
+# Tests of the batched Kabsch superposition against one SVD per frame
+
+import numpy as np
+import pytest
+
+import PDBParser
+import pdbgeometry
+
+
+# the RMSD is worked out from sums of squares, so a perfect fit comes
+# out as the square root of the rounding error rather than exactly 0
+ATOL = 1e-6
+
+
+def svd_superpose(mobile, reference, weights):
+    """ Textbook weighted Kabsch for a single frame - returns the
+        superposed coordinates and the RMSD after superposition
+    """
+
+    w = weights / weights.sum()
+    (p, q) = (np.dot(w, mobile), np.dot(w, reference))
+
+    (U, S, Vt) = np.linalg.svd(np.dot((mobile - p).T, w[:, np.newaxis] * (reference - q)))
+    if np.linalg.det(np.dot(U, Vt)) < 0:
+        U[:, -1] = -U[:, -1]
+
+    moved = np.dot(mobile - p, np.dot(U, Vt)) + q
+    difference = moved - reference
+
+    return (moved, np.sqrt(np.dot(w, (difference**2).sum(axis=1))))
+
+
+def random_rotation(random):
+    (Q, R) = np.linalg.qr(random.randn(3, 3))
+    Q = Q * np.sign(np.diag(R))
+    if np.linalg.det(Q) < 0:
+        Q[:, 0] = -Q[:, 0]
+    return Q
+
+
+@pytest.fixture
+def ensemble():
+    """ A reference and 40 rotated, shifted and perturbed frames of it
+        (the last one a mirror image, so the reflection is tested)
+    """
+
+    random = np.random.RandomState(11)
+    reference = random.uniform(-10.0, 10.0, (60, 3))
+
+    frames = []
+    for i in xrange(40):
+        noise = reference + random.normal(0.0, 0.1 * (i % 5), reference.shape)
+        frames.append(np.dot(noise, random_rotation(random)) + random.uniform(-20.0, 20.0, 3))
+    frames[-1] = frames[-1] * [1.0, 1.0, -1.0]
+
+    return (np.array(frames), reference)
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_kabsch_matches_svd(ensemble, weighted):
+    (frames, reference) = ensemble
+    weights = np.linspace(1.0, 3.0, len(reference)) if weighted else np.ones(len(reference))
+
+    (rotation, translation, values) = pdbgeometry.kabsch(frames, reference, weights if weighted else None)
+    superposed = pdbgeometry.superpose(frames, reference, weights if weighted else None)
+
+    for (number, frame) in enumerate(frames):
+        (moved, value) = svd_superpose(frame, reference, weights)
+
+        assert np.allclose(values[number], value, atol=ATOL)
+        assert np.allclose(np.linalg.det(rotation[number]), 1.0)
+        assert np.allclose(np.dot(frame, rotation[number]) + translation[number], moved)
+        assert np.allclose(superposed[number], moved)
+
+        # a single frame gives the same as the batch
+        assert np.allclose(pdbgeometry.rmsd(frame, reference, weights=weights if weighted else None), value, atol=ATOL)
+
+
+def test_rmsd_frames(ensemble):
+    (frames, reference) = ensemble
+    atoms = np.arange(0, len(reference), 3)
+
+    expected = [svd_superpose(frame[atoms], reference[atoms], np.ones(len(atoms)))[1] for frame in frames]
+
+    assert np.allclose(pdbgeometry.rmsd_frames(frames, reference, atoms=atoms, block_size=7), expected, atol=ATOL)
+    assert np.allclose(pdbgeometry.rmsd_frames(iter(frames), reference, atoms=atoms), expected, atol=ATOL)
+
+
+def test_rmsd_without_superposition(ensemble):
+    (frames, reference) = ensemble
+    expected = np.sqrt(((frames - reference)**2).sum(axis=2).mean(axis=1))
+
+    assert np.allclose(pdbgeometry.rmsd(frames, reference, superpose=False), expected)
+    assert np.allclose(pdbgeometry.rmsd_frames(frames, reference, superpose=False, block_size=16), expected)
+
+
+def test_structure_rmsd(fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+    other = PDBParser.PDB_file(fixed_file)
+
+    rotation = random_rotation(np.random.RandomState(2))
+    other.table.coords[:] = np.dot(other.table.coords, rotation) + [5.0, -3.0, 1.0]
+
+    assert pdbgeometry.rmsd(pdb, other) < ATOL
+    difference = pdb.table.coords - other.table.coords
+    assert np.allclose(pdbgeometry.rmsd(pdb, other, superpose=False), np.sqrt((difference**2).sum(axis=1).mean()))
+
+
+def test_shape_mismatch():
+    with pytest.raises(pdbgeometry.PDB_geometryException):
+        pdbgeometry.kabsch(np.zeros((5, 3)), np.zeros((6, 3)))
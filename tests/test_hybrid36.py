@@ -0,0 +1,71 @@
+# Tests of hybrid-36 atom serial and residue number fields
+
+import numpy as np
+import pytest
+
+import pdbhybrid36
+
+
+# the boundaries of each range, from the published hybrid-36 examples
+KNOWN = [(99999, 5, "99999"), (100000, 5, "A0000"), (100001, 5, "A0001"),
+         (43770015, 5, "ZZZZZ"), (43770016, 5, "a0000"), (87440031, 5, "zzzzz"),
+         (9999, 4, "9999"), (10000, 4, "A000"), (1223055, 4, "ZZZZ"),
+         (1223056, 4, "a000"), (2436111, 4, "zzzz"), (-999, 4, "-999"), (7, 4, "   7")]
+
+
+@pytest.mark.parametrize("value,width,string", KNOWN)
+def test_encode_known(value, width, string):
+    assert pdbhybrid36.encode(value, width) == string
+
+
+@pytest.mark.parametrize("value,width,string", KNOWN)
+def test_decode_known(value, width, string):
+    assert pdbhybrid36.decode(string, width) == value
+
+
+@pytest.mark.parametrize("width", [4, 5])
+def test_round_trip(width):
+    values = np.unique(np.concatenate([np.arange(pdbhybrid36.min_value(width), 2000),
+                                       np.arange(10**width - 2000, 10**width + 50000),
+                                       np.linspace(0, pdbhybrid36.max_value(width), 5001).astype(np.int64)]))
+
+    for value in values:
+        string = pdbhybrid36.encode(value, width)
+        assert len(string) == width
+        assert pdbhybrid36.decode(string, width) == value
+
+
+@pytest.mark.parametrize("width", [4, 5])
+def test_vectorized_matches_scalar(width):
+    values = np.linspace(10**width, pdbhybrid36.max_value(width), 20001).astype(np.int64)
+
+    chars = pdbhybrid36.encode_chars(values, width)
+    assert [i.tostring() for i in chars] == [pdbhybrid36.encode(i, width) for i in values]
+
+    columns = np.ascontiguousarray(chars.T)
+    assert pdbhybrid36.is_encoded(columns).all()
+    assert (pdbhybrid36.decode_columns(columns) == values).all()
+
+
+@pytest.mark.parametrize("value", [pdbhybrid36.max_value(5) + 1, pdbhybrid36.min_value(5) - 1])
+def test_encode_out_of_range(value):
+    with pytest.raises(ValueError):
+        pdbhybrid36.encode(value, 5)
+
+
+@pytest.mark.parametrize("string", ["A00", "A00!0", "Aa000"])
+def test_decode_invalid(string):
+    with pytest.raises(ValueError):
+        pdbhybrid36.decode(string, 5)
+
+
+def test_decode_columns_invalid():
+    columns = np.frombuffer("A0000A00!0", dtype=np.uint8).reshape(2, 5).T.copy()
+
+    with pytest.raises(ValueError):
+        pdbhybrid36.decode_columns(columns)
+
+
+def test_conect_serials():
+    line = "CONECT" + "".join([pdbhybrid36.encode(i, 5) for i in (100000, 5, 99999, 2000000)]) + "\n"
+    assert pdbhybrid36.conect_serials(line) == [100000, 5, 99999, 2000000]
@@ -0,0 +1,70 @@
+# Tests of lazily loaded files against full loads
+
+import pytest
+
+import PDBParser
+
+from conftest import assert_same_table, first_difference
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """ The chain IDs PDB_chain_index.parse_chain is called for """
+
+    calls = []
+    parse_chain = PDBParser.PDB_chain_index.parse_chain
+    monkeypatch.setattr(PDBParser.PDB_chain_index, "parse_chain", lambda self, key: calls.append(key) or parse_chain(self, key))
+
+    return calls
+
+
+def chain_rows(chain):
+    """ The rows of chain in its table """
+
+    (first_res, last_res) = chain.table.get_chain_range(chain._index)
+    return range(chain.table.residue_offsets[first_res], chain.table.residue_offsets[last_res])
+
+
+def written(pdb, path):
+    pdb.write_file(path)
+    return open(path).read()
+
+
+@pytest.mark.parametrize("source", ["fixed_file", "heuristic_file"])
+def test_lazy_table_matches_eager(request, source, parsed):
+    filename = request.getfixturevalue(source)
+
+    (lazy, eager) = (PDBParser.PDB_file(filename, lazy=True), PDBParser.PDB_file(filename))
+    assert parsed == [] and not lazy.is_loaded()
+
+    expected = eager.table.take(chain_rows(eager.chains["B"]))
+    expected.assign_boundaries()
+
+    assert_same_table(lazy.chains["B"].table, expected)
+    assert parsed == ["B"]
+
+    assert_same_table(lazy.table, eager.table)
+    assert lazy.table.chain_names == eager.table.chain_names
+    assert (lazy.table.source_rows == eager.table.source_rows).all()
+    assert sorted(parsed) == ["A", "B", "C"]
+
+
+@pytest.mark.parametrize("touch", [None, "parse", "edit"])
+def test_lazy_write_matches_eager(tmpdir, fixed_file, parsed, touch):
+    (lazy, eager) = (PDBParser.PDB_file(fixed_file, lazy=True), PDBParser.PDB_file(fixed_file))
+
+    if touch is not None:
+        lazy.chains["B"]
+    if touch == "edit":
+        for pdb in (lazy, eager):
+            pdb.rename_atom("B", 4, "CA", "CX")
+            chain = pdb.chains["B"]
+            chain.table.coords[chain_rows(chain)[0] + 300] += 1.5
+
+    out = str(tmpdir.join("out.pdb"))
+    assert first_difference(written(lazy, out), written(eager, out)) is None
+
+    # writing never parses a chain nobody looked at
+    assert parsed == ([] if touch is None else ["B"])
+    assert not lazy.is_loaded()
+    assert [i for i in lazy.chains if lazy.chains.is_parsed(i)] == parsed
@@ -0,0 +1,119 @@
+# Tests of the residue and atom name indexes against linear scans
+
+import pytest
+
+import PDBParser
+
+
+@pytest.fixture
+def pdb(fixed_file):
+    return PDBParser.PDB_file(fixed_file)
+
+
+def scan_residue(chain, resid, chainLocal=False, insertion_code=None):
+    """ get_residue as a linear scan - the first residue matching """
+
+    for res in chain.residues:
+        if chainLocal:
+            if res.chain_local_id == resid:
+                return res
+        elif res.res_id == resid and (insertion_code is None or res.atoms[0].res_ins_code.strip() == insertion_code):
+            return res
+
+
+def scan_atom(residue, name):
+    for atom in residue.atoms:
+        if atom.atom_name == name:
+            return atom
+
+
+def same(a, b):
+    return (a is None and b is None) or (a is not None and b is not None and (a._table, a._index) == (b._table, b._index))
+
+
+def test_get_residue_matches_scan(pdb):
+    chain = pdb.chains["B"]
+
+    # repeated residue numbers, with insertion codes to tell them apart
+    table = chain.table
+    starts = table.residue_offsets[list(range(*table.get_chain_range(chain._index)))]
+    table.res_id[starts[10]:starts[14]] = 7
+    table.res_ins_code[starts[11]:starts[13]] = "A"
+
+    for resid in xrange(-1, len(chain.residues) + 3):
+        assert same(chain.get_residue(resid), scan_residue(chain, resid))
+        assert same(chain.get_residue(resid, chainLocal=True), scan_residue(chain, resid, chainLocal=True))
+
+    first = [i for i in chain.residues if i.res_id == 7]
+    assert same(chain.get_residue(7), first[0])
+    assert same(chain.get_residue(7, insertion_code="A"), first[2])
+    assert same(chain.get_residue(7, insertion_code=""), first[0])
+    assert chain.get_residue(7, insertion_code="Z") is None
+
+
+def test_renumbered_residues_are_found(pdb):
+    """ A miss rebuilds the index, so IDs edited in the table are seen """
+
+    chain = pdb.chains["A"]
+    residue = chain.get_residue(5)
+
+    chain.table.res_id[chain.table.residue_offsets[residue._index]:chain.table.residue_offsets[residue._index + 1]] = 5000
+
+    assert same(chain.get_residue(5000), residue)
+    assert chain.get_residue(5) is None
+    assert same(chain.get_residue(6), scan_residue(chain, 6))
+
+
+def test_renamed_residue_is_found(pdb):
+    pdb.rename_residue("A", 3, "XYZ")
+    residue = pdb.chains["A"].get_residue(3, chainLocal=True)
+
+    assert residue.res_name == "XYZ"
+    assert same(pdb.chains["A"].get_residue(residue.res_id), residue)
+
+
+def test_atom_index_after_renames(pdb):
+    residue = pdb.chains["A"].get_residue(4, chainLocal=True)
+    names = [i.atom_name for i in residue.atoms]
+
+    assert all(same(residue.get_atom(i), scan_atom(residue, i)) for i in names)
+
+    # rename through the residue, the file, an atom view and the table
+    residue.rename_atom("CA", "CX")
+    pdb.rename_atom("A", 4, "N", "NX")
+    residue.atoms[-1].atom_name = "OX"
+    residue._table.atom_name[residue._table.residue_offsets[residue._index] + 1] = "HX"
+
+    for name in names + ["CX", "NX", "OX", "HX"]:
+        assert same(residue.get_atom(name), scan_atom(residue, name)), name
+
+    assert residue.get_atom("CA") is None and residue.get_atom("N") is None
+
+    with pytest.raises(PDBParser.PDB_residueException):
+        residue.rename_atom("CA", "CY")
+
+
+def test_duplicate_atom_names(pdb):
+    """ The first atom with a name is found, as a scan finds it """
+
+    residue = pdb.chains["A"].get_residue(4, chainLocal=True)
+    names = [i.atom_name for i in residue.atoms]
+
+    residue.rename_atom(names[3], names[1])
+    assert same(residue.get_atom(names[1]), scan_atom(residue, names[1]))
+
+    residue.rename_atom(names[1], "ZZ")
+    assert same(residue.get_atom(names[1]), residue.atoms[3])
+    assert same(residue.get_atom("ZZ"), residue.atoms[1])
+
+    residue.set_residue_order(list(reversed(residue_names(residue))))
+    for name in set(residue_names(residue)):
+        assert same(residue.get_atom(name), scan_atom(residue, name)), name
+
+
+def residue_names(residue):
+    names = []
+    for atom in residue.atoms:
+        if atom.atom_name not in names:
+            names.append(atom.atom_name)
+    return names
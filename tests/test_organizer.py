@@ -0,0 +1,59 @@
+# Tests of grouping atoms into chains
+
+import numpy as np
+
+import PDBParser
+
+
+ATOM = "ATOM  %5i  CA  ALA %s%4i       1.000   2.000   3.000  1.00  0.00      PROT C  \n"
+
+
+def legacy_grouping(chains):
+    """ Positions of the atoms with the given chain IDs in the order the
+        original organizer put them - chains in order of first 
+        appearance, atoms in file order within each chain
+    """
+
+    order = []
+    for chainID in chains:
+        if chainID not in order:
+            order.append(chainID)
+
+    return [i for chainID in order for (i, atom_chain) in enumerate(chains) if atom_chain == chainID]
+
+
+def test_repeated_chain_ids(tmpdir):
+    """ A chain ID which comes back after a TER is merged into the chain
+        where it first appeared
+    """
+
+    runs = [("A", 1, 3), ("B", 1, 2), ("A", 4, 5), ("C", 1, 1), ("B", 3, 4)]
+
+    lines = []
+    chains = []
+    for (chainID, first, last) in runs:
+        for res_id in xrange(first, last + 1):
+            chains.append(chainID)
+            lines.append(ATOM % (len(chains), chainID, res_id))
+        lines.append("TER\n")
+
+    filename = tmpdir.join("repeated.pdb")
+    filename.write("".join(lines) + "END\n")
+
+    table = PDBParser.PDB_file(str(filename)).table
+
+    assert list(table.source_rows) == legacy_grouping(chains)
+    assert list(table.atom_id) == [i + 1 for i in legacy_grouping(chains)]
+    assert table.chain_names == ["A", "B", "C"]
+    assert list(table.chain_local_id) == [1, 2, 3, 4, 5, 1, 2, 3, 4, 1]
+
+
+def test_group_by_chain_matches_legacy():
+    random = np.random.RandomState(1)
+    chains = random.choice(list("ABCDEFGH"), 5000)
+
+    table = PDBParser.PDB_atom_table(len(chains))
+    table.chain[:] = chains
+
+    rows = PDBParser.PDB_residue_organizer().group_by_chain(table)
+    assert list(rows) == legacy_grouping(list(chains))
@@ -0,0 +1,43 @@
+# Tests of the parallel parser against a serial read
+
+import pytest
+
+import PDBParser
+
+from conftest import assert_same_table, first_difference
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """ Lets a test file be split into chunks of a few hundred atoms, so
+        chunk edges fall inside residues and chains
+    """
+
+    monkeypatch.setattr(PDBParser.PDB_parallel_parser, "MIN_CHUNK_ATOMS", 100)
+
+
+@pytest.mark.parametrize("source", ["fixed_file", "heuristic_file"])
+@pytest.mark.parametrize("processes", [2, 3])
+def test_parallel_matches_serial(request, tmpdir, small_chunks, source, processes):
+    filename = request.getfixturevalue(source)
+
+    (parallel, serial) = (PDBParser.PDB_file(filename, processes=processes), PDBParser.PDB_file(filename))
+
+    raw = open(filename, "rb").read()
+    (header, footer, atom_numbers, starts, stops) = PDBParser.PDB_chain_index.split_records(raw)
+    bounds = PDBParser.PDB_parallel_parser(processes).chunk_bounds(starts, stops)
+
+    # at least one chunk starts in the middle of a chain
+    chain_starts = set(serial.table.residue_offsets[serial.table.chain_offsets[:-1]].tolist())
+    assert len(bounds) > 3 and set([i[0] for i in bounds[1:]]) - chain_starts
+
+    assert_same_table(parallel.table, serial.table)
+    assert parallel.table.chain_names == serial.table.chain_names
+    assert (parallel.table.source_rows == serial.table.source_rows).all()
+    assert (parallel.table.source_fingerprint == serial.table.source_fingerprint).all()
+    assert (parallel.header, parallel.footer) == (serial.header, serial.footer)
+
+    (a, b) = (str(tmpdir.join("a.pdb")), str(tmpdir.join("b.pdb")))
+    parallel.write_file(a)
+    serial.write_file(b)
+    assert first_difference(open(a).read(), open(b).read()) is None
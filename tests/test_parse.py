@@ -0,0 +1,42 @@
+# Tests of the block parsers against the per-line parser
+
+import pytest
+
+import PDBParser
+
+from conftest import assert_same_table
+
+
+def legacy_table(filename):
+    """ The atom table of filename built one line at a time with
+        PDB_atom.parse_fields, grouped as PDB_residue_organizer groups it
+    """
+
+    lines = [line for line in open(filename) if line.startswith(("ATOM", "HETATM"))]
+    parsed = PDBParser.PDB_atom_table.from_records([PDBParser.PDB_atom.parse_fields(line) for line in lines])
+
+    table = parsed.take(PDBParser.PDB_residue_organizer().group_by_chain(parsed))
+    table.assign_boundaries()
+
+    return table
+
+
+@pytest.mark.parametrize("source", ["fixed_file", "heuristic_file"])
+def test_block_parse_matches_parse_fields(request, source):
+    filename = request.getfixturevalue(source)
+
+    pdb = PDBParser.PDB_file(filename)
+    legacy = legacy_table(filename)
+
+    assert_same_table(pdb.table, legacy)
+    assert pdb.table.chain_names == legacy.chain_names
+
+
+def test_parse_fields_fixed_and_heuristic_agree(fixed_file, heuristic_file):
+    """ The same atoms written both ways parse to the same fields, apart
+        from those a short line does not have
+    """
+
+    (fixed, heuristic) = (legacy_table(fixed_file), legacy_table(heuristic_file))
+
+    assert_same_table(fixed, heuristic, columns=["record_name", "atom_id", "atom_name", "res_name", "chain", "res_id", "coords", "occupancy", "beta"])
@@ -0,0 +1,28 @@
+# Tests of the per-stage instrumentation
+
+import camparipdbtools
+import pdbprofile
+import synthetic
+
+
+def test_conversion_steps(tmpdir):
+    """ The cap and protonation passes of a conversion are timed as
+        stages of their own, with the residues each one changed
+    """
+
+    filename = str(tmpdir.join("gmx.pdb"))
+    synthetic.write_structure(filename, 3000, 3, flavour="GMX")
+    pdb = camparipdbtools.CAMPARI_pdb(filename)
+
+    with pdbprofile.profile() as report:
+        changed = pdb.convert_from_GMX_to_CAMPARI(capChange=True)
+
+    paths = dict((i["path"], i) for i in report.summary())
+
+    caps = paths["GMX_to_CAMPARI/naming_rules/cap_change"]["counts"]["residues"]
+    renamed = paths["GMX_to_CAMPARI/naming_rules/histidine_rename"]["counts"]["residues"]
+
+    # two caps per chain, and every histidine (none has a HD1)
+    assert caps == 6
+    assert renamed == (pdb.pdbfile.table.res_name[pdb.pdbfile.table.residue_offsets[:-1]] == "HIE").sum() > 0
+    assert caps + renamed == changed
@@ -0,0 +1,105 @@
+# Tests of the vectorized protonation states against the per-residue rules
+
+import itertools
+
+import pytest
+
+import PDBParser
+import pdbnaming
+import synthetic
+
+
+HEAVY = ("N", "CA", "C", "O", "CB", "CG", "ND1", "CD2", "CE1", "NE2")
+MARKERS = ("HD1", "HD2", "HE1", "HE2")
+
+
+def residues():
+    """ A HIS for every subset of the ring hydrogens (and a few with a
+        duplicated one), each followed by an ALA holding all of them
+    """
+
+    subsets = [list(i) for n in xrange(len(MARKERS) + 1) for i in itertools.combinations(MARKERS, n)]
+    subsets += [["HE2", "HE2"], ["HD1", "HD1", "HE2"], ["HD1", "HD2", "HE1", "HE2", "HE2"]]
+
+    for hydrogens in subsets:
+        yield ("HIS", HEAVY + tuple(hydrogens))
+        yield ("ALA", ("N", "CA", "C", "O", "CB") + MARKERS)
+
+
+@pytest.fixture
+def table(tmpdir):
+    lines = []
+    for (res_index, (res_name, atom_names)) in enumerate(residues()):
+        chain = "AB"[res_index % 3 == 2]
+        for atom_name in atom_names:
+            lines.append(synthetic.FIXED_FORMAT % ("ATOM", len(lines) + 1, " %-3s" % atom_name, res_name, chain, res_index + 1,
+                                                   0.0, 0.0, 0.0, 1.0, 0.0, "PROT", atom_name[0]))
+
+    filename = str(tmpdir.join("histidines.pdb"))
+    with open(filename, "w") as f:
+        f.writelines(lines + ["END\n"])
+
+    return PDBParser.PDB_file(filename).table
+
+
+def legacy_state(atom_names):
+    """ The GMX to CAMPARI histidine rule as convert_from_GMX_to_CAMPARI
+        applied it to one residue - None for an odd protonation state
+    """
+
+    HIE = len([i for i in atom_names if i in ("HE1", "HE2")])
+    HID = len([i for i in atom_names if i in ("HD1", "HD2")])
+
+    if HIE == 2 and HID == 2:
+        return "HIP"
+    elif HIE == 2:
+        return "HIE"
+    elif HID == 2:
+        return "HID"
+
+    return None
+
+
+def residue_atoms(table, residue):
+    (start, stop) = table.residue_offsets[residue:residue+2]
+    return [str(i) for i in table.atom_name[start:stop]]
+
+
+def test_matches_legacy_rules(table):
+    report = pdbnaming.classify_protonation(table)
+
+    his = [i for i in xrange(table.n_residues) if table.res_name[table.residue_offsets[i]] == "HIS"]
+    assert report.residues.tolist() == his
+
+    for (residue, res_name, state, name, odd) in report:
+        expected = legacy_state(residue_atoms(table, residue))
+
+        assert odd == (expected is None), residue_atoms(table, residue)
+        assert state == (expected or "")
+        assert name == state
+
+    assert len(report.errors()) == report.odd.sum() > 0
+    with pytest.raises(pdbnaming.PDB_namingException):
+        report.raise_errors()
+
+
+def test_target_names_and_apply(table):
+    report = pdbnaming.classify_protonation(table, residues=range(table.n_residues), target="CHARMM")
+    expected = dict((i, legacy_state(residue_atoms(table, i))) for i in report.residues)
+
+    charmm = {"HID" : "HSD", "HIE" : "HSE", "HIP" : "HSP"}
+    renames = [(i, "HIS", charmm[state]) for (i, state) in sorted(expected.items()) if state is not None]
+    assert report.renames() == renames
+
+    assert report.apply() == len(renames)
+
+    for residue in xrange(table.n_residues):
+        (start, stop) = table.residue_offsets[residue:residue+2]
+        names = set(table.res_name[start:stop])
+
+        if residue in expected and expected[residue] is not None:
+            assert names == set([charmm[expected[residue]]])
+        elif residue in expected:
+            assert names == set(["HIS"])
+        else:
+            assert names == set(["ALA"])
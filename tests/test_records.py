@@ -0,0 +1,83 @@
+# Tests of the single pass record classification
+
+import PDBParser
+
+
+ATOM = "ATOM  %5i  CA  ALA %s%4i       1.000   2.000   3.000  1.00  0.00      PROT C  \n"
+
+CONTENT = ["HEADER    SYNTHETIC\n",
+           "REMARK   1 BEFORE THE ATOMS\n",
+           "HETATM    1  O   HOH W   1       0.000   0.000   0.000  1.00  0.00           O  \n",
+           ATOM % (2, "A", 1),
+           ATOM % (3, "A", 2),
+           "TER       4      ALA A   2\n",
+           "HETATM    5 ZN    ZN Z   1       0.000   0.000   0.000  1.00  0.00          ZN  \n",
+           "atom      6  CA  ALA B   1       1.000   2.000   3.000  1.00  0.00      PROT C  \n",
+           "TER\n",
+           "CONECT    1    5\n",
+           "ATOM 100007  CA  ALA C   1       1.000   2.000   3.000  1.00  0.00\n",
+           "TER\n",
+           "\n",
+           "END\n"]
+
+
+def legacy_split(content):
+    """ Header, atom lines and footer as the original PDB_file split them
+        - on the first space separated token of each line (so a bare 
+          "TER\n" was skipped by a check of its own)
+    """
+
+    first = [filter(None, line.split(" "))[0].upper() for line in content]
+
+    header = []
+    for (token, line) in zip(first, content):
+        if token == "ATOM":
+            break
+        header.append(line)
+
+    atomlines = [line for (token, line) in zip(first, content) if token == "ATOM"]
+
+    footer = []
+    passed = False
+    for (token, line) in zip(first, content):
+        if token in ("ATOM", "TER"):
+            passed = True
+        elif passed and line != "TER\n":
+            footer.append(line)
+
+    return (header, atomlines, footer)
+
+
+def test_matches_legacy_split():
+    records = PDBParser.PDB_record_index(CONTENT)
+
+    assert (records.header, records.atomlines, records.footer) == legacy_split(CONTENT)
+
+
+def test_record_line_numbers():
+    records = PDBParser.PDB_record_index(CONTENT)
+
+    assert records.hetatm == [2, 6]
+    assert records.conect == [9]
+    assert records.ter == [2, 3, 4]
+    assert [PDBParser.record_name(i) for i in records.footer] == ["HETATM", "CONECT", "", "END"]
+
+
+def test_file_keeps_records(tmpdir):
+    """ Header and footer lines (HETATM, CONECT, ...) are written back
+        where they were, and TER records are written after each chain
+    """
+
+    filename = tmpdir.join("records.pdb")
+    filename.write("".join(CONTENT))
+
+    pdb = PDBParser.PDB_file(str(filename))
+    assert pdb.chains.keys() == ["A", "B", "C"]
+
+    out = tmpdir.join("out.pdb")
+    pdb.write_file(str(out))
+
+    lines = out.readlines()
+    assert lines[:3] == CONTENT[:3]
+    assert lines[-4:] == [CONTENT[6], CONTENT[9], "\n", "END\n"]
+    assert [PDBParser.record_name(i) for i in lines[3:-4]] == ["ATOM", "ATOM", "TER", "ATOM", "TER", "ATOM", "TER"]
@@ -0,0 +1,68 @@
+# Tests of the selection language against numpy masks
+
+import numpy as np
+import pytest
+
+import PDBParser
+import pdbselect
+
+
+@pytest.fixture
+def table(fixed_file):
+    """ The atoms of fixed_file packed into a 30 A box, with random beta
+        factors
+    """
+
+    table = PDBParser.PDB_file(fixed_file).table
+
+    random = np.random.RandomState(7)
+    table.coords[:] = random.uniform(0.0, 30.0, table.coords.shape)
+    table.beta[:] = random.uniform(0.0, 100.0, len(table))
+
+    return table
+
+
+def brute_within(table, distance, mask):
+    delta = table.coords[:, np.newaxis, :] - table.coords[mask][np.newaxis, :, :]
+    return (np.einsum("ijk,ijk->ij", delta, delta) <= distance**2).any(axis=1)
+
+
+def brute_byres(table, mask):
+    residue_of = np.repeat(np.arange(table.n_residues), np.diff(table.residue_offsets))
+    return np.in1d(residue_of, residue_of[mask])
+
+
+QUERIES = [
+    ("chain A C", lambda t: np.in1d(t.chain, ["A", "C"])),
+    ("resname ALA SER and not name H*", lambda t: np.in1d(t.res_name, ["ALA", "SER"]) & ~np.char.startswith(t.atom_name, "H")),
+    ("name C? or resid 5-20", lambda t: ((np.char.str_len(t.atom_name) == 2) & np.char.startswith(t.atom_name, "C")) | ((t.res_id >= 5) & (t.res_id <= 20))),
+    ("chain B and (beta > 50 or index 0:99)", lambda t: (t.chain == "B") & ((t.beta > 50) | (np.arange(len(t)) <= 99))),
+    ("chain A or resname GLY and name CA", lambda t: (t.chain == "A") | ((t.res_name == "GLY") & (t.atom_name == "CA"))),
+    ("within 4.0 of (chain A and resid 3)", lambda t: brute_within(t, 4.0, (t.chain == "A") & (t.res_id == 3))),
+    ("byres (name OG and beta < 20)", lambda t: brute_byres(t, (t.atom_name == "OG") & (t.beta < 20))),
+    ("not all", lambda t: np.zeros(len(t), dtype=bool)),
+    ]
+
+
+@pytest.mark.parametrize("query,expected", QUERIES, ids=[i[0] for i in QUERIES])
+def test_selection_matches_brute_force(table, query, expected):
+    mask = pdbselect.PDB_selection(query).mask(table)
+
+    assert mask.dtype == bool
+    assert (mask == expected(table)).all()
+    assert (pdbselect.select(table, query).indices == np.flatnonzero(mask)).all()
+
+
+def test_select_rows(table):
+    selected = pdbselect.select(table, "name CA", rows=slice(100, 600))
+
+    expected = np.flatnonzero(table.atom_name == "CA")
+    expected = expected[(expected >= 100) & (expected < 600)]
+
+    assert (selected.indices == expected).all()
+
+
+@pytest.mark.parametrize("query", ["chain", "resid 5-", "beta >", "(chain A", "within of chain A", "chain A and"])
+def test_invalid_selection(query):
+    with pytest.raises(pdbselect.PDB_selectionException):
+        pdbselect.PDB_selection(query)
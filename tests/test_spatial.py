@@ -0,0 +1,101 @@
+# Tests of the cell list queries against all-pairs distances
+
+import numpy as np
+import pytest
+
+import PDBParser
+import pdbspatial
+
+
+@pytest.fixture
+def pdb(fixed_file):
+    """ fixed_file with its atoms scattered through a 25 A box """
+
+    pdb = PDBParser.PDB_file(fixed_file)
+    pdb.table.coords[:] = np.random.RandomState(3).uniform(0.0, 25.0, pdb.table.coords.shape)
+
+    return pdb
+
+
+def distances(coords, points):
+    delta = coords[:, np.newaxis, :] - points[np.newaxis, :, :]
+    return np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+
+
+@pytest.mark.parametrize("cell_size", [2.0, 5.0, 13.0])
+def test_query_radius(pdb, cell_size):
+    coords = pdb.table.coords
+    cells = pdbspatial.PDB_cell_list(pdb, cell_size)
+
+    for point in [coords[0], coords[1234], np.array([-3.0, 12.5, 30.0])]:
+        distance = distances(coords, point[np.newaxis])[:, 0]
+        found = cells.query_radius(point, 4.5)
+
+        assert sorted(found) == list(np.flatnonzero(distance <= 4.5))
+        assert (np.diff(distance[found]) >= 0).all()
+
+
+def test_query_residue(pdb):
+    table = pdb.table
+    (first, last) = table.residue_offsets[10:12]
+
+    distance = distances(table.coords, table.coords[first:last]).min(axis=1)
+
+    found = pdbspatial.PDB_cell_list(pdb).query_residue(10, 3.0)
+    assert list(found) == list(np.flatnonzero(distance <= 3.0))
+
+
+def test_k_nearest(pdb):
+    coords = pdb.table.coords
+    point = np.array([12.0, 12.0, 12.0])
+
+    distance = distances(coords, point[np.newaxis])[:, 0]
+    (rows, found) = pdbspatial.PDB_cell_list(pdb, 2.0).k_nearest(point, 25)
+
+    assert np.allclose(found, np.sort(distance)[:25])
+    assert np.allclose(distance[rows], found)
+
+
+@pytest.mark.parametrize("cell_size", [2.0, 5.0])
+def test_pairs_within(pdb, cell_size):
+    all_pairs = distances(pdb.table.coords, pdb.table.coords)
+    (i, j) = np.nonzero(np.triu(all_pairs <= 3.5, 1))
+
+    (first, second) = pdbspatial.PDB_cell_list(pdb, cell_size).pairs_within(3.5, chunk=500)
+
+    assert (first == i).all() and (second == j).all()
+
+
+def test_any_within(pdb):
+    points = np.random.RandomState(5).uniform(-2.0, 27.0, (500, 3))
+    expected = (distances(points, pdb.table.coords) <= 1.5).any(axis=1)
+
+    assert (pdbspatial.PDB_cell_list(pdb).any_within(points, 1.5, chunk=64) == expected).all()
+
+
+def test_residue_contacts(pdb):
+    table = pdb.table
+    residue_of = np.repeat(np.arange(table.n_residues), np.diff(table.residue_offsets))
+
+    close = distances(table.coords, table.coords) <= 2.0
+    expected = np.zeros((table.n_residues, table.n_residues), dtype=bool)
+    for (a, b) in zip(*np.nonzero(close)):
+        expected[residue_of[a], residue_of[b]] = True
+
+    (res_i, res_j) = pdbspatial.PDB_cell_list(pdb).residue_contacts(2.0)
+    assert zip(res_i, res_j) == zip(*np.nonzero(np.triu(expected, 1)))
+
+    assert (pdbspatial.PDB_cell_list(pdb).contact_map(2.0) == expected).all()
+
+
+def test_chain_rows(pdb):
+    """ A chain's index holds (and returns) the table rows of its atoms """
+
+    chain = pdb.chains["B"]
+    rows = np.arange(*pdb.table.residue_offsets[list(pdb.table.get_chain_range(chain._index))])
+
+    point = pdb.table.coords[rows[0]]
+    distance = distances(pdb.table.coords[rows], point[np.newaxis])[:, 0]
+
+    found = pdbspatial.PDB_cell_list(chain).query_radius(point, 5.0)
+    assert sorted(found) == list(rows[distance <= 5.0])
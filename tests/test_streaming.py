@@ -0,0 +1,56 @@
+# Tests of the streaming readers against a full load
+
+import gzip
+
+import pytest
+
+import PDBParser
+
+from conftest import same_column
+
+
+def residue_columns(residue):
+    """ The columns of the rows of a residue view, by name """
+
+    table = residue._table
+    (start, stop) = table.get_residue_range(residue._index)
+
+    return dict((name, getattr(table, name)[start:stop]) for name in table.column_names())
+
+
+def assert_same_residues(streamed, loaded):
+    assert len(streamed) == len(loaded)
+
+    for (a, b) in zip(streamed, loaded):
+        (a, b) = (residue_columns(a), residue_columns(b))
+        for name in a:
+            assert same_column(a[name], b[name]), name
+
+
+@pytest.fixture(params=["fixed_file", "heuristic_file", "gzipped"])
+def source(request, tmpdir):
+    if request.param != "gzipped":
+        return request.getfixturevalue(request.param)
+
+    filename = str(tmpdir.join("fixed.pdb.gz"))
+    with gzip.open(filename, "wb") as f:
+        f.write(open(request.getfixturevalue("fixed_file"), "rb").read())
+
+    return filename
+
+
+# 7 lines splits most residues across blocks
+@pytest.mark.parametrize("block_size", [7, 4096])
+def test_residues_and_chains_match_full_load(source, block_size):
+    pdb = PDBParser.PDB_file(source)
+
+    assert_same_residues(list(PDBParser.iter_residues(source, block_size)), pdb.residues)
+
+    chains = list(PDBParser.iter_chains(source, block_size))
+    assert [i.chain_name for i in chains] == pdb.chains.keys()
+
+    for (streamed, loaded) in zip(chains, pdb.chains.values()):
+        assert_same_residues(streamed.residues, loaded.residues)
+
+    atoms = list(PDBParser.iter_atoms(source, block_size))
+    assert [(i.atom_id, i.atom_name, i.chain_local_id) for i in atoms] == [(i.atom_id, i.atom_name, i.chain_local_id) for i in pdb.atoms]
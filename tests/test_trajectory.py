@@ -0,0 +1,77 @@
+# Tests of random access multi-MODEL trajectories
+
+import gzip
+
+import numpy as np
+
+import PDBParser
+import pdbtrajectory
+
+from conftest import assert_same_table, write_synthetic
+
+
+def write_trajectory(path, n_frames=3, n_atoms=4):
+    """ A small trajectory whose frames each have their own REMARK and
+        HETATM records
+    """
+
+    lines = ["REMARK   1 TRAJECTORY\n"]
+    for frame in xrange(n_frames):
+        lines.append("MODEL     %4i\n" % (frame + 1))
+        lines.append("REMARK   2 FRAME %i\n" % frame)
+        for i in xrange(n_atoms):
+            lines.append("ATOM  %5i  CA  ALA A%4i    %8.3f%8.3f%8.3f  1.00  0.00      PROT C  \n" % (i + 1, i + 1, i + frame, 1.0, 2.0))
+        lines.append("TER\n")
+        lines.append("HETATM%5i  O   HOH W   1    %8.3f%8.3f%8.3f  1.00  0.00           O  \n" % (n_atoms + 1, 10.0 + frame, 0.0, 0.0))
+        lines.append("ENDMDL\n")
+    lines.append("END\n")
+
+    path.write("".join(lines))
+
+    return str(path)
+
+
+def test_frames_match_models(tmpdir):
+    filename = write_synthetic(tmpdir.join("trajectory.pdb"), 2000, n_chains=2, n_models=4)
+
+    with pdbtrajectory.PDB_trajectory(filename, cache_size=2) as trajectory:
+        assert len(trajectory) == 4
+
+        for (index, coords) in enumerate(trajectory):
+            model = [line for line in trajectory.read_frame_lines(index) if line.startswith("ATOM")]
+            expected = PDBParser.PDB_file.from_lines(model).table.coords
+
+            assert np.array_equal(coords, expected)
+            assert np.array_equal(trajectory[index - 4], expected)
+
+
+def test_load_frame_records(tmpdir):
+    trajectory = pdbtrajectory.PDB_trajectory(write_trajectory(tmpdir.join("hetatm.pdb")))
+
+    for index in (2, 0, 1):
+        out = tmpdir.join("frame%i.pdb" % index)
+        trajectory.load_frame(index).write_file(str(out))
+        lines = out.readlines()
+
+        assert "REMARK   2 FRAME %i\n" % index in lines
+        assert [float(i[30:38]) for i in lines if i.startswith("HETATM")] == [10.0 + index]
+        assert [float(i[30:38]) for i in lines if i.startswith("ATOM")] == [float(i + index) for i in xrange(4)]
+        assert not [i for i in lines if i.startswith(("MODEL", "ENDMDL", "END\n"))]
+
+
+def test_compressed_trajectory(tmpdir):
+    filename = write_synthetic(tmpdir.join("trajectory.pdb"), 2000, n_chains=2, n_models=4)
+
+    compressed = str(tmpdir.join("trajectory.pdb.gz"))
+    with gzip.open(compressed, "wb") as f:
+        f.write(open(filename, "rb").read())
+
+    (plain, packed) = (pdbtrajectory.PDB_trajectory(filename), pdbtrajectory.PDB_trajectory(compressed, block_size=4096))
+
+    assert len(packed) == len(plain) == 4
+    assert (packed.offsets == plain.offsets).all()
+    assert_same_table(packed.topology.table, plain.topology.table)
+
+    for index in (3, 0, 2, 1):
+        assert np.array_equal(packed[index], plain[index])
+        assert packed.read_frame_bytes(index) == plain.read_frame_bytes(index)
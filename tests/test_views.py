@@ -0,0 +1,66 @@
+# Tests of the slotted atom/residue/chain views and interned text fields
+
+import math
+
+import pytest
+
+import PDBParser
+
+
+def interned(string):
+    """ Whether string is the interned copy of its value - interning a
+        separately built equal string only gives it back if so
+    """
+
+    return intern("".join(list(string))) is string
+
+
+def test_views_have_no_dict(fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+    chain = pdb.chains["A"]
+
+    for view in (pdb.atoms[0], PDBParser.PDB_atom_sequence(pdb.table), chain.residues[0], chain):
+        assert not hasattr(view, "__dict__")
+        with pytest.raises(AttributeError):
+            view.not_a_field = 1
+
+
+def test_text_fields_are_interned(fixed_file, heuristic_file):
+    for filename in (fixed_file, heuristic_file):
+        atoms = PDBParser.PDB_file(filename).atoms
+        names = [i for i in atoms if i.atom_name == "".join(["C", "A"])]
+
+        assert len(names) > 1
+        assert all(i.atom_name is names[0].atom_name for i in names)
+        assert interned(names[0].res_name)
+
+
+def test_parse_fields_types(fixed_file, heuristic_file):
+    """ Both branches of the per-line parser give interned names and the
+        same numeric types
+    """
+
+    for filename in (fixed_file, heuristic_file):
+        line = [i for i in open(filename) if i.startswith("ATOM")][10]
+        fields = dict(zip(PDBParser.PDB_atom_table.FIELDS, PDBParser.PDB_atom.parse_fields(line)))
+
+        for name in ("record_name", "atom_name", "res_name", "chain"):
+            assert interned(fields[name])
+
+        assert type(fields["atom_id"]) is int and type(fields["res_id"]) is int
+        assert type(fields["coord_X"]) is float and type(fields["beta"]) is float
+
+    # a charge the heuristic can not see is blank
+    assert math.isnan(fields["charge"])
+
+
+def test_views_write_through(fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+
+    atom = pdb.chains["B"].residues[2].atoms[1]
+    atom.atom_name = "QQ"
+    atom.coord_X = 12.5
+
+    row = atom._index
+    assert pdb.table.atom_name[row] == "QQ" and pdb.table.coords[row, 0] == 12.5
+    assert pdb.atoms[row].atom_name == "QQ"
@@ -0,0 +1,196 @@
+# Tests of writing structures out and reading them back
+
+import numpy as np
+import pytest
+
+import PDBParser
+import camparipdbtools
+import pdbhybrid36
+
+from conftest import assert_same_table, first_difference, write_synthetic
+
+
+def atom_lines(filename):
+    return [line for line in open(filename) if line.startswith(("ATOM", "HETATM"))]
+
+
+def test_written_lines_are_80_columns(tmpdir, fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+
+    out = str(tmpdir.join("out.pdb"))
+    pdb.write_file(out, verbatim=False)
+
+    assert set([len(line.rstrip("\n")) for line in atom_lines(out)]) == set([80])
+
+
+def test_round_trip_hybrid36(tmpdir):
+    """ A structure beyond 99,999 atoms and 9,999 residues is written
+        with hybrid-36 serials and residue numbers and reads back the same
+    """
+
+    pdb = PDBParser.PDB_file(write_synthetic(tmpdir.join("large.pdb"), 150000))
+    table = pdb.table
+
+    table.atom_id[:] = np.arange(1, len(table) + 1)
+    table.res_id[:] = np.repeat(np.arange(1, table.n_residues + 1), np.diff(table.residue_offsets))
+    table.element[::7] = "FE"
+
+    assert table.atom_id[-1] > 99999 and table.res_id[-1] > 9999
+
+    for verbatim in (True, False):
+        out = str(tmpdir.join("out.pdb"))
+        pdb.write_file(out, verbatim=verbatim)
+
+        lines = atom_lines(out)
+        assert lines[-1][6:11] == pdbhybrid36.encode(table.atom_id[-1], 5)
+        assert lines[-1][22:26] == pdbhybrid36.encode(table.res_id[-1], 4)
+
+        assert_same_table(table, PDBParser.PDB_file(out).table)
+
+
+def test_verbatim_write_copies_source(tmpdir, fixed_file):
+    out = str(tmpdir.join("out.pdb"))
+    PDBParser.PDB_file(fixed_file).write_file(out)
+
+    assert first_difference(open(out).read(), open(fixed_file).read()) is None
+
+
+def test_patched_write_round_trip(tmpdir, fixed_file):
+    """ Edited atoms are formatted in the layout of the lines copied
+        around them, and the whole file reads back as the edited table
+    """
+
+    pdb = PDBParser.PDB_file(fixed_file)
+    pdb.rename_atom("A", 2, "CB", "CX")
+    pdb.table.coords[100] += 1.5
+    pdb.table.beta[200] = 12.5
+
+    out = str(tmpdir.join("out.pdb"))
+    pdb.write_file(out)
+
+    (source, written) = (atom_lines(fixed_file), atom_lines(out))
+    changed = [i for (i, (a, b)) in enumerate(zip(source, written)) if a != b]
+
+    assert len(changed) == 3
+    assert set([len(line.rstrip("\n")) for line in written]) == set([80])
+
+    assert_same_table(pdb.table, PDBParser.PDB_file(out).table)
+
+
+def test_edited_lines_keep_precision(tmpdir, fixed_file):
+    """ Occupancy and beta of formatted lines are %6.2f like the lines
+        copied around them, whatever precision the values have
+    """
+
+    pdb = camparipdbtools.CAMPARI_pdb(fixed_file)
+    assert pdb.convert_from_CAMPARI_to_GMX() > 0
+    pdb.pdbfile.table.beta[5] = 12.3456
+
+    out = str(tmpdir.join("out.pdb"))
+    pdb.write_file(out)
+
+    lines = atom_lines(out)
+    assert lines[5][54:66] == "  1.00 12.35"
+    assert set([line[54:66] for (i, line) in enumerate(lines) if i != 5]) == set(["  1.00  0.00"])
+
+    assert PDBParser.PDB_file(out).table.beta[5] == 12.35
+
+
+def test_too_wide_beta(tmpdir, fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+    pdb.table.beta[7] = 1000.0
+
+    with pytest.raises(PDBParser.PDB_fileException) as error:
+        pdb.write_file(str(tmpdir.join("out.pdb")))
+
+    assert "1000.00" in str(error.value)
+
+
+# The batched writer was first byte-identical to the field by field
+# writer it replaced. Two breaks from that output are intended since:
+# records are now the standard 80 columns (segID 73-76, a 2 character
+# element 77-78 and charge 79-80, where the old writer put segID at
+# 74-77 and one character each after it, in 79 columns), and occupancy
+# and beta are %6.2f rather than str(value). Everything up to the
+# occupancy follows the old rules, which legacy_prefix restates.
+
+FORMAT = "%-6s%5i %-4s %3s %1s%4i    %8.3f%8.3f%8.3f%6.2f%6.2f      %-4s%2s  \n"
+
+def legacy_prefix(table, row):
+    """ Columns 1-54 of an atom line as the field by field writer wrote
+        them - name from column 14 unless 4 characters long, residue
+        name centred (the odd space on the right)
+    """
+
+    name = str(table.atom_name[row])
+    name = name if len(name) == 4 else " " + name.ljust(3)
+
+    res_name = str(table.res_name[row])
+    padding = 3 - len(res_name)
+    res_name = " " * (padding // 2) + res_name + " " * (padding - padding // 2)
+
+    return "%-6s%5i %s%1s%s %1s%4i%1s   %8.3f%8.3f%8.3f" % (table.record_name[row], table.atom_id[row], name, table.alt_location[row], res_name,
+                                                          table.chain[row], table.res_id[row], table.res_ins_code[row], table.coords[row, 0],
+                                                          table.coords[row, 1], table.coords[row, 2])
+
+
+def layout_file():
+    return PDBParser.PDB_file.from_lines([FORMAT % ("ATOM", 1, " N",  "ALA", "A", 1, 1.0, 2.0, 3.0, 1.0, 0.0, "PROT", "N"),
+                                          FORMAT % ("ATOM", 2, "HB12", "ALA", "A", 1, -1.5, 22.25, -333.125, 1.0, 0.0, "PROT", "H"),
+                                          FORMAT % ("ATOM", 3, " K",  "K",   "B", 2, 0.0, 0.0, 0.0, 0.5, 12.3456, "ION", "K"),
+                                          FORMAT % ("ATOM", 4, "NA",  "NA",  "B", 3, 0.0, 0.0, 0.0, 1.0, 0.0, "ION", "NA")])
+
+
+def test_written_layout(tmpdir):
+    out = str(tmpdir.join("out.pdb"))
+    layout_file().write_file(out, verbatim=False)
+
+    assert open(out).readlines() == [
+        "ATOM      1  N   ALA A   1       1.000   2.000   3.000  1.00  0.00      PROT N  \n",
+        "ATOM      2 HB12 ALA A   1      -1.500  22.250-333.125  1.00  0.00      PROT H  \n",
+        "TER\n",
+        "ATOM      3  K    K  B   2       0.000   0.000   0.000  0.50 12.35      ION  K  \n",
+        "ATOM      4  NA  NA  B   3       0.000   0.000   0.000  1.00  0.00      ION NA  \n",
+        "TER\n"]
+
+
+def test_written_prefix_matches_legacy_rules(tmpdir, fixed_file):
+    pdb = PDBParser.PDB_file(fixed_file)
+    table = pdb.table
+
+    # some 1, 2 and 4 character names among the synthetic ones
+    table.res_name = table.res_name.astype("S3")
+    table.res_name[::17] = "K"
+    table.res_name[5::17] = "NA"
+    table.atom_name[3::11] = "HB12"
+    table.res_ins_code[::13] = "B"
+
+    out = str(tmpdir.join("out.pdb"))
+    pdb.write_file(out, verbatim=False)
+
+    lines = atom_lines(out)
+    assert [i for i in xrange(len(table)) if lines[i][:54] != legacy_prefix(table, i)] == []
+
+
+@pytest.mark.parametrize("edits,message", [
+    # the first atom with a bad field is reported, whichever field it is
+    ({("beta", 1) : 1000.0, ("res_name", 3) : "LONG"}, "1000.00 - must be equal to or less than 6"),
+    # and the first bad field of that atom
+    ({("beta", 2) : 1000.0, ("res_name", 2) : "LONG", ("seg_ID", 1) : "SEGID"}, "SEGID - must be equal to or less than 4"),
+    ({("beta", 2) : 1000.0, ("res_name", 2) : "LONG"}, "LONG - must be equal to or less than 3"),
+    ({("coords", 0) : 12345.0, ("atom_name", 0) : "CAXXX"}, "ERROR writing PDB formatting atom name"),
+    ({("coords", 0) : 12345.0}, "12345.000 - must be equal to or less than 8"),
+    ])
+def test_first_bad_field_is_reported(tmpdir, edits, message):
+    pdb = layout_file()
+    table = pdb.table
+
+    for ((column, row), value) in edits.iteritems():
+        if isinstance(value, basestring):
+            setattr(table, column, getattr(table, column).astype("S5"))
+        getattr(table, column)[row] = value
+
+    with pytest.raises(PDBParser.PDB_fileException) as error:
+        pdb.write_file(str(tmpdir.join("out.pdb")), verbatim=False)
+
+    assert message in str(error.value)